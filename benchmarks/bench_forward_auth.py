@@ -0,0 +1,91 @@
+"""Benchmark app time of the /auth/verify forward-auth endpoint
+
+Calls the ASGI app in-process (no network, no server) with a valid session
+cookie and reports latency percentiles, next to /principal for reference.
+The first request of a cookie resolves the session, repeats hit the
+principal cache.
+
+Usage:
+    python benchmarks/bench_forward_auth.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault('CLIENT_ID', 'bench-client-id')
+os.environ.setdefault('CLIENT_SECRET', 'bench-client-secret')
+
+from dockmaster import main as dockmaster_main  # noqa: E402
+from dockmaster.session.records import SessionRecord  # noqa: E402
+
+
+def make_scope(path: str, session_id: str) -> dict:
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'host', b'localhost'), (b'cookie', f'session_id={session_id}'.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('127.0.0.1', 8000),
+    }
+
+
+async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+async def time_requests(path: str, session_id: str, requests: int) -> list[float]:
+    """App latency of each request in microseconds"""
+    status = []
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    app = dockmaster_main.app
+    latencies = []
+    for _ in range(requests):
+        scope = make_scope(path, session_id)
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    assert set(status) <= {200, 204}, set(status)
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<14}: mean {statistics.fmean(latencies):7.1f} us  p50 {p50:7.1f} us  p99 {p99:7.1f} us")
+
+
+async def run(requests: int):
+    session_id = await dockmaster_main.server_session.store_data(
+        SessionRecord(user_id='user@example.com', email='user@example.com'), ttl=3600,
+    )
+    # warm up imports, routing and the principal cache
+    await time_requests('/auth/verify', session_id, 100)
+    await time_requests('/principal', session_id, 100)
+    report('/auth/verify', await time_requests('/auth/verify', session_id, requests))
+    report('/principal', await time_requests('/principal', session_id, requests))
+    print(f"principal cache: {dockmaster_main.principal_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == '__main__':
+    main()
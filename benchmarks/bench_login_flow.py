@@ -0,0 +1,113 @@
+"""Load test the full login flow against a local fake Google provider
+
+Starts a FakeOIDCProvider and the dockmaster app (pointed at it through
+METADATA_URL) as uvicorn servers in separate processes, then drives
+concurrent end-to-end logins (/login/google -> /authorize ->
+/callback/google -> /) with per-user cookies and reports throughput and
+p50/p99/p999 latency per route. Use --app-url to target an app that is
+already running against a provider.
+
+Usage:
+    python benchmarks/bench_login_flow.py --logins 5000 --concurrency 500 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+import uvicorn
+
+from dockmaster.testing import FakeOIDCProvider
+from dockmaster.testing.login_load import LoginLoadGenerator, create_client
+
+CLIENT_ID = 'bench-client-id'
+CLIENT_SECRET = 'bench-client-secret'
+
+
+def _bind() -> socket.socket:
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    return sock
+
+
+def _wait_for(port: int):
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _serve_provider(sock: socket.socket, latency: float):
+    provider = FakeOIDCProvider(
+        issuer=f"http://127.0.0.1:{sock.getsockname()[1]}",
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        latency=latency,
+    )
+    config = uvicorn.Config(provider.app, log_level='warning', backlog=4096)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _serve_app(sock: socket.socket, metadata_url: str):
+    os.environ.update({'CLIENT_ID': CLIENT_ID, 'CLIENT_SECRET': CLIENT_SECRET, 'METADATA_URL': metadata_url})
+    from dockmaster import main as dockmaster_main
+    # debug logging of every request would dominate the measurement
+    dockmaster_main.app_logger.setLevel(logging.WARNING)
+    config = uvicorn.Config(dockmaster_main.app, log_level='warning', backlog=4096)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def start_servers(latency: float) -> tuple[list[multiprocessing.Process], str]:
+    """Run the provider and the app on free local ports, return the app url"""
+    provider_sock, app_sock = _bind(), _bind()
+    provider_port, app_port = provider_sock.getsockname()[1], app_sock.getsockname()[1]
+    metadata_url = f"http://127.0.0.1:{provider_port}/.well-known/openid-configuration"
+    servers = [
+        multiprocessing.Process(target=_serve_provider, args=(provider_sock, latency), daemon=True),
+        multiprocessing.Process(target=_serve_app, args=(app_sock, metadata_url), daemon=True),
+    ]
+    for server in servers:
+        server.start()
+    _wait_for(provider_port)
+    _wait_for(app_port)
+    return servers, f"http://127.0.0.1:{app_port}"
+
+
+async def run(app_url: str, logins: int, concurrency: int):
+    async with create_client(max_connections=concurrency) as client:
+        generator = LoginLoadGenerator(client, app_url)
+        # one login to warm discovery, keys and connections
+        await generator.run(logins=1, concurrency=1)
+        return await generator.run(logins=logins, concurrency=concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="fake token endpoint latency")
+    parser.add_argument('--app-url', default=None, help="app already running against a fake provider")
+    parser.add_argument('--json', default=None, help="write the summary to this file")
+    args = parser.parse_args()
+
+    servers, app_url = ([], args.app_url) if args.app_url else start_servers(args.latency_ms / 1000)
+    try:
+        report = asyncio.run(run(app_url, args.logins, args.concurrency))
+    finally:
+        for server in servers:
+            server.terminate()
+    print(report.format())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.summary(), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark route permission matching with many rules
+
+Compares the compiled RouteMatcher (path trie) with a naive per-request loop
+over the NO_AUTH / prefix rules, for paths that hit a rule and paths that
+fall through to the default.
+
+Usage:
+    python benchmarks/bench_route_matcher.py --rules 10000
+"""
+import argparse
+import random
+import time
+
+from dockmaster.authorize.routes import AUTHENTICATED, RouteMatcher
+
+
+def naive_match(path: str, no_auth: list[str], prefix_roles: list[tuple[str, frozenset[str] | None]]):
+    """Exact paths first, then the longest matching prefix, one rule at a time"""
+    if path in no_auth:
+        return None
+    found, found_length = AUTHENTICATED, -1
+    for prefix, roles in prefix_roles:
+        if (path == prefix or path.startswith(prefix + '/')) and len(prefix) > found_length:
+            found, found_length = roles, len(prefix)
+    return found
+
+
+def time_matches(match, paths: list[str]) -> float:
+    """Mean match latency in microseconds"""
+    start = time.perf_counter()
+    for path in paths:
+        match(path)
+    return (time.perf_counter() - start) / len(paths) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=10_000)
+    parser.add_argument('--paths', type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    no_auth = [f'/public/page{i}' for i in range(args.rules // 10)]
+    no_auth_prefixes = [f'/static/bundle{i}' for i in range(args.rules // 10)]
+    route_roles = {
+        f'/service{i}/api/v{i % 3}': [f'role{i % 50}']
+        for i in range(args.rules - len(no_auth) - len(no_auth_prefixes))
+    }
+    start = time.perf_counter()
+    matcher = RouteMatcher.from_config(no_auth=no_auth, no_auth_prefixes=no_auth_prefixes, route_roles=route_roles)
+    compile_ms = (time.perf_counter() - start) * 1e3
+    prefix_roles = [(prefix, None) for prefix in no_auth_prefixes]
+    prefix_roles += [(prefix, frozenset(roles)) for prefix, roles in route_roles.items()]
+
+    hit_paths = [f'{rng.choice(list(route_roles))}/items/{i}' for i in range(args.paths)]
+    miss_paths = [f'/unknown{i}/items' for i in range(args.paths)]
+    for path in hit_paths[:100] + miss_paths[:100]:
+        assert matcher.match(path) == naive_match(path, no_auth, prefix_roles), path
+    naive_paths = args.paths // 20
+
+    print(f"rules={len(matcher)} compile={compile_ms:.1f} ms")
+    print(f"trie  match hit  : {time_matches(matcher.match, hit_paths):9.2f} us")
+    print(f"trie  match miss : {time_matches(matcher.match, miss_paths):9.2f} us")
+    print(f"naive match hit  : {time_matches(lambda p: naive_match(p, no_auth, prefix_roles), hit_paths[:naive_paths]):9.2f} us")
+    print(f"naive match miss : {time_matches(lambda p: naive_match(p, no_auth, prefix_roles), miss_paths[:naive_paths]):9.2f} us")
+
+
+if __name__ == '__main__':
+    main()
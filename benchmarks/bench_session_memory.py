@@ -0,0 +1,96 @@
+"""Benchmark bytes per session of dict sessions vs compact SessionRecords
+
+Stores N sessions in a MemorySession and measures the heap growth with
+tracemalloc. The dict layout is what the callback used to store (full token
+response and id token payload), the record layout keeps only the profile
+fields the routes show. Also reports the serialized size used by the
+redis, sqlite and shared memory backends.
+
+Usage:
+    python benchmarks/bench_session_memory.py --sessions 100000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from dockmaster.session import serialization
+from dockmaster.session.memory_session import MemorySession
+from dockmaster.session.records import SessionRecord
+
+
+def id_token_payload(i: int) -> dict:
+    return {
+        'iss': 'https://accounts.google.com',
+        'azp': 'client-id.apps.googleusercontent.com',
+        'aud': 'client-id.apps.googleusercontent.com',
+        'sub': f'{100000000000000000000 + i}',
+        'email': f'user{i}@example.com',
+        'email_verified': True,
+        'at_hash': 'HK6E_P6Dh8Y93mRNtsDB1Q',
+        'name': f'User {i}',
+        'picture': f'https://lh3.googleusercontent.com/a/{i:016x}=s96-c',
+        'given_name': 'User',
+        'family_name': f'{i}',
+        'iat': 1700000000,
+        'exp': 1700003600,
+    }
+
+
+def dict_session(i: int) -> dict:
+    return {
+        'user_id': f'user{i}@example.com',
+        'user_profile': id_token_payload(i),
+        'tokens': {
+            'access_token': 'ya29.' + f'{i:08x}' * 20,
+            'expires_in': 3599,
+            'refresh_token': '1//' + f'{i:08x}' * 12,
+            'scope': 'openid https://www.googleapis.com/auth/userinfo.email',
+            'token_type': 'Bearer',
+            'id_token': 'eyJ' + f'{i:08x}' * 110,
+        },
+        'created_at': datetime.now(timezone.utc),
+    }
+
+
+def record_session(i: int) -> SessionRecord:
+    return SessionRecord.from_id_token(
+        user_id=f'user{i}@example.com',
+        id_token_payload=id_token_payload(i),
+        expires_at=time.time() + 3600,
+    )
+
+
+def bytes_per_session(make_session, sessions: int) -> float:
+    """Heap growth of a MemorySession holding the sessions, per session"""
+    gc.collect()
+    tracemalloc.start()
+    store = MemorySession()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(sessions):
+        store.store_data(make_session(i), ttl=3600)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100_000)
+    args = parser.parse_args()
+
+    dict_bytes = bytes_per_session(dict_session, args.sessions)
+    record_bytes = bytes_per_session(record_session, args.sessions)
+    dict_wire = len(serialization.dumps(dict_session(0)))
+    record_wire = len(serialization.dumps(record_session(0)))
+
+    print(f"sessions={args.sessions}")
+    print(f"dict   in memory : {dict_bytes:8.0f} bytes/session  serialized: {dict_wire:5d} bytes")
+    print(f"record in memory : {record_bytes:8.0f} bytes/session  serialized: {record_wire:5d} bytes")
+    print(f"reduction        : {dict_bytes / record_bytes:8.1f}x in memory, {dict_wire / record_wire:.1f}x serialized")
+
+
+if __name__ == '__main__':
+    main()
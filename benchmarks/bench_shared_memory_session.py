@@ -0,0 +1,80 @@
+"""Benchmark shared memory session lookups as worker processes are added
+
+Each worker process maps the same table and retrieves random sessions for a
+fixed duration. Aggregate lookups/sec should scale with the number of workers
+up to the number of cores (reads take no locks).
+
+Usage:
+    python benchmarks/bench_shared_memory_session.py --sessions 20000 --max-workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from dockmaster.session.shared_memory_session import SharedMemorySession
+
+
+def lookup_worker(path: str, session_ids: list[str], duration: float, start, results):
+    store = SharedMemorySession(path=path)
+    rng = random.Random(os.getpid())
+    sample = [rng.choice(session_ids) for _ in range(1_000)]
+    start.wait()
+    lookups = 0
+    began = time.perf_counter()
+    deadline = began + duration
+    while time.perf_counter() < deadline:
+        for session_id in sample:
+            store.retrieve_data(session_id)
+        lookups += len(sample)
+    elapsed = time.perf_counter() - began
+    store.close()
+    results.put(lookups / elapsed)
+
+
+def run(path: str, session_ids: list[str], workers: int, duration: float) -> float:
+    ctx = multiprocessing.get_context('fork')
+    start = ctx.Event()
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=lookup_worker, args=(path, session_ids, duration, start, results)) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    start.set()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=20_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--duration', type=float, default=2.0, help="seconds per run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir='/dev/shm' if os.path.isdir('/dev/shm') else None) as tmpdir:
+        path = os.path.join(tmpdir, 'sessions.table')
+        store = SharedMemorySession(path=path, slots=2 * args.sessions, value_size=256)
+        session_ids = [
+            store.store_data({'user_id': f'user{i}@example.com', 'name': f'User {i}'}, ttl=3600)
+            for i in range(args.sessions)
+        ]
+        print(f"sessions={args.sessions} cpus={os.cpu_count()}")
+        baseline = None
+        workers = 1
+        while workers <= args.max_workers:
+            rate = run(path, session_ids, workers, args.duration)
+            baseline = baseline or rate
+            print(f"workers={workers:3d}: {rate:14,.0f} lookups/sec  ({rate / baseline:.2f}x)"
+                  f"  {1e6 * workers / rate:.2f} us/lookup/worker")
+            workers *= 2
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
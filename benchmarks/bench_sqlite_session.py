@@ -0,0 +1,64 @@
+"""Benchmark retrieve_data latency of the SQLite session store
+
+Compares MemorySession with SQLiteSession for hot (cached) reads and cold
+reads (after a restart, served from the WAL database).
+
+Usage:
+    python benchmarks/bench_sqlite_session.py --sessions 50000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from dockmaster.session.memory_session import MemorySession
+from dockmaster.session.sqlite_session import SQLiteSession
+
+
+def session_data(i: int) -> dict:
+    return {
+        'user_id': f'user{i}@example.com',
+        'user_profile': {'name': f'User {i}', 'picture': f'https://example.com/{i}.png'},
+    }
+
+
+def time_retrieves(store, session_ids: list[str]) -> float:
+    """Mean retrieve_data latency in microseconds"""
+    start = time.perf_counter()
+    for session_id in session_ids:
+        store.retrieve_data(session_id)
+    return (time.perf_counter() - start) / len(session_ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=50_000)
+    args = parser.parse_args()
+
+    memory = MemorySession()
+    memory_ids = [memory.store_data(session_data(i), ttl=3600) for i in range(args.sessions)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / 'sessions.db')
+        store = SQLiteSession(path=path, hot_cache_size=args.sessions)
+        start = time.perf_counter()
+        sqlite_ids = [store.store_data(session_data(i), ttl=3600) for i in range(args.sessions)]
+        store_us = (time.perf_counter() - start) / args.sessions * 1e6
+        hot_us = time_retrieves(store, sqlite_ids)
+        store.close()
+
+        restarted = SQLiteSession(path=path, hot_cache_size=args.sessions)
+        cold_us = time_retrieves(restarted, sqlite_ids)
+        rewarmed_us = time_retrieves(restarted, sqlite_ids)
+        restarted.close()
+
+    print(f"sessions={args.sessions}")
+    print(f"memory retrieve          : {time_retrieves(memory, memory_ids):8.2f} us")
+    print(f"sqlite store (behind)    : {store_us:8.2f} us")
+    print(f"sqlite retrieve hot      : {hot_us:8.2f} us")
+    print(f"sqlite retrieve cold     : {cold_us:8.2f} us  (after restart)")
+    print(f"sqlite retrieve rewarmed : {rewarmed_us:8.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark logins/sec for the authorization code exchange
+
+Compares the two execution models against a local stub token endpoint:
+- before: sync ``GoogleOAuth2Client`` run on the AnyIO threadpool (what a sync
+  ``def`` route does), one new connection per exchange via ``httpx.post``
+- after: ``AsyncGoogleOAuth2Client`` awaited on the event loop over one pooled
+  keep-alive client
+
+Usage:
+    python benchmarks/bench_token_exchange.py --logins 1000 --concurrency 50 --latency-ms 20
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+import anyio.to_thread
+import uvicorn
+
+from dockmaster.authenticate.google import AsyncGoogleOAuth2Client, GoogleOAuth2Client
+
+
+def create_stub_token_app(latency: float):
+    """ASGI app answering every POST like google's token endpoint after a delay"""
+    body = b'{"access_token": "access", "expires_in": 3599, "token_type": "Bearer", "id_token": "id"}'
+
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        while (await receive()).get('more_body'):
+            pass
+        await asyncio.sleep(latency)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+    return app
+
+
+def _serve(sock: socket.socket, latency: float):
+    config = uvicorn.Config(create_stub_token_app(latency), log_level='warning', backlog=4096)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def start_stub_server(latency: float) -> tuple[multiprocessing.Process, str]:
+    """Run the stub token endpoint on a free local port in a separate process
+    (so it does not compete with the benchmarked client for the GIL)
+    """
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    server = multiprocessing.Process(target=_serve, args=(sock, latency), daemon=True)
+    server.start()
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return server, f'http://127.0.0.1:{port}/token'
+
+
+def create_client(cls):
+    return cls(client_id='bench', client_secret='bench', redirect_uri='http://localhost/callback', scopes=['openid'])
+
+
+async def run_logins(exchange, logins: int, concurrency: int) -> float:
+    """Run the exchanges with bounded concurrency and return logins/sec"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(i):
+        async with semaphore:
+            await exchange(f'code-{i}')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+async def bench_sync_threadpool(token_url: str, logins: int, concurrency: int) -> float:
+    client = create_client(GoogleOAuth2Client)
+
+    async def exchange(code):
+        await anyio.to_thread.run_sync(client.exchange_code_for_tokens, token_url, code)
+    return await run_logins(exchange, logins, concurrency)
+
+
+async def bench_async_pooled(token_url: str, logins: int, concurrency: int) -> float:
+    async with create_client(AsyncGoogleOAuth2Client) as client:
+        async def exchange(code):
+            await client.exchange_code_for_tokens(token_url, code)
+        return await run_logins(exchange, logins, concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="stub token endpoint latency")
+    args = parser.parse_args()
+
+    server, token_url = start_stub_server(args.latency_ms / 1000)
+    try:
+        before = asyncio.run(bench_sync_threadpool(token_url, args.logins, args.concurrency))
+        after = asyncio.run(bench_async_pooled(token_url, args.logins, args.concurrency))
+    finally:
+        server.terminate()
+    print(f"logins={args.logins} concurrency={args.concurrency} latency={args.latency_ms}ms")
+    print(f"before (sync + threadpool): {before:10.1f} logins/sec")
+    print(f"after  (async + pooled)   : {after:10.1f} logins/sec  ({after / before:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Run the benchmark suite as pytest tests
+
+Usage:
+    python -m pytest benchmarks -q --bench-quick --bench-json results.json
+"""
+import pytest
+
+import suite
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption('--bench-json', default=None, help='write benchmark results to this JSON file')
+    group.addoption('--bench-quick', action='store_true', help='smallest benchmark sizes only')
+    group.addoption('--bench-repeat', type=int, default=5, help='timed rounds per benchmark')
+
+
+def pytest_generate_tests(metafunc):
+    if 'bench_case' in metafunc.fixturenames:
+        cases = suite.selected(quick=metafunc.config.getoption('--bench-quick'))
+        metafunc.parametrize('bench_case', cases, ids=[case_id for _, case_id, _ in cases])
+
+
+def pytest_configure(config):
+    config.bench_results = []
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    filepath = config.getoption('--bench-json')
+    if filepath and config.bench_results:
+        suite.write_results(config.bench_results, filepath, quick=config.getoption('--bench-quick'))
+
+
+@pytest.fixture
+def record_benchmark(request):
+    """Keep a result for the JSON report and show it in the test report"""
+    def record(result: suite.Result):
+        request.config.bench_results.append(result)
+        stats = result.to_dict()
+        request.node.user_properties.append(('median_ns', stats['median_ns']))
+    return record
@@ -0,0 +1,365 @@
+"""Micro-benchmark suite with JSON results for comparing commits
+
+Cases:
+- MemorySession store / retrieve / remove with 1k to 1M sessions held
+- GoogleOAuth2Client.create_authorization_url
+- RS256 ID token verification against a locally generated key (JWKSCache)
+- pydantic validation and serialization of DockmasterUserToken
+
+Each case is timed for ``repeat`` rounds of ``number`` operations and
+reported as nanoseconds per operation (min / median / mean / stdev of the
+rounds). Results are written as JSON together with the commit they ran on.
+
+Usage:
+    python benchmarks/suite.py run --json before.json
+    python benchmarks/suite.py run --quick --filter memory_session
+    python benchmarks/suite.py compare before.json after.json --threshold 0.1
+
+The cases also run under pytest (see benchmarks/conftest.py):
+    python -m pytest benchmarks -q --bench-quick --bench-json after.json
+"""
+import argparse
+import base64
+import fnmatch
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+
+from dockmaster.authenticate.google import GoogleOAuth2Client
+from dockmaster.authenticate.jwks import JWKSCache
+from dockmaster.schemas import DockmasterUserToken
+from dockmaster.session.memory_session import MemorySession
+from dockmaster.session.records import SessionRecord
+
+SCHEMA_VERSION = 1
+
+# MemorySession sizes, the 1M case needs ~1.5 GB and takes a while to fill
+SESSION_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+QUICK_SESSION_SIZES = (1_000,)
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """A registered case
+
+    setup(param, ops) prepares the state for ops operations and returns the
+    operation, called with the operation index 0..ops-1
+    """
+    name: str
+    setup: Callable[[Any, int], Callable[[int], Any]]
+    params: tuple = (None,)
+    quick_params: tuple = (None,)
+    number: int = 10_000
+
+    def ids(self, quick: bool = False) -> list[tuple[str, Any]]:
+        params = self.quick_params if quick else self.params
+        return [(self.name if param is None else f"{self.name}[{param}]", param) for param in params]
+
+
+@dataclass
+class Result:
+    """Timings of one case in nanoseconds per operation"""
+    name: str
+    number: int
+    rounds: list[float] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            'number': self.number,
+            'rounds': len(self.rounds),
+            'min_ns': min(self.rounds),
+            'median_ns': statistics.median(self.rounds),
+            'mean_ns': statistics.fmean(self.rounds),
+            'stdev_ns': statistics.stdev(self.rounds) if len(self.rounds) > 1 else 0.0,
+        }
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, params: Iterable = (None,), quick_params: Iterable | None = None, number: int = 10_000):
+    """Register a setup function as a benchmark case"""
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(
+            name=name,
+            setup=setup,
+            params=tuple(params),
+            quick_params=tuple(params if quick_params is None else quick_params),
+            number=number,
+        )
+        return setup
+    return register
+
+
+def run_case(case: Benchmark, param: Any, name: str, repeat: int = 5, number: int | None = None) -> Result:
+    """Time repeat rounds of number operations of a case"""
+    number = number or case.number
+    op = case.setup(param, number * (repeat + 1))
+    # first round warms caches and is not reported
+    for i in range(number):
+        op(i)
+    result = Result(name=name, number=number)
+    for offset in range(number, number * (repeat + 1), number):
+        start = time.perf_counter_ns()
+        for i in range(offset, offset + number):
+            op(i)
+        result.rounds.append((time.perf_counter_ns() - start) / number)
+    return result
+
+
+def selected(pattern: str | None = None, quick: bool = False) -> list[tuple[Benchmark, str, Any]]:
+    """Cases (with their ids) matching a glob pattern or substring, all if None
+
+    brackets match literally so ids like memory_session.store[1000] can be selected
+    """
+    glob = None if pattern is None else pattern.replace('[', '[[]')
+    cases = []
+    for case in BENCHMARKS.values():
+        for case_id, param in case.ids(quick):
+            if pattern is None or pattern in case_id or fnmatch.fnmatchcase(case_id, glob):
+                cases.append((case, case_id, param))
+    return cases
+
+
+#### Results ####
+def environment() -> dict:
+    """Commit and interpreter the results were measured on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def write_results(results: Iterable[Result], filepath: str, quick: bool = False):
+    document = {
+        'schema': SCHEMA_VERSION,
+        'environment': {**environment(), 'quick': quick},
+        'results': {result.name: result.to_dict() for result in results},
+    }
+    with open(filepath, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(filepath: str) -> dict:
+    with open(filepath) as f:
+        document = json.load(f)
+    if document.get('schema') != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported benchmark results schema {document.get('schema')} in {filepath}")
+    return document
+
+
+def compare(base: dict, new: dict, threshold: float = 0.1) -> tuple[list[str], list[str]]:
+    """Compare median timings of two result documents
+
+    Returns the report lines and the names of cases slower than threshold
+    (e.g. 0.1 is 10% slower).
+    """
+    lines = [f"{'case':45s} {'base':>12s} {'new':>12s} {'change':>8s}"]
+    regressions = []
+    for name in sorted(base['results'].keys() | new['results'].keys()):
+        if name not in base['results'] or name not in new['results']:
+            lines.append(f"{name:45s} {'only in ' + ('new' if name in new['results'] else 'base'):>34s}")
+            continue
+        before = base['results'][name]['median_ns']
+        after = new['results'][name]['median_ns']
+        change = after / before - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  slower'
+        elif change < -threshold:
+            flag = '  faster'
+        lines.append(f"{name:45s} {format_ns(before):>12s} {format_ns(after):>12s} {change:+8.1%}{flag}")
+    return lines, regressions
+
+
+def format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+#### Cases ####
+def _session(i: int) -> SessionRecord:
+    return SessionRecord(
+        user_id=f'user{i}@example.com',
+        name=f'User {i}',
+        email=f'user{i}@example.com',
+        picture=f'https://lh3.googleusercontent.com/a/{i:016x}=s96-c',
+        given_name='User',
+        family_name=f'{i}',
+        expires_at=time.time() + 3600,
+    )
+
+
+def _filled_session_store(sessions: int):
+    store = MemorySession()
+    session = _session(0)
+    session_ids = [store.store_data(session, ttl=3600) for _ in range(sessions)]
+    return store, session_ids
+
+
+@benchmark('memory_session.store', params=SESSION_SIZES, quick_params=QUICK_SESSION_SIZES)
+def bench_memory_session_store(sessions: int, ops: int):
+    store, _ = _filled_session_store(sessions)
+    session = _session(1)
+    return lambda i: store.store_data(session, ttl=3600)
+
+
+@benchmark('memory_session.retrieve', params=SESSION_SIZES, quick_params=QUICK_SESSION_SIZES)
+def bench_memory_session_retrieve(sessions: int, ops: int):
+    store, session_ids = _filled_session_store(sessions)
+    # visit the ids in a scattered order so lookups do not follow insertion order
+    stride = 7919
+    return lambda i: store.retrieve_data(session_ids[(i * stride) % sessions])
+
+
+@benchmark('memory_session.remove', params=SESSION_SIZES, quick_params=QUICK_SESSION_SIZES)
+def bench_memory_session_remove(sessions: int, ops: int):
+    # ops extra sessions so every operation removes a present session
+    store, session_ids = _filled_session_store(sessions + ops)
+    return lambda i: store.remove_data(session_ids[i])
+
+
+@benchmark('google.create_authorization_url')
+def bench_create_authorization_url(param, ops: int):
+    client = GoogleOAuth2Client(
+        client_id='client-id.apps.googleusercontent.com',
+        client_secret='client-secret',
+        redirect_uri='http://localhost:8000/callback/google',
+        scopes=['openid', 'email', 'profile'],
+    )
+    endpoint = 'https://accounts.google.com/o/oauth2/v2/auth'
+    return lambda i: client.create_authorization_url(endpoint)
+
+
+def _rs256_key(kid: str) -> tuple[crypt.RSASigner, dict]:
+    """Locally generated RS256 signer and its public JWK"""
+
+    def b64(value: int) -> str:
+        data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+        return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    numbers = private_key.public_key().public_numbers()
+    jwk = {'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'kid': kid, 'n': b64(numbers.n), 'e': b64(numbers.e)}
+    return crypt.RSASigner.from_string(private_pem, key_id=kid), jwk
+
+
+def _id_token_claims() -> dict:
+    now = int(time.time())
+    return {
+        'iss': 'https://accounts.google.com',
+        'aud': 'client-id.apps.googleusercontent.com',
+        'sub': '100000000000000000001',
+        'email': 'user@example.com',
+        'email_verified': True,
+        'name': 'User Name',
+        'picture': 'https://lh3.googleusercontent.com/a/0000000000000001=s96-c',
+        'given_name': 'User',
+        'family_name': 'Name',
+        'iat': now,
+        'exp': now + 3600,
+    }
+
+
+@benchmark('jwks.verify_id_token', number=2_000)
+def bench_verify_id_token(param, ops: int):
+    signer, jwk = _rs256_key('bench-key')
+    cache = JWKSCache(background_refresh=False)
+    cache.load({'keys': [jwk]})
+    id_token = jwt.encode(signer, _id_token_claims()).decode('ascii')
+    audience = 'client-id.apps.googleusercontent.com'
+    return lambda i: cache.verify_id_token(id_token, audience=audience)
+
+
+@benchmark('schemas.user_token.validate')
+def bench_user_token_validate(param, ops: int):
+    claims = _id_token_claims()
+    return lambda i: DockmasterUserToken.model_validate(claims)
+
+
+@benchmark('schemas.user_token.dump_json')
+def bench_user_token_dump_json(param, ops: int):
+    token = DockmasterUserToken.model_validate(_id_token_claims())
+    return lambda i: token.model_dump_json()
+
+
+#### Command line ####
+def run(args) -> int:
+    cases = selected(args.filter, quick=args.quick)
+    if not cases:
+        print(f"No benchmark matches {args.filter!r}", file=sys.stderr)
+        return 1
+    results = []
+    for case, case_id, param in cases:
+        result = run_case(case, param, case_id, repeat=args.repeat, number=args.number)
+        results.append(result)
+        stats = result.to_dict()
+        print(f"{case_id:45s} median {format_ns(stats['median_ns']):>10s}  "
+              f"min {format_ns(stats['min_ns']):>10s}  stdev {format_ns(stats['stdev_ns']):>10s}")
+    if args.json:
+        write_results(results, args.json, quick=args.quick)
+        print(f"Wrote {len(results)} results to {args.json}")
+    return 0
+
+
+def run_compare(args) -> int:
+    base, new = load_results(args.base), load_results(args.new)
+    print(f"base: {base['environment'].get('commit')}  new: {new['environment'].get('commit')}")
+    lines, regressions = compare(base, new, threshold=args.threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--json', help='write the results to this file')
+    run_parser.add_argument('--filter', help='glob or substring of the case ids to run')
+    run_parser.add_argument('--quick', action='store_true', help='smallest sizes only')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--number', type=int, default=None, help='operations per round (default per case)')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown that fails')
+    compare_parser.set_defaults(handler=run_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,21 @@
+"""Benchmark cases of suite.py collected by pytest"""
+import suite
+
+
+def test_benchmark(bench_case, record_benchmark, request):
+    case, case_id, param = bench_case
+    result = suite.run_case(case, param, case_id, repeat=request.config.getoption('--bench-repeat'))
+    assert len(result.rounds) == request.config.getoption('--bench-repeat')
+    record_benchmark(result)
+
+
+def test_compare_flags_regressions():
+    def document(**medians):
+        return {'results': {name: {'median_ns': ns} for name, ns in medians.items()}}
+
+    base = document(store=100.0, retrieve=100.0, remove=100.0)
+    new = document(store=150.0, retrieve=105.0, verify=10.0)
+    lines, regressions = suite.compare(base, new, threshold=0.1)
+    assert regressions == ['store']
+    assert any('only in base' in line for line in lines if line.startswith('remove'))
+    assert any('only in new' in line for line in lines if line.startswith('verify'))
@@ -0,0 +1,119 @@
+"""Cached OpenID Connect discovery document."""
+import asyncio
+import json
+import logging
+import pathlib
+import time
+from typing import Callable
+
+import httpx
+
+from ..singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+# seconds before retrying upstream after serving a fallback copy
+RETRY_INTERVAL = 60.0
+
+
+class DiscoveryCache:
+    """OpenID discovery document held in memory
+
+    - loaded once (e.g. in the app lifespan) and served from memory
+    - revalidated with If-None-Match after the TTL, a 304 only extends the TTL
+    - falls back to a local copy of the document when the network is down
+    - concurrent revalidations are coalesced into one request
+    """
+
+    def __init__(
+        self,
+        metadata_url: str,
+        ttl: float = 3600.0,
+        filepath: str | pathlib.Path | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize an empty discovery cache
+
+        metadata_url: url of the openid-configuration document
+        ttl: seconds before the document is revalidated upstream
+        filepath: local copy used when upstream is unreachable, kept up to date on fetch
+        """
+        self.metadata_url = metadata_url
+        self.ttl = ttl
+        self.filepath = pathlib.Path(filepath) if filepath is not None else None
+        self._clock = clock
+        self._document: dict | None = None
+        self._etag: str | None = None
+        self._expires_at = 0.0
+        self._flight = AsyncSingleFlight()
+
+    @property
+    def document(self) -> dict:
+        """Get the cached discovery document"""
+        if self._document is None:
+            raise RuntimeError("Discovery document not loaded")
+        return self._document
+
+    def is_stale(self) -> bool:
+        """Check if the document should be revalidated upstream"""
+        return self._document is None or self._clock() >= self._expires_at
+
+    def load_file(self, filepath: str | pathlib.Path | None = None):
+        """Load the document from a local file"""
+        filepath = pathlib.Path(filepath) if filepath is not None else self.filepath
+        if filepath is None:
+            raise ValueError("No discovery document filepath set")
+        with open(filepath, 'r') as f:
+            self._document = json.load(f)
+        # retry upstream shortly, without an etag to force a full fetch
+        self._etag = None
+        self._expires_at = self._clock() + min(self.ttl, RETRY_INTERVAL)
+
+    async def refresh(self, client: httpx.AsyncClient):
+        """Fetch or revalidate the document upstream"""
+        headers = {'If-None-Match': self._etag} if self._etag and self._document is not None else {}
+        r = await client.get(self.metadata_url, headers=headers)
+        if r.status_code == httpx.codes.NOT_MODIFIED:
+            logger.debug("Discovery document not modified")
+        else:
+            r.raise_for_status()
+            # a 200 with a body that is not a JSON object raises ValueError
+            document = r.json()
+            if not isinstance(document, dict):
+                raise ValueError("Discovery document is not a JSON object")
+            self._document = document
+            self._etag = r.headers.get('etag')
+            await asyncio.to_thread(self._save, document)
+        self._expires_at = self._clock() + self.ttl
+
+    async def load(self, client: httpx.AsyncClient):
+        """Load the document upstream, falling back to the local file if unreachable or invalid"""
+        try:
+            await self.refresh(client)
+        except (httpx.HTTPError, ValueError) as e:
+            if self.filepath is None or not self.filepath.exists():
+                raise
+            logger.warning("Could not fetch discovery document, loading %s. %s", self.filepath, e)
+            self.load_file()
+
+    async def get(self, client: httpx.AsyncClient) -> dict:
+        """Get the document, revalidating it upstream once the TTL has passed"""
+        if self.is_stale():
+            try:
+                # concurrent callers share one upstream request
+                await self._flight.do(self.metadata_url, lambda: self.refresh(client))
+            except (httpx.HTTPError, ValueError) as e:
+                if self._document is None:
+                    raise
+                logger.warning("Could not revalidate discovery document, serving cached copy. %s", e)
+                self._expires_at = self._clock() + min(self.ttl, RETRY_INTERVAL)
+        return self.document
+
+    def _save(self, document: dict):
+        """Write the local copy (blocking, run in a thread)"""
+        if self.filepath is None:
+            return
+        try:
+            self.filepath.write_text(json.dumps(document))
+        except OSError as e:
+            logger.warning("Could not save discovery document to %s. %s", self.filepath, e)
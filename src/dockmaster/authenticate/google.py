@@ -5,17 +5,30 @@ from urllib.parse import urlencode
 import httpx
 from starlette.datastructures import URL
 
-from google.oauth2 import id_token as google_id_token
-from google.auth.transport import requests as google_requests
+from .jwks import GOOGLE_ISSUERS, JWKSCache, get_jwks_cache
+from ..resilience import DEFAULT_TIMEOUT, AsyncResilientTransport, ResiliencePolicy
+from ..metrics import AsyncMetricsTransport, UpstreamMetrics
 
 class GoogleOAuth2Client:
     """Manage the OAuth 2 authorization flow"""
 
-    def __init__(self, client_id : str, client_secret : str, redirect_uri:str | None, scopes : list[str]):
+    def __init__(
+        self,
+        client_id : str,
+        client_secret : str,
+        redirect_uri:str | None,
+        scopes : list[str],
+        jwks_cache : JWKSCache | None = None,
+        timeout : httpx.Timeout | float = DEFAULT_TIMEOUT,
+        issuers : tuple[str, ...] = GOOGLE_ISSUERS,
+    ):
         self.client_id = client_id
         self.client_secret = client_secret
         self.scopes = scopes
         self._redirect_uri = redirect_uri
+        self.jwks_cache = jwks_cache or get_jwks_cache()
+        self.timeout = timeout
+        self.issuers = issuers
 
     @property
     def redirect_uri(self)->str:
@@ -31,6 +44,18 @@ class GoogleOAuth2Client:
             uri = str(uri)
         self._redirect_uri = uri
     
+    def use_discovery(self, metadata : dict):
+        """Verify ID tokens with the signing keys and issuer of a discovery document
+        - no change for Google's document, switches keys for another provider
+          (e.g. the local fake provider in dockmaster.testing)
+        """
+        jwks_uri = metadata.get('jwks_uri')
+        if jwks_uri and jwks_uri != self.jwks_cache.jwks_url:
+            self.jwks_cache = get_jwks_cache(jwks_uri)
+        issuer = metadata.get('issuer')
+        if issuer and issuer not in self.issuers:
+            self.issuers = (issuer,)
+
     def get_scope(self)->str:
         """Get the scopes in a single string format"""
         return " ".join(self.scopes)
@@ -43,16 +68,15 @@ class GoogleOAuth2Client:
     )->tuple[str,str]:
         """Generate an authorization URL and state.
         - if state not passed creates one
-        - if redirect_uri passed sets it
+        - redirect_uri is per request (not stored on the shared client), the
+          configured one is used if not passed; pass the same one to the code exchange
         """
         if state is None:
             state = secrets.token_urlsafe(16)
-        if redirect_uri is not None:
-            self.redirect_uri = redirect_uri
 
         params = {
             'client_id': self.client_id,
-            'redirect_uri': self.redirect_uri,
+            'redirect_uri': str(redirect_uri) if redirect_uri is not None else self.redirect_uri,
             'response_type': 'code',
             'scope': self.get_scope(),
             'access_type': 'offline', # To receive a refresh token
@@ -64,23 +88,30 @@ class GoogleOAuth2Client:
         
         return authorization_url, state
     
-    def exchange_code_for_tokens(self, token_endpoint : str, code : str)->dict:
-        """Exchange the authorization code for access tokens"""
-        
-        # Assemble the json body
-        body = {
+    def get_token_request_body(self, code : str, redirect_uri : str | None = None)->dict:
+        """Assemble the json body for the authorization code exchange
+        - redirect_uri must be the one of the authorization request, the configured one if not passed
+        """
+        return {
             'code': code,
             'client_id': self.client_id,
             'client_secret': self.client_secret,
-            'redirect_uri': self.redirect_uri,
+            'redirect_uri': str(redirect_uri) if redirect_uri is not None else self.redirect_uri,
             'grant_type': 'authorization_code'
         }
 
+    def exchange_code_for_tokens(self, token_endpoint : str, code : str, redirect_uri : str | None = None)->dict:
+        """Exchange the authorization code for access tokens"""
+        
+        # Assemble the json body
+        body = self.get_token_request_body(code, redirect_uri)
+
         # Make the request to exchange the code for tokens
         try:
             r=httpx.post(
                 url=token_endpoint, 
-                json=body
+                json=body,
+                timeout=self.timeout,
             ).raise_for_status()
         except httpx.HTTPStatusError as e:
             raise e
@@ -89,12 +120,118 @@ class GoogleOAuth2Client:
         return tokens
     
     def verify_google_id_token(self, id_token:str, clock_skew_in_seconds: int = 10)->dict:
-        """Verify the google id  and return payload"""
+        """Verify the google id  and return payload
+        - signature is checked locally against the cached google signing keys
+        """
         try:
-            id_token_payload = google_id_token.verify_oauth2_token(
+            id_token_payload = self.jwks_cache.verify_id_token(
                 id_token=id_token, 
-                request=google_requests.Request(), 
                 audience=self.client_id,
+                issuers=self.issuers,
+                clock_skew_in_seconds=clock_skew_in_seconds
+            )
+        except Exception as e:
+            return {}
+        return id_token_payload
+
+
+class AsyncGoogleOAuth2Client(GoogleOAuth2Client):
+    """Manage the OAuth 2 authorization flow without blocking the event loop
+
+    - holds one long-lived ``httpx.AsyncClient`` (keep-alive + HTTP/2) so
+      token exchanges reuse pooled connections instead of a new TCP+TLS
+      handshake per login
+    - open/close it with ``async with client:`` (e.g. in the FastAPI lifespan)
+    - explicit connect/read timeouts, optional retries and circuit breaking
+      (``resilience``) so a degraded upstream fails logins fast
+    """
+
+    def __init__(
+        self,
+        client_id : str,
+        client_secret : str,
+        redirect_uri:str | None,
+        scopes : list[str],
+        jwks_cache : JWKSCache | None = None,
+        issuers : tuple[str, ...] = GOOGLE_ISSUERS,
+        http2 : bool = True,
+        limits : httpx.Limits | None = None,
+        timeout : httpx.Timeout | float = DEFAULT_TIMEOUT,
+        resilience : ResiliencePolicy | None = None,
+        metrics : UpstreamMetrics | None = None,
+    ):
+        super().__init__(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            scopes=scopes,
+            jwks_cache=jwks_cache,
+            timeout=timeout,
+            issuers=issuers,
+        )
+        self.http2 = http2
+        self.limits = limits or httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=60.0)
+        self.resilience = resilience
+        self.metrics = metrics
+        self._http_client: httpx.AsyncClient | None = None
+
+    @property
+    def http_client(self)->httpx.AsyncClient:
+        """Get the pooled http client"""
+        if self._http_client is None:
+            raise RuntimeError("HTTP client not open, use 'async with client:' or 'await client.open()'")
+        return self._http_client
+
+    async def open(self, transport : httpx.AsyncBaseTransport | None = None):
+        """Open the pooled http client
+        - requests go through the resilience policy (retries, circuit breaker) if set
+        - each call is timed (including its retries) if metrics are set
+        """
+        if self._http_client is None:
+            if transport is None:
+                transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+            if self.resilience is not None:
+                transport = AsyncResilientTransport(transport, self.resilience)
+            if self.metrics is not None:
+                transport = AsyncMetricsTransport(transport, self.metrics)
+            self._http_client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=transport,
+            )
+
+    async def aclose(self):
+        """Close the pooled http client and its connections (and the key refresh using it)"""
+        self.jwks_cache.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def __aenter__(self)->"AsyncGoogleOAuth2Client":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def exchange_code_for_tokens(self, token_endpoint : str, code : str, redirect_uri : str | None = None)->dict:
+        """Exchange the authorization code for access tokens"""
+        body = self.get_token_request_body(code, redirect_uri)
+        r = await self.http_client.post(url=token_endpoint, json=body)
+        r.raise_for_status()
+        return r.json()
+
+    async def verify_google_id_token(self, id_token:str, clock_skew_in_seconds: int = 10)->dict:
+        """Verify the google id and return payload
+        - signing keys are only fetched (over the pooled client) on expiry or unknown kid
+        """
+        try:
+            id_token_payload = await self.jwks_cache.averify_id_token(
+                id_token=id_token,
+                audience=self.client_id,
+                issuers=self.issuers,
+                client=self.http_client,
                 clock_skew_in_seconds=clock_skew_in_seconds
             )
         except Exception as e:
@@ -0,0 +1,307 @@
+"""Process-wide cache of Google's ID token signing keys (JWKS).
+
+Google rotates the keys that sign ID tokens every few days and publishes
+them with a ``Cache-Control: max-age`` header. Keeping the parsed public keys
+in memory (indexed by ``kid``) turns ID token verification into a local
+signature check instead of a certificate download per login.
+"""
+import asyncio
+import base64
+import json
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import Callable, NamedTuple
+
+import httpx
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt
+
+from ..singleflight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URL = 'https://www.googleapis.com/oauth2/v3/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+_MAX_AGE_PATTERN = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+def parse_max_age(cache_control: str | None) -> int | None:
+    """Parse the max-age directive (seconds) from a Cache-Control header"""
+    if not cache_control:
+        return None
+    match = _MAX_AGE_PATTERN.search(cache_control)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def _b64decode(segment: str | bytes) -> bytes:
+    """Decode an unpadded base64url JWT segment"""
+    if isinstance(segment, str):
+        segment = segment.encode('ascii')
+    return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+
+def _jwk_to_verifier(jwk: dict) -> crypt.RSAVerifier:
+    """Build a reusable RSA verifier from a JWK entry"""
+    public_numbers = rsa.RSAPublicNumbers(
+        e=int.from_bytes(_b64decode(jwk['e']), 'big'),
+        n=int.from_bytes(_b64decode(jwk['n']), 'big'),
+    )
+    return crypt.RSAVerifier(public_numbers.public_key())
+
+
+class _DecodedToken(NamedTuple):
+    header: dict
+    payload: dict
+    signed_section: bytes
+    signature: bytes
+
+
+def _decode_token(id_token: str) -> _DecodedToken:
+    """Split and decode a JWT without verifying it"""
+    try:
+        header_segment, payload_segment, signature_segment = id_token.split('.')
+        return _DecodedToken(
+            header=json.loads(_b64decode(header_segment)),
+            payload=json.loads(_b64decode(payload_segment)),
+            signed_section=f"{header_segment}.{payload_segment}".encode('ascii'),
+            signature=_b64decode(signature_segment),
+        )
+    except (ValueError, AttributeError) as e:
+        raise ValueError(f"Malformed token: {e}") from e
+
+
+def _verify_token(
+    token: _DecodedToken,
+    verifier: crypt.RSAVerifier | None,
+    audience: str | list[str],
+    issuers: tuple[str, ...],
+    clock_skew_in_seconds: int,
+) -> dict:
+    """Check the signature and the standard claims of a decoded token"""
+    if token.header.get('alg') != 'RS256':
+        raise ValueError(f"Unsupported signature algorithm {token.header.get('alg')}")
+    if verifier is None:
+        raise ValueError(f"Certificate for key id {token.header.get('kid')} not found.")
+    if not verifier.verify(token.signed_section, token.signature):
+        raise ValueError("Could not verify token signature.")
+
+    payload = token.payload
+    now = time.time()
+    if 'iat' not in payload or 'exp' not in payload:
+        raise ValueError("Token does not contain required claims iat and exp")
+    if now < payload['iat'] - clock_skew_in_seconds:
+        raise ValueError("Token used too early")
+    if payload['exp'] + clock_skew_in_seconds < now:
+        raise ValueError("Token expired")
+    audiences = [audience] if isinstance(audience, str) else audience
+    if payload.get('aud') not in audiences:
+        raise ValueError(f"Token has wrong audience {payload.get('aud')}")
+    if payload.get('iss') not in issuers:
+        raise ValueError(f"Wrong issuer {payload.get('iss')}")
+    return payload
+
+
+class JWKSCache:
+    """Signing keys indexed by ``kid`` with Cache-Control aware refresh
+
+    - keys are fetched once and reused until the upstream max-age expires
+      (at least min_refresh_interval, a max-age=0 does not refetch per token)
+    - keys fetched with an async client are refreshed shortly before they
+      expire by a timer on the event loop, over that same client
+    - a token with an unknown ``kid`` triggers a re-fetch (rate limited)
+    - a failed or malformed fetch keeps the cached keys
+    """
+
+    def __init__(
+        self,
+        jwks_url: str = GOOGLE_JWKS_URL,
+        client: httpx.Client | None = None,
+        default_max_age: int = 3600,
+        refresh_margin: float = 0.1,
+        min_refresh_interval: float = 30.0,
+        background_refresh: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize an empty key cache
+
+        jwks_url: url of the JSON Web Key Set
+        client: http client of the synchronous methods (created on first use if not passed)
+        default_max_age: key lifetime in seconds when upstream sends no max-age
+        refresh_margin: fraction of the max-age left when the background refresh runs
+        min_refresh_interval: minimum seconds between fetches (key lifetime floor,
+            unknown kids and failed fetches)
+        background_refresh: refresh the keys on an event loop timer before they expire
+        """
+        self.jwks_url = jwks_url
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.background_refresh = background_refresh
+        self._client = client
+        self._clock = clock
+        self._verifiers: dict[str, crypt.RSAVerifier] = {}
+        self._expires_at = 0.0
+        self._fetched_at: float | None = None
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+        self._timer: asyncio.TimerHandle | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    @property
+    def kids(self) -> list[str]:
+        """Key ids currently held in the cache"""
+        return list(self._verifiers)
+
+    def is_expired(self) -> bool:
+        """Check if the cached keys are past the upstream max-age"""
+        return self._clock() >= self._expires_at
+
+    @property
+    def client(self) -> httpx.Client:
+        """Http client of the synchronous methods"""
+        if self._client is None:
+            self._client = httpx.Client(timeout=10.0)
+        return self._client
+
+    def load(self, jwks: dict, max_age: int | None = None):
+        """Replace the cached keys with a parsed JSON Web Key Set
+
+        Raises ValueError if the key set is malformed, the cached keys are kept.
+        """
+        try:
+            verifiers = {
+                jwk['kid']: _jwk_to_verifier(jwk)
+                for jwk in jwks.get('keys', [])
+                if jwk.get('kty') == 'RSA' and 'kid' in jwk
+            }
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed key set: {e!r}") from e
+        if max_age is None:
+            max_age = self.default_max_age
+        now = self._clock()
+        # swap the whole mapping so readers never see a partial update
+        self._verifiers = verifiers
+        self._fetched_at = now
+        self._expires_at = now + max(max_age, self.min_refresh_interval)
+
+    def refresh(self):
+        """Fetch the key set from upstream and replace the cached keys"""
+        r = self.client.get(self.jwks_url).raise_for_status()
+        self.load(r.json(), max_age=parse_max_age(r.headers.get('cache-control')))
+        logger.debug("Fetched %d signing keys from %s", len(self._verifiers), self.jwks_url)
+
+    def get_verifier(self, kid: str | None) -> crypt.RSAVerifier | None:
+        """Get the verifier for a key id, fetching the key set only when needed
+        - concurrent fetches are coalesced into one request
+        """
+        if self._needs_fetch(kid):
+            self._flight.do(self.jwks_url, self._refresh_or_keep)
+        return self._verifiers.get(kid)
+
+    async def aget_verifier(self, kid: str | None, client: httpx.AsyncClient) -> crypt.RSAVerifier | None:
+        """Get the verifier for a key id, fetching with an async client when needed
+        - concurrent fetches are coalesced into one request
+        """
+        if self._needs_fetch(kid):
+            await self._async_flight.do(self.jwks_url, lambda: self._afetch(client))
+        return self._verifiers.get(kid)
+
+    def verify_id_token(
+        self,
+        id_token: str,
+        audience: str | list[str],
+        issuers: tuple[str, ...] = GOOGLE_ISSUERS,
+        clock_skew_in_seconds: int = 0,
+    ) -> dict:
+        """Verify an RS256 ID token against the cached keys and return its payload
+
+        Raises ValueError if the token is malformed, unsigned by a known key or
+        has invalid claims (iss, aud, iat, exp).
+        """
+        token = _decode_token(id_token)
+        verifier = self.get_verifier(token.header.get('kid'))
+        return _verify_token(token, verifier, audience, issuers, clock_skew_in_seconds)
+
+    async def averify_id_token(
+        self,
+        id_token: str,
+        audience: str | list[str],
+        client: httpx.AsyncClient,
+        issuers: tuple[str, ...] = GOOGLE_ISSUERS,
+        clock_skew_in_seconds: int = 0,
+    ) -> dict:
+        """Async variant of verify_id_token that never blocks the event loop on a fetch"""
+        token = _decode_token(id_token)
+        verifier = await self.aget_verifier(token.header.get('kid'), client)
+        return _verify_token(token, verifier, audience, issuers, clock_skew_in_seconds)
+
+    def close(self):
+        """Stop the background refresh"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def _can_refetch(self) -> bool:
+        return self._fetched_at is None or self._clock() - self._fetched_at >= self.min_refresh_interval
+
+    def _needs_fetch(self, kid: str | None) -> bool:
+        if self.is_expired():
+            return True
+        # unknown kid but keys are fresh: do not let bad tokens hammer upstream
+        return kid not in self._verifiers and self._can_refetch()
+
+    def _refresh_or_keep(self):
+        try:
+            self.refresh()
+        except (httpx.HTTPError, ValueError) as e:
+            self._keep_cached_keys(e)
+
+    async def _afetch(self, client: httpx.AsyncClient):
+        try:
+            r = (await client.get(self.jwks_url)).raise_for_status()
+            self.load(r.json(), max_age=parse_max_age(r.headers.get('cache-control')))
+            logger.debug("Fetched %d signing keys from %s", len(self._verifiers), self.jwks_url)
+        except (httpx.HTTPError, ValueError) as e:
+            self._keep_cached_keys(e)
+        self._schedule_refresh(client)
+
+    def _keep_cached_keys(self, error: Exception):
+        if not self._verifiers:
+            raise error
+        logger.warning("Could not refresh signing keys, using cached keys. %s", error)
+        # back off before the next attempt
+        self._expires_at = self._clock() + self.min_refresh_interval
+
+    def _schedule_refresh(self, client: httpx.AsyncClient):
+        """Refresh the keys over client before they expire (after min_refresh_interval on failure)"""
+        if not self.background_refresh:
+            return
+        self.close()
+        delay = max((self._expires_at - self._clock()) * (1.0 - self.refresh_margin), self.min_refresh_interval)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._start_background_refresh, client)
+
+    def _start_background_refresh(self, client: httpx.AsyncClient):
+        self._timer = None
+        self._refresh_task = asyncio.get_running_loop().create_task(self._background_refresh(client))
+
+    async def _background_refresh(self, client: httpx.AsyncClient):
+        try:
+            # joins a fetch already started by a verification
+            await self._async_flight.do(self.jwks_url, lambda: self._afetch(client))
+        except Exception as e:
+            # e.g. the client was closed, the next verification fetches again
+            logger.warning("Background refresh of signing keys failed. %s", e)
+
+
+@lru_cache(maxsize=None)
+def get_jwks_cache(jwks_url: str = GOOGLE_JWKS_URL) -> JWKSCache:
+    """Get the process-wide key cache for a JWKS url"""
+    return JWKSCache(jwks_url=jwks_url)
@@ -0,0 +1,73 @@
+"""Signed Dockmaster JWTs for stateless sessions."""
+import logging
+import time
+
+from jose import jwt, JWTError
+from pydantic import ValidationError
+
+from ..configuration import DockmasterSettings
+from ..schemas import DockmasterUserToken
+from ..session.records import SessionRecord
+
+logger = logging.getLogger(__name__)
+
+
+class UserTokenSigner:
+    """Issue and verify Dockmaster user tokens (DockmasterUserToken payload)
+
+    - the token carries the session record, verification is CPU only so any
+      worker can authenticate a request without a session store lookup
+    - a token cannot be revoked before it expires, keep jwt_expiration short
+    """
+
+    def __init__(self, secret_key: str, algorithm: str = 'HS256', expiration: int = 3600):
+        """Initialize the signer
+
+        secret_key: key shared by all workers
+        algorithm: JWS algorithm (e.g. HS256)
+        expiration: seconds a token is valid
+        """
+        self.algorithm = algorithm
+        self.expiration = expiration
+        self._secret_key = secret_key
+
+    @classmethod
+    def from_settings(cls, settings: DockmasterSettings) -> "UserTokenSigner":
+        return cls(
+            secret_key=settings.jwt_secret_key,
+            algorithm=settings.jwt_algorithm,
+            expiration=settings.jwt_expiration,
+        )
+
+    def issue(self, record: SessionRecord) -> str:
+        """Sign a token for a session record, expiring at most expiration seconds from now"""
+        expires_at = time.time() + self.expiration
+        if record.expires_at:
+            expires_at = min(expires_at, record.expires_at)
+        token = DockmasterUserToken(
+            email=record.user_id,
+            exp=int(expires_at),
+            name=record.name,
+            picture=record.picture,
+            given_name=record.given_name,
+            family_name=record.family_name,
+        )
+        return jwt.encode(token.model_dump(), self._secret_key, algorithm=self.algorithm)
+
+    def verify(self, token: str) -> SessionRecord | None:
+        """Verify a token and return its session record, None if invalid or expired"""
+        try:
+            claims = jwt.decode(token, self._secret_key, algorithms=[self.algorithm])
+            payload = DockmasterUserToken.model_validate(claims)
+        except (JWTError, ValidationError) as e:
+            logger.debug("Rejected user token. %s", e)
+            return None
+        return SessionRecord(
+            user_id=payload.email,
+            name=payload.name,
+            email=payload.email,
+            picture=payload.picture,
+            given_name=payload.given_name,
+            family_name=payload.family_name,
+            expires_at=payload.exp.timestamp(),
+        )
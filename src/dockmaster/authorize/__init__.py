@@ -0,0 +1 @@
+"""Authorize authenticated users (allowlists and RBAC)."""
@@ -0,0 +1,119 @@
+"""Precompiled allowlist of user emails and domains."""
+import logging
+import pathlib
+from dataclasses import dataclass
+from typing import Iterable
+
+from ..configuration import AuthorizationSettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _AllowlistIndex:
+    """Immutable lookup tables, replaced as a whole on reload"""
+    emails: frozenset[str] = frozenset()
+    domains: frozenset[str] = frozenset()
+    parent_domains: frozenset[str] = frozenset()
+    allow_all: bool = False
+
+    def __len__(self) -> int:
+        return len(self.emails) + len(self.domains) + len(self.parent_domains)
+
+
+def compile_allowlist(entries: Iterable[str]) -> _AllowlistIndex:
+    """Build the lookup tables from allowlist entries
+
+    - 'user@example.com': exact email
+    - '@example.com': any email of the domain
+    - '@*.example.com': any email of a subdomain of example.com
+    - '*': any email
+    """
+    emails, domains, parent_domains = set(), set(), set()
+    allow_all = False
+    for entry in entries:
+        entry = entry.strip().lower()
+        if not entry or entry.startswith('#'):
+            continue
+        if entry == '*':
+            allow_all = True
+        elif entry.startswith('@*.'):
+            parent_domains.add(entry[3:])
+        elif entry.startswith('@'):
+            domains.add(entry[1:])
+        elif '@' in entry:
+            emails.add(entry)
+        else:
+            raise ValueError(f"Invalid allowlist entry '{entry}'")
+    return _AllowlistIndex(frozenset(emails), frozenset(domains), frozenset(parent_domains), allow_all)
+
+
+class Allowlist:
+    """Authorization check of verified emails against an allowlist
+
+    - exact emails and domains are hashed sets, O(1) per lookup
+    - subdomain rules are checked once per label of the email's domain
+    - reload builds a new index and swaps it in with one assignment
+      (copy-on-write), lookups never take a lock
+    """
+    def __init__(self, entries: Iterable[str] = ()):
+        self._index = compile_allowlist(entries)
+
+    @classmethod
+    def from_file(cls, filepath: str | pathlib.Path) -> "Allowlist":
+        """Load entries from a file, one per line ('#' comments)"""
+        allowlist = cls()
+        allowlist.load_file(filepath)
+        return allowlist
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def allow_all(self) -> bool:
+        return self._index.allow_all
+
+    def reload(self, entries: Iterable[str]):
+        """Replace all entries atomically"""
+        index = compile_allowlist(entries)
+        self._index = index
+        logger.info("Loaded allowlist with %d entries", len(index))
+
+    def load_file(self, filepath: str | pathlib.Path):
+        """Replace all entries with the ones in a file"""
+        self.reload(pathlib.Path(filepath).read_text().splitlines())
+
+    def is_allowed(self, email: str | None) -> bool:
+        """Check if a (verified) email is allowed"""
+        index = self._index  # one read, a concurrent reload does not mix indexes
+        if index.allow_all:
+            return True
+        if not email:
+            return False
+        email = email.lower()
+        if email in index.emails:
+            return True
+        _, at, domain = email.rpartition('@')
+        if not at:
+            return False
+        if domain in index.domains:
+            return True
+        if index.parent_domains:
+            dot = domain.find('.')
+            while dot != -1:
+                domain = domain[dot + 1:]
+                if domain in index.parent_domains:
+                    return True
+                dot = domain.find('.')
+        return False
+
+
+def create_allowlist(settings: AuthorizationSettings) -> Allowlist:
+    """Build the allowlist from settings, allowing everyone if none is configured"""
+    entries = list(settings.allowlist)
+    if settings.allowlist_filepath is not None:
+        entries += pathlib.Path(settings.allowlist_filepath).read_text().splitlines()
+    if not entries:
+        logger.warning("No allowlist configured, any verified Google account is authorized")
+        entries = ['*']
+    return Allowlist(entries)
@@ -0,0 +1,151 @@
+"""Role based access control database held in memory."""
+import asyncio
+import json
+import logging
+import os
+import pathlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+from ..configuration import AuthorizationSettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RBACDatabase:
+    """Parsed RBAC database: user email -> roles
+
+    JSON format: {"users": {"user@example.com": ["admin", "analyst"]}}
+    """
+    users: dict[str, frozenset[str]] = field(default_factory=dict)
+    version: str | None = None
+
+    @classmethod
+    def from_json(cls, data: bytes | str, version: str | None = None) -> "RBACDatabase":
+        """Parse the JSON format, raises ValueError if it is malformed
+        (e.g. a role string instead of a list would give one role per character)"""
+        document = json.loads(data)
+        users = document.get('users', {}) if isinstance(document, dict) else None
+        if not isinstance(users, dict):
+            raise ValueError("RBAC database must be an object with a 'users' object")
+        for email, roles in users.items():
+            if not isinstance(roles, list) or not all(isinstance(role, str) for role in roles):
+                raise ValueError(f"Roles of {email} must be a list of strings, got {roles!r}")
+        return cls(users={email.lower(): frozenset(roles) for email, roles in users.items()}, version=version)
+
+    def roles_of(self, user_id: str) -> frozenset[str]:
+        return self.users.get(user_id.lower(), frozenset())
+
+
+#### Sources ####
+class RBACSource(ABC):
+    """Where the RBAC database is stored"""
+    @abstractmethod
+    def version(self) -> str:
+        """Cheap check of the current version (no payload)"""
+        pass
+
+    @abstractmethod
+    def read(self, version: str) -> bytes:
+        """Read the payload of a version"""
+        pass
+
+
+class FileSource(RBACSource):
+    """RBAC database in a local JSON file, versioned by mtime and size"""
+    def __init__(self, filepath: str | pathlib.Path):
+        self.filepath = pathlib.Path(filepath)
+
+    def version(self) -> str:
+        stat = os.stat(self.filepath)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def read(self, version: str) -> bytes:
+        return self.filepath.read_bytes()
+
+
+class SecretManagerSource(RBACSource):
+    """RBAC database in a Google Cloud Secret Manager secret
+
+    - version() resolves the 'latest' alias (metadata only), read() accesses
+      the payload of that exact version
+    """
+    def __init__(self, secret_name: str, client=None):
+        """secret_name: projects/<project>/secrets/<secret>"""
+        if client is None:
+            from google.cloud import secretmanager
+            client = secretmanager.SecretManagerServiceClient()
+        self.secret_name = secret_name
+        self._client = client
+
+    def version(self) -> str:
+        return self._client.get_secret_version(request={'name': f"{self.secret_name}/versions/latest"}).name
+
+    def read(self, version: str) -> bytes:
+        return self._client.access_secret_version(request={'name': version}).payload.data
+
+
+#### Loader ####
+class RBACLoader:
+    """RBAC database cached in memory, re-read only when its source changes
+
+    - poll() checks only the source version, the payload is read and parsed
+      when the version changed
+    - the parsed database is swapped in with one assignment (copy-on-write),
+      lookups never take a lock
+    - a failed poll or parse keeps serving the last good database
+    """
+    def __init__(self, source: RBACSource):
+        self.source = source
+        self._database = RBACDatabase()
+
+    @property
+    def database(self) -> RBACDatabase:
+        return self._database
+
+    @property
+    def version(self) -> str | None:
+        return self._database.version
+
+    def roles_of(self, user_id: str) -> frozenset[str]:
+        """Roles of a user, empty if the user is not in the database"""
+        return self._database.roles_of(user_id)
+
+    def load(self):
+        """Read and parse the current version"""
+        version = self.source.version()
+        self._database = RBACDatabase.from_json(self.source.read(version), version=version)
+        logger.info("Loaded RBAC database version %s with %d users", version, len(self._database.users))
+
+    def poll(self) -> bool:
+        """Reload if the source version changed, return if it was reloaded"""
+        version = None
+        try:
+            version = self.source.version()
+            if version == self._database.version:
+                return False
+            self._database = RBACDatabase.from_json(self.source.read(version), version=version)
+        except Exception as e:
+            logger.warning(
+                "Could not reload RBAC database version %s, keeping version %s. %s", version, self.version, e
+            )
+            return False
+        logger.info("Reloaded RBAC database version %s with %d users", version, len(self._database.users))
+        return True
+
+
+async def run_rbac_poller(loader: RBACLoader, interval: float):
+    """Poll the RBAC source every interval seconds (source I/O runs in a thread)"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(loader.poll)
+
+
+def create_rbac_loader(settings: AuthorizationSettings) -> RBACLoader | None:
+    """Build the RBAC loader from settings, None if no source is configured"""
+    if settings.rbac_secret is not None:
+        return RBACLoader(SecretManagerSource(settings.rbac_secret))
+    if settings.rbac_filepath is not None:
+        return RBACLoader(FileSource(settings.rbac_filepath))
+    return None
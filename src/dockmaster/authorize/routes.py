@@ -0,0 +1,138 @@
+"""Route permissions compiled into a path trie."""
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Mapping
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# required roles of a route: None is public, an empty set any authenticated user,
+# otherwise the user needs at least one of the roles
+RequiredRoles = frozenset[str] | None
+PUBLIC: RequiredRoles = None
+AUTHENTICATED: RequiredRoles = frozenset()
+
+_UNSET = object()
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    """Roles required for a path, or for a path and everything below it (prefix)"""
+    path: str
+    roles: RequiredRoles
+    prefix: bool = False
+
+
+class _Node:
+    __slots__ = ('children', 'exact', 'prefix')
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.exact = _UNSET
+        self.prefix = _UNSET
+
+
+def _segments(path: str) -> list[str]:
+    return [segment for segment in path.split('/') if segment]
+
+
+class RouteMatcher:
+    """Map request paths to required roles
+
+    - rules are compiled at startup into a trie of path segments, a match
+      walks the path once, independent of the number of rules
+    - an exact rule beats a prefix rule, a longer prefix beats a shorter one
+    - prefixes match whole segments ('/static' covers '/static/app.js',
+      not '/staticfiles')
+    - paths without a rule get the default
+    """
+    def __init__(self, rules: Iterable[RouteRule] = (), default: RequiredRoles = AUTHENTICATED):
+        self.default = default
+        self._root = _Node()
+        self._size = 0
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_config(
+        cls,
+        no_auth: Iterable[str] = (),
+        no_auth_prefixes: Iterable[str] = (),
+        route_roles: Mapping[str, Iterable[str]] | None = None,
+        default: RequiredRoles = AUTHENTICATED,
+    ) -> "RouteMatcher":
+        """Compile NO_AUTH paths, NO_AUTH_PREFIXES and RBAC rules (prefix -> roles)"""
+        rules = [RouteRule(path, PUBLIC) for path in no_auth]
+        rules += [RouteRule(path, PUBLIC, prefix=True) for path in no_auth_prefixes]
+        rules += [RouteRule(path, frozenset(roles), prefix=True) for path, roles in (route_roles or {}).items()]
+        return cls(rules, default=default)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, rule: RouteRule):
+        """Add a rule, replacing an earlier rule of the same path and kind"""
+        node = self._root
+        for segment in _segments(rule.path):
+            node = node.children.setdefault(segment, _Node())
+        if rule.prefix:
+            self._size += node.prefix is _UNSET
+            node.prefix = rule.roles
+        else:
+            self._size += node.exact is _UNSET
+            node.exact = rule.roles
+
+    def match(self, path: str) -> RequiredRoles:
+        """Get the roles required for a request path"""
+        node = self._root
+        found = node.prefix
+        for segment in path.split('/'):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.prefix is not _UNSET:
+                found = node.prefix
+        else:
+            if node.exact is not _UNSET:
+                return node.exact
+        return self.default if found is _UNSET else found
+
+    def is_authorized(self, path: str, roles: frozenset[str] | None) -> bool:
+        """Check a user's roles (None if not authenticated) against a path"""
+        required = self.match(path)
+        if required is None:
+            return True
+        return roles is not None and (not required or not required.isdisjoint(roles))
+
+
+class RoutePermissionMiddleware:
+    """ASGI middleware enforcing a RouteMatcher
+
+    - get_roles returns the roles of the request's user, None if not authenticated
+    - public paths never call get_roles
+    - answers 401 (not authenticated) or 403 (missing role) without calling the app
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        matcher: RouteMatcher,
+        get_roles: Callable[[Request], Awaitable[frozenset[str] | None]],
+    ):
+        self.app = app
+        self.matcher = matcher
+        self.get_roles = get_roles
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'http':
+            required = self.matcher.match(scope['path'])
+            if required is not None:
+                roles = await self.get_roles(Request(scope))
+                if roles is None:
+                    response = PlainTextResponse('Not authenticated', status_code=401)
+                    return await response(scope, receive, send)
+                if required and required.isdisjoint(roles):
+                    response = PlainTextResponse('Forbidden', status_code=403)
+                    return await response(scope, receive, send)
+        await self.app(scope, receive, send)
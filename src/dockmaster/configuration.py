@@ -4,6 +4,7 @@ import os
 import pathlib
 import json
 from functools import lru_cache
+from typing import Literal
 import secrets
 
 from pydantic import Field, HttpUrl, field_validator
@@ -17,6 +18,13 @@ class GoogleOAuth2Settings(BaseSettings):
     client_secret: str
     scopes : list[str] = ["openid", "email", "profile"]
     metadata_url: str = 'https://accounts.google.com/.well-known/openid-configuration'
+    discovery_ttl: float = Field(default=3600.0, description="Seconds before the discovery document is revalidated")
+    discovery_filepath: str | None = Field(default=None, description="Local copy of the discovery document for offline starts")
+    http_connect_timeout: float = Field(default=2.0, description="Seconds to connect to a Google endpoint")
+    http_read_timeout: float = Field(default=5.0, description="Seconds to wait for a Google endpoint to respond")
+    http_max_retries: int = Field(default=2, description="Retries of a failed Google request (within the retry budget)")
+    circuit_failure_threshold: int = Field(default=5, description="Consecutive failures that stop requests to a Google endpoint")
+    circuit_reset_timeout: float = Field(default=30.0, description="Seconds before a stopped Google endpoint is tried again")
 
     @field_validator('client_id', 'client_secret')
     def strip_quotes(cls, v):
@@ -36,6 +44,97 @@ def get_google_settings(dotenv_filepath=None):
     return GoogleOAuth2Settings()
 
 
+class LoggingSettings(BaseSettings):
+    """Configuration for the application logs."""
+    log_level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'] = Field(default='INFO', description="Level of the dockmaster loggers")
+    log_format: Literal['text', 'json'] = Field(default='text', description="Plain text lines or one JSON object per record")
+    log_file: str | None = Field(default=None, description="Also write the logs to this rotating file")
+    log_queue: bool = Field(default=True, description="Format and write logs on a background thread instead of the request path")
+    log_queue_size: int = Field(default=10000, description="Records buffered for the background thread before new ones are dropped")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra='ignore',
+    )
+
+def get_logging_settings(dotenv_filepath=None):
+    if dotenv_filepath is not None:
+        return LoggingSettings(_env_file=dotenv_filepath)
+    return LoggingSettings()
+
+
+class ProfilingSettings(BaseSettings):
+    """Configuration for on-demand request profiling."""
+    profiling_dir: str = Field(default='dockmaster-profiles', description="Directory of the profile files, shared by the workers")
+    profiling_max_profiles: int = Field(default=50, description="Profiles kept on disk, the oldest are removed first")
+    profiling_sample_rate: float = Field(default=0.0, ge=0.0, le=1.0, description="Fraction of requests profiled at startup, admins change it at runtime")
+    profiling_secret: str | None = Field(default=None, description="Key of signed X-Dockmaster-Profile request headers, unset disables them")
+    profiling_admin_role: str = Field(default='admin', description="RBAC role allowed to use the /admin/profiling routes")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra='ignore',
+    )
+
+def get_profiling_settings(dotenv_filepath=None):
+    if dotenv_filepath is not None:
+        return ProfilingSettings(_env_file=dotenv_filepath)
+    return ProfilingSettings()
+
+
+class SessionSettings(BaseSettings):
+    """Configuration for server side sessions."""
+    session_mode: Literal['server', 'jwt'] = Field(default='server', description="Keep sessions in the session backend or in a signed Dockmaster JWT cookie (requires DockmasterSettings)")
+    session_backend: Literal['memory', 'striped', 'redis', 'sqlite', 'shared_memory'] = Field(default='memory', description="Server side session storage backend")
+    session_stripes: int = Field(default=16, description="Number of lock stripes for the thread-safe 'striped' backend")
+    redis_url: str = Field(default='redis://localhost:6379/0', description="Server url for the 'redis' backend")
+    redis_max_connections: int = Field(default=50, description="Connection pool size for the 'redis' backend")
+    sqlite_path: str = Field(default='dockmaster-sessions.db', description="Database file for the 'sqlite' backend")
+    sqlite_flush_interval: float = Field(default=0.05, description="Maximum seconds a write waits before the 'sqlite' backend flushes it")
+    shared_memory_path: str = Field(default='/dev/shm/dockmaster-sessions', description="Table file shared by the workers for the 'shared_memory' backend")
+    shared_memory_slots: int = Field(default=32768, description="Number of session slots of the 'shared_memory' backend, the table takes about slots * (80 + value_size) bytes of /dev/shm")
+    shared_memory_value_size: int = Field(default=1024, description="Maximum serialized session size in bytes for the 'shared_memory' backend")
+    login_session_ttl: float = Field(default=300.0, description="Seconds an unfinished login (state) session is kept")
+    session_ttl: float = Field(default=3600.0, description="Seconds an authorized session is kept")
+    session_sweep_interval: float = Field(default=30.0, description="Seconds between purges of expired sessions")
+    session_max_entries: int | None = Field(default=None, description="Maximum sessions kept in memory, least recently used evicted first")
+    session_max_bytes: int | None = Field(default=None, description="Approximate memory budget of the in-memory sessions in bytes")
+    principal_cache_size: int = Field(default=10000, description="Resolved principals cached per worker for repeat requests")
+    principal_cache_ttl: float = Field(default=30.0, description="Seconds a cached principal is trusted before the session is resolved again")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra='ignore',
+    )
+
+def get_session_settings(dotenv_filepath=None):
+    if dotenv_filepath is not None:
+        return SessionSettings(_env_file=dotenv_filepath)
+    return SessionSettings()
+
+
+class AuthorizationSettings(BaseSettings):
+    """Configuration for authorizing authenticated users."""
+    allowlist: list[str] = Field(default=[], description="Allowed emails ('user@example.com'), domains ('@example.com', '@*.example.com') or '*'")
+    allowlist_filepath: str | None = Field(default=None, description="File of allowlist entries, one per line, added to allowlist")
+    no_auth: list[str] = Field(default=[], description="Paths that do not require authentication")
+    no_auth_prefixes: list[str] = Field(default=[], description="Path prefixes that do not require authentication")
+    route_roles: dict[str, list[str]] = Field(default={}, description="Path prefixes mapped to the roles allowed to access them")
+    rbac_filepath: str | None = Field(default=None, description="Local JSON file of the RBAC database")
+    rbac_secret: str | None = Field(default=None, description="Secret Manager secret of the RBAC database (projects/<project>/secrets/<secret>), wins over rbac_filepath")
+    rbac_poll_interval: float = Field(default=30.0, description="Seconds between checks of the RBAC database version")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra='ignore',
+    )
+
+def get_authorization_settings(dotenv_filepath=None):
+    if dotenv_filepath is not None:
+        return AuthorizationSettings(_env_file=dotenv_filepath)
+    return AuthorizationSettings()
+
+
 ####################
 class GoogleSSOSettings(BaseSettings):
     """Configuration for Google SSO authentication."""
@@ -63,3 +162,8 @@ class DockmasterSettings(BaseSettings):
         env_file=".env.auth",
         extra='ignore',
     )
+
+def get_dockmaster_settings(dotenv_filepath=None):
+    if dotenv_filepath is not None:
+        return DockmasterSettings(_env_file=dotenv_filepath)
+    return DockmasterSettings()
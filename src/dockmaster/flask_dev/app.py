@@ -10,7 +10,8 @@ from flask import Flask, render_template, redirect, url_for, flash
 from flask import current_app, request, abort, session
 from flask import Blueprint, jsonify
 
-from .authentication.login import auth_endpoint
+from .authentication.login import auth_endpoint, authenticated_session_exists
+from ..authorize.routes import RouteMatcher
 
 
 def get_session_key():
@@ -33,8 +34,9 @@ def get_default_config():
     https://developers.google.com/identity/protocols/oauth2/web-server#httprest
     """
     config = {
-        'NO_AUTH': [], #list of urls that do not require authentication
-        'NO_AUTH_PREFIXES' : [], #list of url prefixes that do not require authentication   
+        'NO_AUTH': ['/'], #list of urls that do not require authentication
+        'NO_AUTH_PREFIXES' : ['/auth', '/assets'], #list of url prefixes that do not require authentication   
+        'ROUTE_ROLES': {}, #url prefixes mapped to the roles allowed to access them
         'PROVIDER_CLIENT_ID': "103999402146-hr1lj72kcib0iit3fvqtd0h26b05jld8.apps.googleusercontent.com",
         'PROVIDER_AUTHORIZE_URL': 'https://accounts.google.com/o/oauth2/auth',
         'PROVIDER_TOKEN_URL': 'https://oauth2.googleapis.com/token',
@@ -51,10 +53,32 @@ app.secret_key = base64.b64decode(get_session_key())
 
 app.register_blueprint(auth_endpoint, url_prefix='/auth')
 
-# @app.before_request
-# def sso_authenticate():
-#     #authenticate with sso
-#     return login_authenticate()
+def principal_roles() -> frozenset[str] | None:
+    """Roles of the session's user, None if not authenticated"""
+    if not authenticated_session_exists():
+        return None
+    return frozenset(session.get('roles', ()))
+
+def route_permission_hook(matcher: RouteMatcher):
+    """Create a before_request hook enforcing the route permissions"""
+    def check_route_permission():
+        required = matcher.match(request.path)
+        if required is None:
+            return None
+        roles = principal_roles()
+        if roles is None:
+            abort(401)
+        if required and required.isdisjoint(roles):
+            abort(403)
+    return check_route_permission
+
+default_config = get_default_config()
+route_matcher = RouteMatcher.from_config(
+    no_auth=default_config['NO_AUTH'],
+    no_auth_prefixes=default_config['NO_AUTH_PREFIXES'],
+    route_roles=default_config['ROUTE_ROLES'],
+)
+app.before_request(route_permission_hook(route_matcher))
 
 @app.route('/')
 def index():
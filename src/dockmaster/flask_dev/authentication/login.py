@@ -10,14 +10,19 @@ from urllib.parse import urlencode
 import json
 import pathlib
 
+import requests
 from flask import Blueprint, request, session, current_app, abort
 from flask import redirect, url_for, jsonify
-from google.oauth2.id_token import verify_oauth2_token
-from google.auth.transport import requests as google_requests
 
+from ...authenticate.jwks import get_jwks_cache
 
+from ...resilience import CircuitBreaker
 from ..utils import requests_retry_session
 
+# pooled session and circuit breaker shared by all token exchanges
+token_session = requests_retry_session()
+token_endpoint_breaker = CircuitBreaker()
+
 #### Secrets ####
 def get_client_secret_key():
     """Get the client secret key from the environment
@@ -166,11 +171,22 @@ def exchange_authorization_code(authorization_code)->dict | None:
         'grant_type' : 'authorization_code'
     }
 
-    exchange_response = requests_retry_session().post(
-        url=provider_token_url,
-        data=data,
-        timeout=(5,30) #(connect_timeout, read_timeout) in seconds
-    )
+    # fail fast while the token endpoint is down instead of blocking a worker per login
+    if not token_endpoint_breaker.allow():
+        return None
+    try:
+        exchange_response = token_session.post(
+            url=provider_token_url,
+            data=data,
+            timeout=(2,5) #(connect_timeout, read_timeout) in seconds
+        )
+    except requests.RequestException:
+        token_endpoint_breaker.record_failure()
+        return None
+    if exchange_response.status_code>=500:
+        token_endpoint_breaker.record_failure()
+    else:
+        token_endpoint_breaker.record_success()
     if exchange_response.status_code!=200:
         return None
     return exchange_response.json()
@@ -182,13 +198,13 @@ def get_valid_id_profile(id_token:str,client_id:str,clock_skew_in_seconds:int=0)
 
     see google developer docs for more info
     - (https://developers.google.com/identity/gsi/web/guides/verify-google-id-token#using-a-google-api-client-library)
+    - signature is checked locally against the process-wide google signing key cache
     """
     try:
-        id_profile = verify_oauth2_token(
+        id_profile = get_jwks_cache().verify_id_token(
             id_token=id_token, 
-            request=google_requests.Request(), 
             audience=client_id, 
-            clock_skew_in_seconds=0
+            clock_skew_in_seconds=clock_skew_in_seconds
         )
         return id_profile
     except ValueError as e:
@@ -4,19 +4,27 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-def requests_retry_session(retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None):
+def requests_retry_session(retries=2, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), session=None, backoff_jitter=0.3):
     """Create a requests session that implements retries
     - use for critical requests that may occur over unreliable networks
     - e.g. google auth requests sometimes experiance 5XX server errors
       (https://www.bluefrontier.co.uk/company/blog/item/a-guide-to-http-500-server-error-codes)
+    - only idempotent methods are retried after the request was sent (a POST
+      is retried on connect errors only), backoff is jittered and honors Retry-After
+    - reuse the session, it pools connections
     """
     session = requests.Session() if session is None else session
     retry = Retry(
         total=retries,
         read=retries,
         connect=retries,
+        status=retries,
         backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
         status_forcelist=status_forcelist,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
     )
     adapter = HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
@@ -1,12 +1,131 @@
+import atexit
+import contextvars
+import datetime
+import json
 import logging.handlers
 import os
 import logging
+import queue
+import re
+import uuid
+
+# id of the request being handled, set by RequestIdMiddleware
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar('request_id', default=None)
+
+# attributes every LogRecord has, anything else was passed with extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIdFilter(logging.Filter):
+    """Add the current request id to every record (None outside a request)"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request id,
+    source location, exception and any extra= fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'location': f"{record.filename}:{record.lineno}",
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler on a bounded queue that never blocks the caller
+
+    - only the %-style message is merged on the calling thread, formatting
+      and I/O happen on the QueueListener thread
+    - a full queue drops the record and counts it, a WARNING or higher
+      replaces the oldest queued lower-level record instead if there is one
+    """
+    def __init__(self, queue: queue.Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # args may be mutated after the call returns, merge them now
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.WARNING and self._replace_lower(record):
+            return
+        self.dropped += 1
+
+    def _replace_lower(self, record: logging.LogRecord) -> bool:
+        """Swap the oldest queued record below WARNING for record (same size, no wait)"""
+        with self.queue.mutex:
+            records = self.queue.queue
+            for i, queued in enumerate(records):
+                if queued.levelno < logging.WARNING:
+                    del records[i]
+                    records.append(record)
+                    self.dropped += 1
+                    return True
+        return False
+
+    def stats(self) -> dict[str, int]:
+        return {'queued': self.queue.qsize(), 'dropped': self.dropped}
+
+
+def queue_handler(logger_name: str = "dockmaster") -> BoundedQueueHandler | None:
+    """The queue handler of a logger configured with use_queue, None otherwise"""
+    for handler in logging.getLogger(logger_name).handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            return handler
+    return None
+
+
+# queue listener per configured logger, stopped when replaced or at exit (flushes the queue)
+_listeners: dict[str, logging.handlers.QueueListener] = {}
+
+
+def _stop_listener(logger_name: str):
+    listener = _listeners.pop(logger_name, None)
+    if listener is not None:
+        listener.stop()
+
+
+@atexit.register
+def _stop_listeners():
+    for logger_name in list(_listeners):
+        _stop_listener(logger_name)
+
 
 def setup_logging(
     logger_name : str = "dockmaster",
-    log_level: str | None = None, 
-    log_file: str | None = None
+    log_level: str | None = None,
+    log_file: str | None = None,
+    log_format: str = "text",
+    use_queue: bool = False,
+    queue_size: int = 10000,
 ):
+    """Configure a logger's handlers, replacing the ones it had
+
+    log_format: 'text' or 'json' (one object per line)
+    use_queue: write through a bounded queue drained by a background thread
+    queue_size: records buffered before new ones are dropped
+    """
     if not log_level:
         # Default log level from environment variable, default to INFO
         log_level = "INFO"
@@ -14,23 +133,42 @@ def setup_logging(
     # Create a logger
     logger = logging.getLogger(logger_name)
     logger.setLevel(log_level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    _stop_listener(logger_name)
 
     # Create formatters
-    console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
+    if log_format == "json":
+        console_formatter = file_formatter = JSONFormatter()
+    else:
+        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s')
+        file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(filename)s:%(lineno)d - %(message)s')
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(log_level)
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
 
-    # (optional) File handler 
+    # (optional) File handler
     if log_file:
         file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=10*1024*1024, backupCount=5)
         file_handler.setLevel(log_level)
         file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    if use_queue:
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size))
+        # the request id context is only visible on the calling thread
+        queue_handler.addFilter(RequestIdFilter())
+        logger.addHandler(queue_handler)
+        listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[logger_name] = listener
+    else:
+        for handler in handlers:
+            handler.addFilter(RequestIdFilter())
+            logger.addHandler(handler)
 
     return logger
 
@@ -44,10 +182,49 @@ def setup_uvicorn_logger(log_level: str | None = None):
     return logger
 
 
+#### Request id ####
+_REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+
+class RequestIdMiddleware:
+    """Raw ASGI middleware binding a request id to the logs of each request
+
+    - reuses a well formed X-Request-ID header (e.g. set by the proxy),
+      otherwise generates one, and returns it in the response
+    """
+    def __init__(self, app, header: str = 'x-request-id'):
+        self.app = app
+        self.header = header.lower().encode('latin-1')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope['headers']:
+            if name == self.header:
+                candidate = value.decode('latin-1')
+                if _REQUEST_ID_PATTERN.fullmatch(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(self.header, request_id.encode('latin-1'))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
 
 # Create the default logger instance
 logger = setup_logging(
     logger_name = "dockmaster",
-    log_level = "INFO", 
+    log_level = "INFO",
     log_file = None
-)
\ No newline at end of file
+)
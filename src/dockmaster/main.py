@@ -1,78 +1,307 @@
 from typing import Annotated
 import json
-from datetime import datetime, timezone
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import quote
 
 import httpx
-from fastapi import FastAPI, Cookie
+from fastapi import FastAPI, Cookie, Query
 from fastapi.requests import Request
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response, PlainTextResponse, FileResponse
 from fastapi import HTTPException
 
-from .configuration import GoogleOAuth2Settings, get_google_settings
-from .logger_config import setup_uvicorn_logger
-from .authenticate.google import GoogleOAuth2Client
-from .session.memory_session import MemorySession
-from .session.schemas import SessionInterface
+from .configuration import get_google_settings, get_session_settings, get_dockmaster_settings
+from .configuration import get_authorization_settings, get_logging_settings, get_profiling_settings
+from .logger_config import RequestIdMiddleware, queue_handler, setup_logging
+from .authenticate.google import AsyncGoogleOAuth2Client
+from .authenticate.discovery import DiscoveryCache
+from .authenticate.user_token import UserTokenSigner
+from .singleflight import AsyncSingleFlight
+from .resilience import ResiliencePolicy, RetryPolicy
+from .metrics import CONTENT_TYPE, HTTPMetrics, MetricsMiddleware, MetricsRegistry, UpstreamMetrics
+from .metrics import stats_collector, threadpool_collector
+from .profiling import ProfileStore, Profiler, ProfilingMiddleware, span
+from .authorize.allowlist import Allowlist, create_allowlist
+from .authorize.routes import RouteMatcher, RoutePermissionMiddleware
+from .authorize.rbac import RBACLoader, create_rbac_loader, run_rbac_poller
+from .session.schemas import AsyncSessionInterface
+from .session.records import SessionRecord
+from .session.principal_cache import PrincipalCache
+from .session.manager import create_async_session_backend, run_expiry_sweeper
 
-app_logger = setup_uvicorn_logger(log_level="DEBUG")
-app = FastAPI()
-
-def query_discovery(metadata_url):
-    r = httpx.get(metadata_url)
-    return r.json()
+logging_settings = get_logging_settings()
+setup_logging(
+    logger_name="dockmaster",
+    log_level=logging_settings.log_level,
+    log_file=logging_settings.log_file,
+    log_format=logging_settings.log_format,
+    use_queue=logging_settings.log_queue,
+    queue_size=logging_settings.log_queue_size,
+)
+app_logger = logging.getLogger(__name__)
 
 google_settings = get_google_settings()
-discovery = query_discovery(google_settings.metadata_url)
-oauth_client = GoogleOAuth2Client(
+session_settings = get_session_settings()
+discovery = DiscoveryCache(
+    metadata_url=google_settings.metadata_url,
+    ttl=google_settings.discovery_ttl,
+    filepath=google_settings.discovery_filepath,
+)
+metrics = MetricsRegistry()
+http_metrics = HTTPMetrics(metrics)
+google_resilience = ResiliencePolicy(
+    retry=RetryPolicy(max_retries=google_settings.http_max_retries),
+    failure_threshold=google_settings.circuit_failure_threshold,
+    reset_timeout=google_settings.circuit_reset_timeout,
+)
+oauth_client = AsyncGoogleOAuth2Client(
     client_id=google_settings.client_id,
     client_secret=google_settings.client_secret,
     scopes=google_settings.scopes,
     redirect_uri=None,
+    timeout=httpx.Timeout(google_settings.http_read_timeout, connect=google_settings.http_connect_timeout, pool=1.0),
+    resilience=google_resilience,
+    metrics=UpstreamMetrics(metrics),
+)
+# concurrent duplicate callbacks of one login
+login_flight = AsyncSingleFlight()
+authorization_settings = get_authorization_settings()
+allowlist: Allowlist = create_allowlist(authorization_settings)
+rbac_loader: RBACLoader | None = create_rbac_loader(authorization_settings)
+server_session: AsyncSessionInterface = create_async_session_backend(session_settings)
+principal_cache = PrincipalCache(
+    max_entries=session_settings.principal_cache_size,
+    max_age=session_settings.principal_cache_ttl,
+)
+# scrape-time gauges and counters of the stores (no work on the request path)
+metrics.add_collector(stats_collector(
+    'dockmaster_session_store', 'Session store', getattr(server_session, 'stats', dict),
+    counters=('evictions_transient', 'evictions_session', 'expirations', 'hits', 'misses', 'store_failures'),
+))
+metrics.add_collector(stats_collector(
+    'dockmaster_principal_cache', 'Principal cache', principal_cache.stats, counters=('hits', 'misses'),
+))
+metrics.add_collector(threadpool_collector)
+log_queue = queue_handler("dockmaster")
+if log_queue is not None:
+    metrics.add_collector(stats_collector(
+        'dockmaster_log_queue', 'Log queue', log_queue.stats, counters=('dropped',),
+    ))
+
+def circuit_collector():
+    samples = [
+        ('', {'host': host}, float(state != 'closed')) for host, state in sorted(google_resilience.breakers().items())
+    ]
+    yield 'dockmaster_upstream_circuit_open', 'gauge', 'Upstream host circuit is open or half open', samples
+
+metrics.add_collector(circuit_collector)
+
+profiling_settings = get_profiling_settings()
+profiler = Profiler(
+    store=ProfileStore(profiling_settings.profiling_dir, max_profiles=profiling_settings.profiling_max_profiles),
+    sample_rate=profiling_settings.profiling_sample_rate,
+    secret=profiling_settings.profiling_secret,
+)
+
+# jwt mode: the session cookie is a signed token, only login state uses server_session
+user_token_signer = (
+    UserTokenSigner.from_settings(get_dockmaster_settings())
+    if session_settings.session_mode == 'jwt' else None
+)
+
+async def start_session(record: SessionRecord) -> tuple[str, int]:
+    """Persist an authorized session, return the cookie value and its max age"""
+    if user_token_signer is not None:
+        token = user_token_signer.issue(record)
+        return token, int(min(user_token_signer.expiration, session_settings.session_ttl))
+    session_id = await server_session.store_data(record, ttl=session_settings.session_ttl)
+    return session_id, int(session_settings.session_ttl)
+
+async def load_session(session_id: str) -> SessionRecord | None:
+    """Resolve the session cookie to an authorized session
+    - repeat requests are served from the principal cache (no store I/O or crypto)
+    - jwt mode verifies the token signature, no session store lookup
+    """
+    record = principal_cache.get(session_id)
+    if record is not None:
+        return record
+    if user_token_signer is not None:
+        record = user_token_signer.verify(session_id)
+    else:
+        session_data = await server_session.retrieve_data(session_id)
+        # login (state) sessions are not authorized sessions
+        record = session_data if isinstance(session_data, SessionRecord) else None
+    if record is not None:
+        principal_cache.put(session_id, record)
+    return record
+
+async def end_session(session_id: str):
+    """Forget a session, a signed token is only dropped from the cache (it just expires)"""
+    principal_cache.invalidate(session_id)
+    if user_token_signer is None:
+        await server_session.remove_data(session_id)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the pooled outbound http client, load discovery and RBAC, sweep 
+    expired sessions and poll RBAC changes for the lifetime of the app"""
+    async with oauth_client:
+        try:
+            await discovery.load(oauth_client.http_client)
+        except (httpx.HTTPError, ValueError) as e:
+            # start anyway, routes retry the fetch on first use
+            app_logger.warning("Could not load discovery document. %s", e)
+        tasks = [asyncio.create_task(
+            run_expiry_sweeper(server_session, interval=session_settings.session_sweep_interval)
+        )]
+        if rbac_loader is not None:
+            try:
+                await asyncio.to_thread(rbac_loader.load)
+            except Exception as e:
+                # no roles until the poller loads the database
+                app_logger.warning("Could not load RBAC database. %s", e)
+            tasks.append(asyncio.create_task(
+                run_rbac_poller(rbac_loader, interval=authorization_settings.rbac_poll_interval)
+            ))
+        try:
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+            await server_session.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# routes of this service are public, anything else needs a session
+NO_AUTH = ['/', '/login/google', '/callback/google', '/logout', '/principal', '/discovery', '/config', '/docs', '/redoc', '/openapi.json', '/metrics']
+NO_AUTH_PREFIXES = ['/auth']
+route_matcher = RouteMatcher.from_config(
+    no_auth=NO_AUTH + authorization_settings.no_auth,
+    no_auth_prefixes=NO_AUTH_PREFIXES + authorization_settings.no_auth_prefixes,
+    route_roles={'/admin/profiling': [profiling_settings.profiling_admin_role], **authorization_settings.route_roles},
 )
-server_session: SessionInterface = MemorySession()
+
+async def principal_roles(request: Request) -> frozenset[str] | None:
+    """Roles of the request's user, None if not authenticated"""
+    session_id = request.cookies.get('session_id')
+    record = await load_session(session_id) if session_id else None
+    if record is None:
+        return None
+    return rbac_loader.roles_of(record.user_id) if rbac_loader is not None else frozenset()
+
+app.add_middleware(RoutePermissionMiddleware, matcher=route_matcher, get_roles=principal_roles)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+# outermost: requests rejected by the permission check are counted too
+app.add_middleware(MetricsMiddleware, metrics=http_metrics)
+app.add_middleware(RequestIdMiddleware)
+
+async def get_metadata()->dict:
+    """Get the cached discovery document"""
+    try:
+        metadata = await discovery.get(oauth_client.http_client)
+    except (httpx.HTTPError, ValueError) as e:
+        app_logger.warning("Discovery document unavailable. %s", e)
+        raise HTTPException(status_code=503, detail="Discovery document unavailable")
+    # ID tokens are verified against the provider the metadata_url points to
+    oauth_client.use_discovery(metadata)
+    return metadata
 
 @app.get('/auth/health')
-def health_check():
+async def health_check():
     return {
         "service" : "dockmaster",
         'status': 'ok'
     }
 
+# characters of an ASCII email address sent as is, anything else is percent-encoded
+_HEADER_SAFE = "@!#$&'*+-/=?^_`{|}~."
+
+def identity_header(value: str) -> str:
+    """Header-safe identity value: percent-encoded UTF-8 (RFC 3986), ASCII
+    addresses are unchanged unless they contain '%', decode with urllib.parse.unquote"""
+    return quote(value, safe=_HEADER_SAFE)
+
+async def verify_forward_auth(request: Request) -> Response:
+    """Forward-auth check for reverse proxies (nginx auth_request, Traefik ForwardAuth)
+    - 204 with identity headers if the session cookie is valid, else 401
+    - identity headers are percent-encoded so internationalized addresses fit a header
+    - no body and no logging, it runs in front of every upstream request
+    """
+    session_id = request.cookies.get('session_id')
+    record = await load_session(session_id) if session_id else None
+    if record is None:
+        return Response(status_code=401)
+    return Response(
+        status_code=204,
+        headers={'X-Auth-User': identity_header(record.user_id), 'X-Auth-Email': identity_header(record.email)},
+    )
+
+# plain starlette route: skips fastapi parameter parsing and response validation
+app.add_route('/auth/verify', verify_forward_auth, methods=['GET'], include_in_schema=False)
+
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint (restrict access at the proxy)"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get('/admin/profiling', include_in_schema=False)
+async def get_profiling():
+    """Profiling state of this worker and the stored profiles, newest first"""
+    return {
+        'sample_rate': profiler.sample_rate,
+        'signed_header': profiler.secret is not None,
+        'profiles': await asyncio.to_thread(profiler.store.list),
+    }
+
+@app.put('/admin/profiling', include_in_schema=False)
+async def set_profiling(sample_rate: Annotated[float, Query(ge=0.0, le=1.0)]):
+    """Profile a fraction of this worker's requests (0 stops sampling)"""
+    profiler.sample_rate = sample_rate
+    app_logger.info("Profiling sample rate set to %s.", sample_rate)
+    return {'sample_rate': profiler.sample_rate}
+
+@app.get('/admin/profiling/profiles/{filename}', include_in_schema=False)
+async def download_profile(filename: str):
+    """Download a profile: <id>.json (spans and top functions) or <id>.prof (pstats)"""
+    path = profiler.store.path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = 'application/json' if filename.endswith('.json') else 'application/octet-stream'
+    return FileResponse(path, media_type=media_type, filename=filename)
+
 @app.get('/discovery')
-def get_discovery(request: Request):
-    url = google_settings.metadata_url
-    r = httpx.get(url)
-    return r.json()
+async def get_discovery(request: Request):
+    return await get_metadata()
 
 
 @app.get('/config')
-def get_config(request: Request):
+async def get_config(request: Request):
     return google_settings
 
 
 @app.get('/')
-@app.get('/')
-def homepage(request: Request, session_id: Annotated[str | None, Cookie()] = None):
+async def homepage(request: Request, session_id: Annotated[str | None, Cookie()] = None):
     #Proxy for a auth check via session_id
     if session_id is not None:
-        app_logger.debug(f"Found credentials in cookies. {session_id=}")
+        app_logger.debug("Found credentials in cookies.")
         #verify session and remove cookie
-        session_data=server_session.retrieve_data(session_id)
+        session_data = await load_session(session_id)
         if session_data is None:
-            app_logger.debug(f"Session data not found. Removing {session_id=}")
-            server_session.remove_data(session_id)
+            app_logger.debug("Session data not found. Removing session cookie.")
+            await end_session(session_id)
             response = RedirectResponse(url='/')
             response.delete_cookie('session_id')
             return response
         else:
-            app_logger.debug(f"Session data found. {list(session_data.keys())}")
+            app_logger.debug("Session data found for %s.", session_data.user_id)
             #Only login if session_data is available
-            app_logger.debug(f"{session_id=}")
             
             #Obtain profile if available
-            user_id = session_data.get('user_id')
-            user_profile = session_data.get('user_profile',{})
-            image_url = user_profile.get('picture', None)
+            user_id = session_data.user_id
+            user_profile = session_data.profile()
+            image_url = session_data.picture or None
             
             #Render HTML
             html_user_id = f'<div><h2> User ID: {user_id}</h2></div>' if user_id else '<div></div>'
@@ -90,8 +319,7 @@ def homepage(request: Request, session_id: Annotated[str | None, Cookie()] = Non
                 '</div>'
             )
             return HTMLResponse(html)
-    app_logger.debug(f"No credentials found. Showing public homepage.")
-    app_logger.debug(f"{session_id=}")
+    app_logger.debug("No credentials found. Showing public homepage.")
     html_content = (
         '<div>'
         '<h1> Dockmaster - Public </h1>'
@@ -102,132 +330,174 @@ def homepage(request: Request, session_id: Annotated[str | None, Cookie()] = Non
     return HTMLResponse(html_content)
 
 @app.get('/login/google')
-def google_login(request: Request):
+async def google_login(request: Request):
     """OAuth2 flow, step 1: have the user log into google to obtain an authorization code grant
     """
-    redirect_uri = request.url_for('google_callback') #make sure this is added to the google IAM allowed paths
-    app_logger.debug(f"Redirect after authentication to: {redirect_uri}")
-    authorization_endpoint=discovery['authorization_endpoint'] 
+    redirect_uri = str(request.url_for('google_callback')) #make sure this is added to the google IAM allowed paths
+    app_logger.debug("Redirect after authentication to: %s", redirect_uri)
+    metadata = await get_metadata()
+    authorization_endpoint=metadata['authorization_endpoint'] 
 
     # Create state and pass in
     uri, state = oauth_client.create_authorization_url(
         authorization_endpoint=authorization_endpoint,
         redirect_uri=redirect_uri
     )
-    app_logger.debug(uri)
-    app_logger.debug(f"{state=}")
     
     # Create login session and store state
-    session_id = server_session.store_data({'state': state})
-    app_logger.debug(f"Created authentication flow session. {session_id=}")
+    # - the code exchange repeats the redirect_uri, keep it with the login (any worker serves the callback)
+    session_id = await server_session.store_data(
+        {'state': state, 'redirect_uri': redirect_uri}, ttl=session_settings.login_session_ttl, transient=True
+    )
+    app_logger.debug("Created authentication flow session.")
 
     # Redirect with login session cookie
     response = RedirectResponse(url=uri)
     #TODO: configurable cookie name for dockmaster
-    response.set_cookie('session_id', session_id, secure=True, httponly=True, samesite='lax') 
+    response.set_cookie(
+        'session_id', session_id, max_age=int(session_settings.login_session_ttl),
+        secure=True, httponly=True, samesite='lax'
+    )
     return response
 
-@app.get('/callback/google')
-def google_callback(
-    request: Request, 
-    code: str, 
-    state: str | None = None, 
-    session_id: Annotated[str | None, Cookie()] = None
-):
-    """OAuth2 flow, step 2: exchange the authorization code for access token
+async def complete_login(login_session_id: str, code: str, state: str | None, redirect_uri: str) -> tuple[str, int]:
+    """Consume the login session, exchange the code and create the authorization session
+    - redirect_uri: this callback's url, used if the login session does not carry one
+    - returns the session cookie value and its max age
     """
-    redirect_uri = request.url_for('homepage')
-    app_logger.debug(f"Redirect after token exchange to: {redirect_uri}")
-    
-    # Validate login session (state + code)
-    if (session_id is None):
-        app_logger.warning("Session not found.")
-        raise HTTPException(status_code=401, detail="Session not found")
-    app_logger.debug(f"Found a login session {session_id=}")
-    session_data = server_session.retrieve_data(session_id)
-    session_state = session_data.get('state')
-    if state != session_state:
-        app_logger.warning("Unauthorized request. Session state '{session_state}' does not match state '{state}'.")
+    # check state and consume the login session in one step
+    with span('state_check'):
+        session_data = await server_session.pop_if_state_matches(login_session_id, state)
+    if session_data is None:
+        app_logger.warning("Unauthorized request. Login session expired or state does not match.")
         raise HTTPException(status_code=401, detail="Session not found")
-    server_session.remove_data(session_id)
 
     # Exchange valid code for tokens
-    access_token_url=discovery['token_endpoint'] #exchange the code for access tokens
+    with span('discovery'):
+        metadata = await get_metadata()
+    access_token_url=metadata['token_endpoint'] #exchange the code for access tokens
+    redirect_uri = session_data.get('redirect_uri', redirect_uri)
     try:
-        # TODO: implement retry logic on the client here for token exchange
-        tokens = oauth_client.exchange_code_for_tokens(access_token_url, code)
-        app_logger.debug(f"Code '{code=}' exchanged successfully.")
-        app_logger.debug(f"{tokens.keys()}")
-    except Exception as e:
-        app_logger.debug(f"Cannot exchange code, {e}")
-        raise HTTPException(status_code=401, detail=e)
+        # retries, timeouts and circuit breaking are applied by the client's transport
+        with span('exchange'):
+            tokens = await oauth_client.exchange_code_for_tokens(access_token_url, code, redirect_uri)
+        app_logger.debug("Code exchanged successfully, received %s.", sorted(tokens))
+    except httpx.TransportError as e:
+        # timed out, unreachable or circuit open: fail fast
+        app_logger.warning("Token endpoint unavailable. %s", e)
+        raise HTTPException(status_code=503, detail="Login provider unavailable")
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code >= 500:
+            app_logger.warning("Token endpoint unavailable. %s", e)
+            raise HTTPException(status_code=503, detail="Login provider unavailable")
+        # invalid, expired or already used code
+        app_logger.debug("Cannot exchange code. %s", e)
+        raise HTTPException(status_code=401, detail="Cannot exchange code")
+    except json.JSONDecodeError as e:
+        app_logger.warning("Invalid token endpoint response. %s", e)
+        raise HTTPException(status_code=502, detail="Invalid login provider response")
     
     # Verify ID token and obtain Dockmaster User ID
     id_token = tokens['id_token']
-    app_logger.debug(f"Code exchanged for id_token={id_token}")
-    id_token_payload = oauth_client.verify_google_id_token(id_token)
+    with span('verify'):
+        id_token_payload = await oauth_client.verify_google_id_token(id_token)
     # - obtain unique user_id for dockmaster
     # TODO: For more login mehtods:
     #       use id_token_payload['sub'] with a 'google_' prefix as global_user_id in a database
     #       use database table to find dockmaster_user_id from global_user_id
     #       Allows various global_user_id to dockmaster_user_id many to one mapping for multiple login approaches
-    #TODO: check a list of authorized user_ids
-    #      - fail fast on authentication check
     user_id = id_token_payload.get('email') #dockmaster user_id
+    if not user_id:
+        app_logger.warning("Unauthorized request. ID token could not be verified.")
+        raise HTTPException(status_code=401, detail="Invalid ID token")
+
+    # Authorize the verified email before creating a session (fail fast)
+    if not id_token_payload.get('email_verified') or not allowlist.is_allowed(user_id):
+        app_logger.warning("Forbidden request. %s is not authorized.", user_id)
+        raise HTTPException(status_code=403, detail="User not authorized")
 
     # Obtain RBAC roles and create JWT
 
     # Create an authorization session
-    session_data = {
-        'user_id': user_id,
-        'user_profile' : id_token_payload,
-        'tokens': tokens,
-        'created_at': datetime.now(timezone.utc)
-    }
-    session_id = server_session.store_data(session_data)
-    app_logger.debug(f"Created authorization session. {session_id=}")
+    # - keep only the profile fields the routes show, not the full token response
+    with span('session_write'):
+        session_data = SessionRecord.from_id_token(
+            user_id=user_id,
+            id_token_payload=id_token_payload,
+            expires_at=time.time() + session_settings.session_ttl,
+        )
+        session_id, max_age = await start_session(session_data)
+    app_logger.debug("Created authorization session for %s.", user_id)
+    return session_id, max_age
+
+@app.get('/callback/google')
+async def google_callback(
+    request: Request, 
+    code: str, 
+    state: str | None = None, 
+    session_id: Annotated[str | None, Cookie()] = None
+):
+    """OAuth2 flow, step 2: exchange the authorization code for access token
+    """
+    redirect_uri = request.url_for('homepage')
+    app_logger.debug("Redirect after token exchange to: %s", redirect_uri)
+    
+    # Validate login session (state + code)
+    if (session_id is None):
+        app_logger.warning("Session not found.")
+        raise HTTPException(status_code=401, detail="Session not found")
+    app_logger.debug("Found a login session.")
+    callback_uri = str(request.url_for('google_callback'))
+    # a re-submitted callback (same login session and state) joins the login in flight
+    session_id, max_age = await login_flight.do(
+        (session_id, state), lambda: complete_login(session_id, code, state, callback_uri)
+    )
 
     # Redirect to home with auth cookie
     # TODO: allow pass through redirect after successful login?
     response = RedirectResponse(url=redirect_uri)
-    response.set_cookie('session_id', session_id, secure=True, httponly=True, samesite='lax')
+    response.set_cookie(
+        'session_id', session_id, max_age=max_age,
+        secure=True, httponly=True, samesite='lax'
+    )
     return response
 
 
 @app.get('/logout')
-def logout(request: Request):
+async def logout(request: Request, session_id: Annotated[str | None, Cookie()] = None):
+    if session_id is not None:
+        await end_session(session_id)
     response = RedirectResponse(url='/')
     response.delete_cookie('session_id')
     return response
 
 @app.get('/principal')
-def get_principal(request: Request, session_id: Annotated[str | None, Cookie()] = None):
+async def get_principal(request: Request, session_id: Annotated[str | None, Cookie()] = None):
     """Returnuser iof logged in or None"""
     #Proxy for a auth check via session_id
     if session_id is None:
-        app_logger.debug(f"Could not find credentials.")
+        app_logger.debug("Could not find credentials.")
         response = JSONResponse(content={})
         response.delete_cookie('session_id')
         return response
     
-    app_logger.debug(f"Found credentials in cookies. {session_id=}")
+    app_logger.debug("Found credentials in cookies.")
     #verify session and remove cookie
-    session_data=server_session.retrieve_data(session_id)
+    session_data = await load_session(session_id)
     if session_data is None:
-        app_logger.debug(f"Session data not found. Removing {session_id=}")
-        server_session.remove_data(session_id)
+        app_logger.debug("Session data not found. Removing session cookie.")
+        await end_session(session_id)
         response = JSONResponse(content={})
         response.delete_cookie('session_id')
         return response
     # Grab user and return it
-    app_logger.debug(f"Session data found. {list(session_data.keys())}")
+    app_logger.debug("Session data found for %s.", session_data.user_id)
     #Only login if session_data is available
-    app_logger.debug(f"{session_id=}")
     
     #Obtain profile if available
-    user_id = session_data.get('user_id')
-    user_profile = session_data.get('user_profile',{})
-    image_url = user_profile.get('picture', None)
+    user_id = session_data.user_id
+    user_profile = session_data.profile()
+    image_url = session_data.picture or None
     
     return JSONResponse(content={'user_id': user_id, 'user_profile': user_profile, 'image_url': image_url})
     
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""Metrics in the Prometheus text exposition format.
+
+Updates never take a lock: every thread writes its own shard (a plain dict)
+and a scrape sums the shards. Only the first update from a new thread
+registers its shard under a lock.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Iterable
+
+import anyio.to_thread
+import httpx
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name suffix, labels, value) samples of a metric family
+Samples = Iterable[tuple[str, dict[str, str], float]]
+# (name, type, documentation, samples) produced by a collector at scrape time
+Family = tuple[str, str, str, Samples]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Shards:
+    """Per-thread dicts, each written only by its own thread"""
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: list[dict] = []
+
+    def mine(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def snapshot(self) -> list[dict]:
+        """Copies of all shards (a dict copy is atomic under the GIL)"""
+        with self._lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+
+    def _labels(self, key: tuple) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonic count per label values"""
+    type = 'counter'
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        shard = self._shards.mine()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        totals: dict[tuple, float] = {}
+        for shard in self._shards.snapshot():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def collect(self) -> Iterable[Family]:
+        samples = [('', self._labels(key), value) for key, value in sorted(self.values().items())]
+        yield self.name, self.type, self.documentation, samples
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. requests in flight)"""
+    type = 'gauge'
+
+    def dec(self, *labelvalues: str, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets, with their sum and count"""
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str):
+        shard = self._shards.mine()
+        state = shard.get(labelvalues)
+        if state is None:
+            # per bucket counts (last one is +Inf), then the sum
+            state = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def collect(self) -> Iterable[Family]:
+        totals: dict[tuple, list] = {}
+        for shard in self._shards.snapshot():
+            for key, state in shard.items():
+                total = totals.setdefault(key, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        samples = []
+        for key, state in sorted(totals.items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative))
+            samples.append(('_count', labels, cumulative))
+            samples.append(('_sum', labels, state[-1]))
+        yield self.name, self.type, self.documentation, samples
+
+
+class MetricsRegistry:
+    """Metrics and scrape-time collectors rendered together"""
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable[Family]]] = []
+
+    def _register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a function producing metric families when scraped (e.g. store sizes)"""
+        self._collectors.append(collector)
+
+    def collect(self) -> Iterable[Family]:
+        for metric in self._metrics.values():
+            yield from metric.collect()
+        for collector in self._collectors:
+            yield from collector()
+
+    def render(self) -> str:
+        """All metrics in the text exposition format"""
+        lines = []
+        for name, metric_type, documentation, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def stats_collector(
+    prefix: str,
+    documentation: str,
+    stats: Callable[[], dict[str, int]],
+    counters: Iterable[str] = (),
+) -> Callable[[], Iterable[Family]]:
+    """Collector exposing a stats() dict, one metric per key
+
+    counters: keys that only grow (exposed as <prefix>_<key>_total), other keys are gauges
+    """
+    counters = frozenset(counters)
+
+    def collect() -> Iterable[Family]:
+        for key, value in stats().items():
+            if key in counters:
+                yield f"{prefix}_{key}_total", 'counter', f"{documentation}: {key}", [('', {}, value)]
+            else:
+                yield f"{prefix}_{key}", 'gauge', f"{documentation}: {key}", [('', {}, value)]
+    return collect
+
+
+def threadpool_collector() -> Iterable[Family]:
+    """Busy and total worker threads of the AnyIO threadpool (call on the event loop)"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    yield 'dockmaster_threadpool_busy_threads', 'gauge', 'Threadpool workers running a call', [('', {}, limiter.borrowed_tokens)]
+    yield 'dockmaster_threadpool_max_threads', 'gauge', 'Threadpool worker limit', [('', {}, limiter.total_tokens)]
+
+
+#### HTTP server ####
+class HTTPMetrics:
+    """Metrics of the requests served by the app"""
+    def __init__(self, registry: MetricsRegistry):
+        self.requests = registry.counter(
+            'dockmaster_http_requests_total', 'Requests served', ('method', 'route', 'status')
+        )
+        self.duration = registry.histogram(
+            'dockmaster_http_request_duration_seconds', 'Request latency', ('method', 'route')
+        )
+        self.in_flight = registry.gauge('dockmaster_http_requests_in_flight', 'Requests being served')
+
+
+def route_label(scope: dict) -> str:
+    """Route template of a request, bounded so ids in paths do not create series"""
+    route = scope.get('route')
+    # set by the router once a route matched, unmatched paths share one label
+    return getattr(route, 'path', 'unmatched')
+
+
+class MetricsMiddleware:
+    """Raw ASGI middleware timing every request by route and status"""
+    def __init__(self, app, metrics: HTTPMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        metrics.in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.in_flight.dec()
+            route = route_label(scope)
+            metrics.duration.observe(elapsed, scope['method'], route)
+            metrics.requests.inc(scope['method'], route, str(status))
+
+
+#### Upstream calls ####
+def upstream_call(url: httpx.URL) -> str:
+    """Name of an OpenID endpoint call from its url"""
+    path = url.path
+    if path.endswith('openid-configuration'):
+        return 'discovery'
+    if path.endswith('/token'):
+        return 'token'
+    if path.endswith('/certs') or path.endswith('jwks'):
+        return 'certs'
+    return url.host
+
+
+class UpstreamMetrics:
+    """Metrics of outbound calls (discovery, token exchange and refresh, certs)"""
+    def __init__(self, registry: MetricsRegistry):
+        self.requests = registry.counter(
+            'dockmaster_upstream_requests_total', 'Outbound calls by outcome', ('call', 'outcome')
+        )
+        self.duration = registry.histogram(
+            'dockmaster_upstream_request_duration_seconds', 'Outbound call latency including retries', ('call',)
+        )
+
+
+class AsyncMetricsTransport(httpx.AsyncBaseTransport):
+    """httpx transport timing every call, outcome is the status or the error class"""
+    def __init__(self, transport: httpx.AsyncBaseTransport, metrics: UpstreamMetrics):
+        self._transport = transport
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        call = upstream_call(request.url)
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            self.metrics.requests.inc(call, type(e).__name__)
+            raise
+        finally:
+            self.metrics.duration.observe(time.perf_counter() - start, call)
+        self.metrics.requests.inc(call, str(response.status_code))
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,258 @@
+"""On-demand profiling of single requests.
+
+A request is profiled when it carries a valid signed X-Dockmaster-Profile
+header or is picked by the admin-controlled sample rate. Its cProfile trace
+and the timings of its spans (named phases, e.g. of the login callback) are
+written to a bounded ring of files that admins download.
+"""
+import asyncio
+import cProfile
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from .logger_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'x-dockmaster-profile'
+# <id>.json (spans and top functions) or <id>.prof (pstats dump)
+_FILENAME_PATTERN = re.compile(r'\d{8}T\d{12}-\d+-[0-9a-f]{8}\.(json|prof)')
+
+
+def sign_profile_request(secret: str, ttl: float = 300.0) -> str:
+    """X-Dockmaster-Profile header value valid for ttl seconds: <expires>.<hmac>"""
+    expires = str(int(time.time() + ttl))
+    signature = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_request(secret: str, value: str) -> bool:
+    """Check a header value is signed with secret and not expired"""
+    expires, _, signature = value.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+#### Spans ####
+@dataclass
+class Profile:
+    """Spans of a profiled request"""
+    id: str
+    method: str
+    path: str
+    trigger: str
+    request_id: str | None = None
+    start: float = field(default_factory=time.perf_counter)
+    # (name, offset from start, duration), in seconds
+    spans: list[tuple[str, float, float]] = field(default_factory=list)
+
+
+# profile of the request being handled, None when it is not profiled
+current_profile: ContextVar[Profile | None] = ContextVar('current_profile', default=None)
+
+
+class span:
+    """Time a block as a named span of the profiled request, a no-op otherwise
+
+    with span('exchange'):
+        tokens = await exchange(...)
+    """
+    __slots__ = ('name', '_profile', '_start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._profile = current_profile.get()
+        if self._profile is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        profile = self._profile
+        if profile is not None:
+            end = time.perf_counter()
+            profile.spans.append((self.name, self._start - profile.start, end - self._start))
+        return False
+
+
+#### Storage ####
+class ProfileStore:
+    """Bounded ring of profile files in a directory
+
+    - each profile is <id>.json and <id>.prof, ids sort by creation time
+      (UTC timestamp, then pid so workers sharing the directory do not collide)
+    - writing a profile removes the oldest ones beyond max_profiles
+    """
+    def __init__(self, directory: str, max_profiles: int = 50, top: int = 40):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.top = top
+
+    @staticmethod
+    def new_id() -> str:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return f"{now.strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}-{os.urandom(4).hex()}"
+
+    def write(self, profile: Profile, profiler: cProfile.Profile | None, duration: float, status: int):
+        """Write a profile and drop the oldest ones beyond max_profiles"""
+        os.makedirs(self.directory, exist_ok=True)
+        summary = {
+            'id': profile.id,
+            'method': profile.method,
+            'path': profile.path,
+            'status': status,
+            'trigger': profile.trigger,
+            'request_id': profile.request_id,
+            'duration_ms': duration * 1e3,
+            'spans': [
+                {'name': name, 'offset_ms': offset * 1e3, 'duration_ms': elapsed * 1e3}
+                for name, offset, elapsed in profile.spans
+            ],
+            'functions': [],
+        }
+        if profiler is not None:
+            stats = pstats.Stats(profiler)
+            stats.dump_stats(os.path.join(self.directory, f"{profile.id}.prof"))
+            summary['functions'] = self._top_functions(stats)
+        with open(os.path.join(self.directory, f"{profile.id}.json"), 'w') as f:
+            json.dump(summary, f, indent=2)
+        self._prune()
+
+    def _top_functions(self, stats: pstats.Stats) -> list[dict]:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+        return [
+            {
+                'function': f"{filename}:{lineno}({name})",
+                'calls': calls,
+                'tottime_ms': tottime * 1e3,
+                'cumtime_ms': cumtime * 1e3,
+            }
+            for (filename, lineno, name), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+    def list(self) -> list[str]:
+        """Ids of the stored profiles, newest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith('.json')), reverse=True)
+
+    def path(self, filename: str) -> str | None:
+        """Path of a stored profile file (<id>.json or <id>.prof), None if unknown"""
+        if not _FILENAME_PATTERN.fullmatch(filename):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def _prune(self):
+        for profile_id in self.list()[self.max_profiles:]:
+            for extension in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    # removed by another worker
+                    pass
+
+
+#### Middleware ####
+class Profiler:
+    """Decide which requests are profiled
+
+    sample_rate: fraction of requests profiled, changed at runtime by admins
+        (per worker)
+    secret: key of signed X-Dockmaster-Profile headers, None disables them
+    """
+    def __init__(self, store: ProfileStore, sample_rate: float = 0.0, secret: str | None = None):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self._header = HEADER.encode('latin-1')
+
+    def trigger(self, scope) -> str | None:
+        """Why a request is profiled ('header' or 'sample'), None if it is not"""
+        if self.secret is not None:
+            for name, value in scope['headers']:
+                if name == self._header:
+                    if verify_profile_request(self.secret, value.decode('latin-1')):
+                        return 'header'
+                    break
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+
+class ProfilingMiddleware:
+    """Raw ASGI middleware profiling the requests picked by a Profiler
+
+    - spans are recorded per request; cProfile traces the event loop thread,
+      so one request is traced at a time and its trace includes whatever else
+      the loop ran meanwhile (the spans do not)
+    - the files are written after the response is sent (not for requests
+      that raise), the response carries the profile id in X-Profile-Id
+    """
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+        self._tracing = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        trigger = self.profiler.trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(
+            id=self.profiler.store.new_id(),
+            method=scope['method'],
+            path=scope['path'],
+            trigger=trigger,
+            request_id=request_id_var.get(),
+        )
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile.id.encode('latin-1'))]
+            await send(message)
+
+        profiler = None
+        if not self._tracing:
+            self._tracing = True
+            profiler = cProfile.Profile()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._tracing = False
+            duration = time.perf_counter() - start
+            current_profile.reset(token)
+        try:
+            await asyncio.to_thread(self.profiler.store.write, profile, profiler, duration, status)
+        except OSError as e:
+            logger.warning("Could not write profile %s. %s", profile.id, e)
+            return
+        logger.info("Profiled %s %s in %.1f ms as %s.", profile.method, profile.path, duration * 1e3, profile.id)
@@ -0,0 +1,315 @@
+"""Timeouts, retries and circuit breaking for outbound requests (Google endpoints)."""
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import httpx
+
+# explicit budgets instead of httpx defaults: fail fast when upstream is slow
+DEFAULT_TIMEOUT = httpx.Timeout(5.0, connect=2.0, pool=1.0)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# statuses whose Retry-After header says when upstream takes requests again
+RETRY_AFTER_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+# errors raised before the request reached upstream, safe to retry for any method
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Upstream is marked unavailable, the request was not sent"""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after consecutive failures
+
+    - closed: requests flow, failure_threshold consecutive failures open it
+    - open: requests fail immediately until reset_timeout has passed
+    - half open: one trial request, success closes and failure reopens it.
+      A trial without an outcome (cancelled, or an error that says nothing
+      about upstream) is released, and a trial still running after
+      trial_timeout seconds lets another one through, so a lost trial
+      cannot keep the circuit open
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        trial_timeout: float | None = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = reset_timeout if trial_timeout is None else trial_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = 0.0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """Check if a request may be sent"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = self._clock()
+            if (
+                self._state == self.OPEN and now - self._opened_at >= self.reset_timeout
+                or self._state == self.HALF_OPEN and now - self._trial_started_at >= self.trial_timeout
+            ):
+                self._state = self.HALF_OPEN
+                self._trial_started_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Give up an allowed request without an outcome, a half open circuit
+        lets the next request be the trial"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_started_at = self._clock() - self.trial_timeout
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class RetryBudget:
+    """Cap retries to a fraction of requests so retries cannot amplify an outage
+
+    - every request deposits ratio tokens, every retry spends one
+    - min_per_second tokens trickle in so low traffic can still retry
+    """
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_per_second: float = 1.0,
+        max_tokens: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = max_tokens
+        self._updated_at = clock()
+
+    def _refill(self, deposit: float):
+        now = self._clock()
+        self._tokens = min(self.max_tokens, self._tokens + deposit + (now - self._updated_at) * self.min_per_second)
+        self._updated_at = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget if available"""
+        with self._lock:
+            self._refill(0.0)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delay seconds or HTTP date), None if absent or invalid"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retries with exponential backoff and full jitter
+
+    - a 429 or 503 with Retry-After waits at least that long, or is not
+      retried if upstream asks for more than retry_after_max seconds
+    """
+    max_retries: int = 2
+    backoff_base: float = 0.1
+    backoff_max: float = 2.0
+    retry_statuses: frozenset[int] = RETRY_STATUSES
+    retry_after_max: float = 5.0
+
+    def delay(self, retry: int, response: httpx.Response | None = None) -> float | None:
+        """Seconds to wait before a retry (0 based), None if the response asks to wait too long"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+        if response is not None and response.status_code in RETRY_AFTER_STATUSES:
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            if retry_after is not None:
+                if retry_after > self.retry_after_max:
+                    return None
+                delay = max(delay, retry_after)
+        return delay
+
+
+class ResiliencePolicy:
+    """Retry policy, retry budget and a circuit breaker per upstream host"""
+    def __init__(
+        self,
+        retry: RetryPolicy | None = None,
+        budget: RetryBudget | None = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.retry = retry or RetryPolicy()
+        self.budget = budget or RetryBudget(clock=clock)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers.setdefault(
+                host, CircuitBreaker(self.failure_threshold, self.reset_timeout, clock=self._clock)
+            )
+        return breaker
+
+    def breakers(self) -> dict[str, str]:
+        """State of each upstream host's circuit"""
+        return {host: breaker.state for host, breaker in self._breakers.items()}
+
+    def should_retry(self, request: httpx.Request, retry: int, error: Exception | None = None) -> bool:
+        """Check if a failed attempt (error, or a retryable status if None) may be
+        retried (policy, idempotency and budget)"""
+        if retry >= self.retry.max_retries:
+            return False
+        # a non-idempotent request (e.g. a code exchange) that reached upstream may
+        # have been processed, even if it answered 5xx: only retried if it was not sent
+        if request.method not in IDEMPOTENT_METHODS and not isinstance(error, _NOT_SENT_ERRORS):
+            return False
+        return self.budget.try_spend()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    """httpx transport applying a ResiliencePolicy to every request
+
+    - 5xx responses and transport errors count as upstream failures
+    - retryable statuses are retried for idempotent methods only, honouring Retry-After
+    - an open circuit raises CircuitOpenError (an httpx.TransportError)
+      without sending the request
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: ResiliencePolicy):
+        self._transport = transport
+        self.policy = policy
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        policy = self.policy
+        breaker = policy.breaker(request.url.host)
+        policy.budget.record_request()
+        retry = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {request.url.host}", request=request)
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if not policy.should_retry(request, retry, e):
+                    raise
+                delay = policy.retry.delay(retry)
+            except BaseException:
+                # cancelled: no outcome to record, free the trial
+                breaker.release()
+                raise
+            else:
+                _record_response(breaker, response)
+                delay = _status_retry_delay(policy, request, response, retry)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            retry += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """Blocking variant of AsyncResilientTransport"""
+    def __init__(self, transport: httpx.BaseTransport, policy: ResiliencePolicy):
+        self._transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        policy = self.policy
+        breaker = policy.breaker(request.url.host)
+        policy.budget.record_request()
+        retry = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {request.url.host}", request=request)
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if not policy.should_retry(request, retry, e):
+                    raise
+                delay = policy.retry.delay(retry)
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                _record_response(breaker, response)
+                delay = _status_retry_delay(policy, request, response, retry)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            retry += 1
+
+    def close(self):
+        self._transport.close()
+
+
+def _status_retry_delay(policy: ResiliencePolicy, request: httpx.Request, response: httpx.Response, retry: int) -> float | None:
+    """Seconds before retrying a response, None to return it"""
+    if response.status_code not in policy.retry.retry_statuses:
+        return None
+    delay = policy.retry.delay(retry, response)
+    # checked last: it spends from the retry budget
+    if delay is None or not policy.should_retry(request, retry):
+        return None
+    return delay
+
+
+def _record_response(breaker: CircuitBreaker, response: httpx.Response):
+    # 4xx (e.g. invalid_grant) means upstream is healthy
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
@@ -9,10 +9,21 @@ from pydantic import ConfigDict
 
 #### Customizations to Pydantic base class ####
 # - Custom datetime validator and serializer
+def to_utc_datetime(value: datetime | int | float | str) -> datetime:
+    """Coerce a datetime, unix timestamp (e.g. JWT exp) or ISO string to UTC"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if isinstance(value, str):
+        value = isodate.parse_datetime(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+# - ISO format in json, python mode keeps the datetime (python-jose encodes it as a NumericDate)
 DockmasterDatetime = Annotated[
     datetime,
-    BeforeValidator(lambda x: datetime.astimezone(tz=timezone.utc)),
-    PlainSerializer(lambda x: isodate.datetime_isoformat(x))
+    BeforeValidator(to_utc_datetime),
+    PlainSerializer(lambda x: isodate.datetime_isoformat(x), when_used='json')
 ]
 
 class DockmasterBaseModel(BaseModel):
@@ -23,7 +34,11 @@ class DockmasterBaseModel(BaseModel):
     )
 
 #### Pydantic Classes ####
-class DockmasterUserToken(BaseModel):
+class DockmasterUserToken(DockmasterBaseModel):
     """JWT token payload"""
     email: str = Field(..., description="User email used as User ID")
     exp: DockmasterDatetime = Field(..., description="Token expiration datetime ISO format")
+    name: str = Field(default='', description="User display name")
+    picture: str = Field(default='', description="User profile image url")
+    given_name: str = Field(default='', description="User given name")
+    family_name: str = Field(default='', description="User family name")
@@ -0,0 +1,67 @@
+"""Async access to synchronous session storage backends"""
+from typing import Any, Callable, TypeVar
+
+import anyio.to_thread
+
+from .schemas import SessionData, SessionID
+from .schemas import AsyncSessionInterface, SessionInterface
+
+T = TypeVar('T')
+
+
+class AsyncSessionAdapter(AsyncSessionInterface):
+    """Expose a SessionInterface backend through AsyncSessionInterface
+    
+    - in-memory backends never block, so calls run inline on the event loop
+    - offload=True runs each call on the AnyIO threadpool for backends that
+      block on disk or network I/O
+    """
+    def __init__(self, session: SessionInterface, offload: bool = False):
+        """Wrap a synchronous session backend
+        
+        session: the backend to wrap
+        offload: run calls in a worker thread instead of on the event loop
+        """
+        self.session = session
+        self.offload = offload
+
+    def __len__(self) -> int:
+        return len(self.session)
+
+    def stats(self) -> dict[str, int]:
+        """Counters of the wrapped backend"""
+        stats = getattr(self.session, 'stats', None)
+        return stats() if stats is not None else {}
+
+    async def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        return await self._call(self.session.store_data, session, ttl, transient)
+
+    async def retrieve_data(self, session_id: SessionID) -> SessionData | None:
+        return await self._call(self.session.retrieve_data, session_id)
+
+    async def remove_data(self, session_id: SessionID) -> SessionData | None:
+        return await self._call(self.session.remove_data, session_id)
+
+    async def get_many(self, session_ids: list[SessionID]) -> list[SessionData | None]:
+        return await self._call(lambda: [self.session.retrieve_data(session_id) for session_id in session_ids])
+
+    async def delete_many(self, session_ids: list[SessionID]) -> int:
+        return await self._call(
+            lambda: sum(self.session.remove_data(session_id) is not None for session_id in session_ids)
+        )
+
+    async def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        return await self._call(self.session.compare_and_remove, session_id, key, expected)
+
+    async def purge_expired(self) -> int:
+        return await self._call(self.session.purge_expired)
+
+    async def aclose(self):
+        close = getattr(self.session, 'close', None)
+        if close is not None:
+            await self._call(close)
+
+    async def _call(self, fn: Callable[..., T], *args) -> T:
+        if self.offload:
+            return await anyio.to_thread.run_sync(fn, *args)
+        return fn(*args)
@@ -1,10 +1,21 @@
 """Create specific sessions with rules"""
+import asyncio
+import inspect
+import logging
 import uuid
 from datetime import datetime, timedelta, timezone
 
 from .schemas import SessionID, SessionData
-from .schemas import SessionInterface
+from .schemas import SessionInterface, AsyncSessionInterface
+from .async_adapter import AsyncSessionAdapter
 from .memory_session import MemorySession
+from .striped_session import StripedMemorySession
+from .redis_session import RedisSession
+from .sqlite_session import SQLiteSession
+from .shared_memory_session import SharedMemorySession
+from ..configuration import SessionSettings
+
+logger = logging.getLogger(__name__)
 
 
 def create_session_id()->SessionID:
@@ -15,12 +26,69 @@ class AuthenticationSessionManager:
     """
 
     def __init__(self, expiration_minutes: int = 5):
-        self.session: SessionInterface = MemorySession(session_id_fn=create_session_id)
         self.expiration_minutes = expiration_minutes
+        self.session: SessionInterface = MemorySession(
+            session_id_fn=create_session_id,
+            default_ttl=timedelta(minutes=expiration_minutes).total_seconds(),
+        )
     
     def create_expiration_datetime(self)->datetime:
         return datetime.now(timezone.utc) + timedelta(minutes=self.expiration_minutes)
     
     def create_creation_datetime(self)->datetime:
         return datetime.now(timezone.utc)
-    
\ No newline at end of file
+
+
+def create_session_backend(settings: SessionSettings)->SessionInterface:
+    """Create the in-process session storage configured in settings"""
+    if settings.session_backend == 'redis':
+        raise ValueError("The 'redis' backend is async only, use create_async_session_backend")
+    if settings.session_backend == 'striped':
+        return StripedMemorySession(
+            stripes=settings.session_stripes,
+            max_entries=settings.session_max_entries,
+            max_bytes=settings.session_max_bytes,
+        )
+    if settings.session_backend == 'sqlite':
+        return SQLiteSession(
+            path=settings.sqlite_path,
+            hot_cache_size=settings.session_max_entries or 10_000,
+            flush_interval=settings.sqlite_flush_interval,
+        )
+    if settings.session_backend == 'shared_memory':
+        return SharedMemorySession(
+            path=settings.shared_memory_path,
+            slots=settings.shared_memory_slots,
+            value_size=settings.shared_memory_value_size,
+        )
+    return MemorySession(
+        max_entries=settings.session_max_entries,
+        max_bytes=settings.session_max_bytes,
+    )
+
+
+def create_async_session_backend(settings: SessionSettings)->AsyncSessionInterface:
+    """Create the configured session storage behind the async interface"""
+    if settings.session_backend == 'redis':
+        return RedisSession(url=settings.redis_url, max_connections=settings.redis_max_connections)
+    # disk (sqlite) and cross-process locks (shared_memory) block, run them on the threadpool
+    offload = settings.session_backend in ('sqlite', 'shared_memory')
+    return AsyncSessionAdapter(create_session_backend(settings), offload=offload)
+
+
+async def run_expiry_sweeper(session: SessionInterface | AsyncSessionInterface, interval: float):
+    """Purge expired sessions every interval seconds until cancelled
+    
+    - run as a background task in the app lifespan
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = session.purge_expired()
+            if inspect.isawaitable(purged):
+                purged = await purged
+        except Exception:
+            logger.exception("Session expiry sweep failed")
+            continue
+        if purged:
+            logger.debug("Purged %d expired sessions", purged)
@@ -1,36 +1,202 @@
 """Simple In-Memory cache of python objects"""
+import heapq
+import sys
+import time
 import uuid
-from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
 from typing import Dict, Callable
-from datetime import datetime, timezone
-from collections.abc import MutableMapping
+
+from pydantic import BaseModel
 
 from .schemas import SessionData, SessionID
 from .schemas import SessionInterface
+from .records import SessionRecord
+
+
+def approximate_size(session: SessionData) -> int:
+    """Approximate the memory footprint of a session in bytes
+    
+    - counts the container and its direct keys/values (one level deep)
+    """
+    if isinstance(session, SessionRecord):
+        return sys.getsizeof(session) + sum(sys.getsizeof(getattr(session, name)) for name in session.__slots__)
+    if isinstance(session, BaseModel):
+        session = session.__dict__
+    size = sys.getsizeof(session)
+    if isinstance(session, dict):
+        for key, value in session.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
 
 class MemorySession(SessionInterface):
-    """Simple in-memory cache for session storage"""
-    def __init__(self, session_id_fn: Callable[[],SessionID] | None = None):
+    """Simple in-memory cache for session storage
+    
+    - sessions stored with a ttl expire lazily on retrieve
+    - purge_expired evicts expired sessions from a min-heap of expiry times
+      in O(log n) per session
+    - with max_entries and/or max_bytes set the store is capacity bounded and
+      evicts least recently used sessions in O(1), transient (login) sessions
+      before authorized ones. The session being stored is never evicted, a
+      session larger than max_bytes is rejected (ValueError)
+    """
+    def __init__(
+        self, 
+        session_id_fn: Callable[[],SessionID] | None = None,
+        default_ttl: float | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         """Initialize an empty session storage with id creation
         
         session_id_fn: function to create a session id
+        default_ttl: seconds until a session expires when store_data gets no ttl
+        max_entries: maximum number of sessions kept (None is unbounded)
+        max_bytes: approximate memory budget of the sessions (None is unbounded)
+        clock: monotonic time source in seconds
         """
         self._sessions: Dict[str, SessionData] = {}
+        self._expires_at: Dict[str, float] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
         
         self._create_session_id = session_id_fn or (lambda: str(uuid.uuid4()))
+        self.default_ttl = default_ttl
+        self._clock = clock
+
+        # LRU order per tier (session_id -> approximate size), only tracked when bounded
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bounded = max_entries is not None or max_bytes is not None
+        self._transient_lru: OrderedDict[str, int] = OrderedDict()
+        self._session_lru: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self.evictions = {'transient': 0, 'session': 0}
+        self.expirations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def approximate_bytes(self) -> int:
+        """Approximate memory held by the sessions (tracked when bounded)"""
+        return self._bytes
+
+    def stats(self) -> dict[str, int]:
+        """Counters for sizing the store"""
+        return {
+            'entries': len(self._sessions),
+            'approximate_bytes': self._bytes,
+            'evictions_transient': self.evictions['transient'],
+            'evictions_session': self.evictions['session'],
+            'expirations': self.expirations,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
     
-    def store_data(self, session: SessionData) -> SessionID:
+    def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
         """Store a session in the cache"""
         session_id = self._create_session_id()
-        self._sessions[session_id] = session
+        self._store(session_id, session, ttl=ttl, transient=transient)
         return session_id
-    
+
     def retrieve_data(self, session_id: SessionID) -> SessionData | None:
         """Retrieve a session from the cache"""
         session = self._sessions.get(session_id, None)
+        if session is None:
+            self.misses += 1
+            return None
+        if self._is_expired(session_id):
+            self._discard(session_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._bounded:
+            lru = self._transient_lru if session_id in self._transient_lru else self._session_lru
+            lru.move_to_end(session_id)
         return session
     
     def remove_data(self, session_id: SessionID) -> SessionData | None:
         """Remove a session from the cache return it if present """
-        session = self._sessions.pop(session_id, None)
-        return session
\ No newline at end of file
+        expired = self._is_expired(session_id)
+        session = self._discard(session_id)
+        self._compact_heap()
+        return None if expired else session
+
+    def purge_expired(self) -> int:
+        """Remove expired sessions and return how many were removed"""
+        now = self._clock()
+        heap = self._expiry_heap
+        purged = 0
+        while heap and heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(heap)
+            # skip stale heap entries of sessions already removed
+            if self._expires_at.get(session_id) == expires_at:
+                self._discard(session_id)
+                purged += 1
+        self._compact_heap()
+        self.expirations += purged
+        return purged
+
+    def _store(self, session_id: SessionID, session: SessionData, ttl: float | None, transient: bool):
+        size = approximate_size(session) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # it would evict everything, itself included, and its id would point nowhere
+            raise ValueError(f"Session of about {size} bytes exceeds the {self.max_bytes} byte budget")
+        self._sessions[session_id] = session
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl is not None:
+            expires_at = self._clock() + ttl
+            self._expires_at[session_id] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, session_id))
+        if self._bounded:
+            (self._transient_lru if transient else self._session_lru)[session_id] = size
+            self._bytes += size
+            self._evict(keep=session_id)
+
+    def _is_expired(self, session_id: SessionID) -> bool:
+        expires_at = self._expires_at.get(session_id)
+        return expires_at is not None and expires_at <= self._clock()
+
+    def _discard(self, session_id: SessionID) -> SessionData | None:
+        self._expires_at.pop(session_id, None)
+        if self._bounded:
+            size = self._transient_lru.pop(session_id, None)
+            if size is None:
+                size = self._session_lru.pop(session_id, 0)
+            self._bytes -= size
+        return self._sessions.pop(session_id, None)
+
+    def _over_capacity(self) -> bool:
+        if self.max_entries is not None and len(self._sessions) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def _evict(self, keep: SessionID):
+        """Evict until within capacity, never the session keep (just stored)"""
+        while self._over_capacity():
+            victim = self._victim(keep)
+            if victim is None:
+                break
+            tier, session_id = victim
+            self._discard(session_id)
+            self.evictions[tier] += 1
+        self._compact_heap()
+
+    def _victim(self, keep: SessionID) -> tuple[str, SessionID] | None:
+        # least recently used transient session, then authorized session
+        for tier, lru in (('transient', self._transient_lru), ('session', self._session_lru)):
+            for session_id in lru:
+                if session_id != keep:
+                    return tier, session_id
+        return None
+
+    def _compact_heap(self):
+        # removed sessions leave stale heap entries, rebuild once they dominate
+        # so the heap stays O(live sessions) (amortized O(1) per removal)
+        if len(self._expiry_heap) > 2 * len(self._expires_at) + 64:
+            self._expiry_heap = [(expires_at, session_id) for session_id, expires_at in self._expires_at.items()]
+            heapq.heapify(self._expiry_heap)
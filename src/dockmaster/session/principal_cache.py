@@ -0,0 +1,79 @@
+"""In-process LRU of resolved principals for the hot auth path"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from .records import SessionRecord
+
+
+def cookie_key(cookie: str) -> bytes:
+    """Hash of a session cookie or token, the raw credential is never kept as a key"""
+    return hashlib.sha256(cookie.encode()).digest()
+
+
+class PrincipalCache:
+    """Least recently used cache of already validated session records
+
+    - keyed by a hash of the session cookie (session id or signed token)
+    - an entry expires with its record, or after max_age seconds so changes
+      made by other workers (e.g. a logout) are seen eventually
+    - not thread-safe, use it from the event loop
+    """
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_age: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Initialize an empty cache
+
+        max_entries: principals kept, least recently used evicted first
+        max_age: seconds an entry is trusted before it is resolved again
+        clock: wall clock, record expiry is a unix timestamp
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._clock = clock
+        self._entries: OrderedDict[bytes, tuple[SessionRecord, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        """Counters for monitoring the hit rate"""
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def get(self, cookie: str) -> SessionRecord | None:
+        """Get the principal of a cookie if cached and not expired"""
+        key = cookie_key(cookie)
+        entry = self._entries.get(key)
+        if entry is not None:
+            record, expires_at = entry
+            if self._clock() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return record
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, cookie: str, record: SessionRecord):
+        """Cache the principal resolved for a cookie"""
+        expires_at = self._clock() + self.max_age
+        if record.expires_at:
+            expires_at = min(expires_at, record.expires_at)
+        key = cookie_key(cookie)
+        self._entries[key] = (record, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, cookie: str) -> bool:
+        """Drop the principal of a cookie (e.g. on logout), return if it was cached"""
+        return self._entries.pop(cookie_key(cookie), None) is not None
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,71 @@
+"""Compact typed records for server side sessions"""
+import struct
+from dataclasses import dataclass, fields
+
+# binary layout: version, flags, expires_at, then one length-prefixed utf-8 string per field
+_RECORD_HEADER = struct.Struct('<BBd')
+_STRING_LENGTH = struct.Struct('<H')
+_RECORD_VERSION = 2
+# version 1 records end with a refresh token, it is skipped
+_RECORD_VERSION_REFRESH_TOKEN = 1
+
+
+@dataclass(frozen=True, slots=True)
+class SessionRecord:
+    """Authorized session holding only what the routes use
+
+    - replaces the dict with the full token response and id token payload
+    - expires_at is a unix timestamp (0 never expires)
+    """
+    user_id: str
+    name: str = ''
+    email: str = ''
+    picture: str = ''
+    given_name: str = ''
+    family_name: str = ''
+    expires_at: float = 0.0
+
+    @classmethod
+    def from_id_token(cls, user_id: str, id_token_payload: dict, expires_at: float)->"SessionRecord":
+        """Keep the profile claims of a verified id token"""
+        return cls(
+            user_id=user_id,
+            name=id_token_payload.get('name', ''),
+            email=id_token_payload.get('email', ''),
+            picture=id_token_payload.get('picture', ''),
+            given_name=id_token_payload.get('given_name', ''),
+            family_name=id_token_payload.get('family_name', ''),
+            expires_at=expires_at,
+        )
+
+    def profile(self)->dict[str, str]:
+        """Profile fields shown to the user"""
+        return {name: getattr(self, name) for name in PROFILE_FIELDS}
+
+    def to_bytes(self)->bytes:
+        """Serialize to the compact binary layout"""
+        parts = [_RECORD_HEADER.pack(_RECORD_VERSION, 0, self.expires_at)]
+        for name in _STRING_FIELDS:
+            encoded = getattr(self, name).encode('utf-8')
+            parts.append(_STRING_LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes)->"SessionRecord":
+        """Deserialize from the compact binary layout"""
+        version, _, expires_at = _RECORD_HEADER.unpack_from(data, 0)
+        if version not in (_RECORD_VERSION, _RECORD_VERSION_REFRESH_TOKEN):
+            raise ValueError(f"Unsupported session record version {version}")
+        offset = _RECORD_HEADER.size
+        values = {}
+        for name in _STRING_FIELDS:
+            (length,) = _STRING_LENGTH.unpack_from(data, offset)
+            offset += _STRING_LENGTH.size
+            values[name] = bytes(data[offset:offset + length]).decode('utf-8')
+            offset += length
+        return cls(expires_at=expires_at, **values)
+
+
+PROFILE_FIELDS = ('name', 'email', 'picture', 'given_name', 'family_name')
+_STRING_FIELDS = tuple(field.name for field in fields(SessionRecord) if field.name != 'expires_at')
@@ -0,0 +1,110 @@
+"""Session storage on a Redis-protocol server shared by all workers"""
+import uuid
+from typing import Any, Callable
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+from .schemas import SessionData, SessionID
+from .schemas import AsyncSessionInterface, get_session_value
+from . import serialization
+
+
+class RedisSession(AsyncSessionInterface):
+    """Session storage on a Redis-protocol server (Redis, Valkey, KeyDB, ...)
+    
+    - one pooled async connection set per process, shared by all requests
+    - expiry uses native key TTLs, so there is nothing to sweep
+    - get_many and delete_many send one command each (MGET, DEL)
+    - session records use a compact binary layout, dict sessions JSON, so
+      nothing read from the server is executed
+    """
+    def __init__(
+        self,
+        url: str = 'redis://localhost:6379/0',
+        key_prefix: str = 'dockmaster:session:',
+        default_ttl: float | None = None,
+        max_connections: int = 50,
+        session_id_fn: Callable[[],SessionID] | None = None,
+        client: redis.Redis | None = None,
+    ):
+        """Initialize the connection pool (connections open lazily)
+        
+        url: redis:// or rediss:// url of the server
+        key_prefix: namespace of the session keys
+        default_ttl: seconds until a session expires when store_data gets no ttl
+        max_connections: size of the connection pool
+        session_id_fn: function to create a session id
+        client: existing client to use instead of creating a pool
+        """
+        if client is None:
+            pool = redis.ConnectionPool.from_url(url, max_connections=max_connections)
+            client = redis.Redis(connection_pool=pool)
+        self._redis = client
+        self.key_prefix = key_prefix
+        self.default_ttl = default_ttl
+        self._create_session_id = session_id_fn or (lambda: str(uuid.uuid4()))
+
+    def _key(self, session_id: SessionID) -> str:
+        return self.key_prefix + session_id
+
+    async def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        """Store a session with a native key TTL"""
+        session_id = self._create_session_id()
+        ttl = self.default_ttl if ttl is None else ttl
+        px = max(int(ttl * 1000), 1) if ttl is not None else None
+        await self._redis.set(self._key(session_id), serialization.dumps(session), px=px)
+        return session_id
+
+    async def retrieve_data(self, session_id: SessionID) -> SessionData | None:
+        """Retrieve a session, expired keys are already gone"""
+        raw = await self._redis.get(self._key(session_id))
+        return serialization.loads_or_none(raw)
+
+    async def remove_data(self, session_id: SessionID) -> SessionData | None:
+        """Remove a session return it if present (GETDEL)"""
+        raw = await self._redis.getdel(self._key(session_id))
+        return serialization.loads_or_none(raw)
+
+    async def get_many(self, session_ids: list[SessionID]) -> list[SessionData | None]:
+        """Retrieve several sessions with one MGET"""
+        if not session_ids:
+            return []
+        raws = await self._redis.mget([self._key(session_id) for session_id in session_ids])
+        return [serialization.loads_or_none(raw) for raw in raws]
+
+    async def delete_many(self, session_ids: list[SessionID]) -> int:
+        """Remove several sessions with one DEL"""
+        if not session_ids:
+            return 0
+        return await self._redis.delete(*[self._key(session_id) for session_id in session_ids])
+
+    async def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        """Atomically remove and return the session if its value at key matches expected
+        
+        - optimistic WATCH/MULTI transaction, retried if the key changes concurrently
+        """
+        redis_key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(redis_key)
+                    raw = await pipe.get(redis_key)
+                    session = serialization.loads_or_none(raw)
+                    if session is None or get_session_value(session, key) != expected:
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.delete(redis_key)
+                    await pipe.execute()
+                    return session
+                except WatchError:
+                    continue
+
+    async def ping(self) -> bool:
+        """Check the server is reachable"""
+        return await self._redis.ping()
+
+    async def aclose(self):
+        """Close the pooled connections"""
+        await self._redis.aclose()
@@ -4,15 +4,27 @@ from typing import  Any
 
 from pydantic import BaseModel
 
-SessionData = dict[str,Any] | BaseModel
+from .records import SessionRecord
+
+SessionData = dict[str,Any] | BaseModel | SessionRecord
 SessionID = str
 
+def get_session_value(session: SessionData, key: str, default: Any = None) -> Any:
+    """Get a value from dict, pydantic or record session data"""
+    if isinstance(session, dict):
+        return session.get(key, default)
+    return getattr(session, key, default)
+
 # Interfaces
 class SessionInterface(ABC):
     """Interface to various session storage backends"""
     @abstractmethod
-    def store_data(self, session: SessionData) -> SessionID:
-        """Store a session in the cache, overwrite if present"""
+    def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        """Store a session in the cache, overwrite if present
+        
+        - ttl: seconds until the session expires (None never expires)
+        - transient: short lived login session, evicted first by capacity bounded backends
+        """
         pass
         
     @abstractmethod
@@ -27,4 +39,79 @@ class SessionInterface(ABC):
     def remove_data(self, session_id: SessionID) -> SessionData | None:
         """Remove a session from the cache return it if present """
         pass
-        
\ No newline at end of file
+
+    def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        """Remove and return the session only if its value at key matches expected
+        
+        - check and removal happen as one step in thread-safe backends
+        - this default is not atomic, backends override it
+        """
+        session = self.retrieve_data(session_id)
+        if session is None or get_session_value(session, key) != expected:
+            return None
+        return self.remove_data(session_id)
+
+    def pop_if_state_matches(self, session_id: SessionID, state: str | None) -> SessionData | None:
+        """Remove and return a login session only if its 'state' matches"""
+        if state is None:
+            return None
+        return self.compare_and_remove(session_id, 'state', state)
+
+    def purge_expired(self) -> int:
+        """Remove expired sessions and return how many were removed
+        
+        - backends with native expiry have nothing to purge
+        """
+        return 0
+        
+
+class AsyncSessionInterface(ABC):
+    """Interface to session storage backends with non-blocking I/O"""
+    @abstractmethod
+    async def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        """Store a session, see SessionInterface.store_data"""
+        pass
+
+    @abstractmethod
+    async def retrieve_data(self, session_id: SessionID) -> SessionData | None:
+        """Retrieve a session if present and not expired"""
+        pass
+
+    @abstractmethod
+    async def remove_data(self, session_id: SessionID) -> SessionData | None:
+        """Remove a session return it if present"""
+        pass
+
+    @abstractmethod
+    async def get_many(self, session_ids: list[SessionID]) -> list[SessionData | None]:
+        """Retrieve several sessions in one round trip, None for missing ones"""
+        pass
+
+    @abstractmethod
+    async def delete_many(self, session_ids: list[SessionID]) -> int:
+        """Remove several sessions in one round trip and return how many were removed"""
+        pass
+
+    async def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        """Remove and return the session only if its value at key matches expected
+        
+        - this default is not atomic, backends override it
+        """
+        session = await self.retrieve_data(session_id)
+        if session is None or get_session_value(session, key) != expected:
+            return None
+        return await self.remove_data(session_id)
+
+    async def pop_if_state_matches(self, session_id: SessionID, state: str | None) -> SessionData | None:
+        """Remove and return a login session only if its 'state' matches"""
+        if state is None:
+            return None
+        return await self.compare_and_remove(session_id, 'state', state)
+
+    async def purge_expired(self) -> int:
+        """Remove expired sessions and return how many were removed"""
+        return 0
+
+    async def aclose(self):
+        """Release connections held by the backend"""
+        pass
@@ -0,0 +1,56 @@
+"""Serialization of session data for out-of-process backends"""
+import json
+import logging
+import struct
+
+from .records import SessionRecord
+from .schemas import SessionData
+
+# first byte tags the encoding (0x00 was pickle, no longer read: loading it
+# would run code from anyone able to write to the store)
+_RECORD = b'\x01'
+_JSON = b'\x02'
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(session: SessionData) -> bytes:
+    """Serialize a session, SessionRecord uses its compact binary layout and
+    dict sessions (e.g. login state) JSON
+
+    - raises TypeError for other sessions or values JSON cannot encode
+    """
+    if type(session) is SessionRecord:
+        return _RECORD + session.to_bytes()
+    if isinstance(session, dict):
+        return _JSON + json.dumps(session, separators=(',', ':')).encode('utf-8')
+    raise TypeError(f"Cannot serialize a {type(session).__name__} session, use a dict or SessionRecord")
+
+
+def loads(data: bytes) -> SessionData:
+    """Deserialize a session written by dumps, raises ValueError for unknown tags or corrupt data"""
+    view = memoryview(data)
+    tag = view[:1]
+    if tag == _RECORD:
+        try:
+            return SessionRecord.from_bytes(view[1:])
+        except struct.error as e:
+            raise ValueError(f"Truncated session record: {e}") from e
+    if tag == _JSON:
+        session = json.loads(bytes(view[1:]))
+        if not isinstance(session, dict):
+            raise ValueError(f"Session is a JSON {type(session).__name__}, not an object")
+        return session
+    raise ValueError(f"Unknown session encoding {bytes(tag)!r}")
+
+
+def loads_or_none(data: bytes | None) -> SessionData | None:
+    """Deserialize a stored session, None if there is none or it cannot be read
+    (old format or corrupt: logged, and treated like a missing session)"""
+    if data is None:
+        return None
+    try:
+        return loads(data)
+    except ValueError as e:
+        logger.warning("Ignoring unreadable session. %s", e)
+        return None
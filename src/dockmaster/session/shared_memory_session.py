@@ -0,0 +1,341 @@
+"""Session storage shared by worker processes through a memory-mapped file"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable
+
+from .schemas import SessionData, SessionID
+from .schemas import SessionInterface, get_session_value
+from . import serialization
+
+# file header: magic, version, stripes, slots per stripe, key size, value size
+_HEADER = struct.Struct('<4sIIIII')
+_MAGIC = b'DMSS'
+_VERSION = 1
+_HEADER_SIZE = 64
+# per stripe sequence counter (seqlock), odd while a writer is updating the stripe
+_SEQ = struct.Struct('<Q')
+# slot header: state, transient flag, key length, value length, expires_at (unix time, 0 never)
+_SLOT = struct.Struct('<BBHId')
+
+_EMPTY, _USED, _DELETED = 0, 1, 2
+_READ_RETRIES = 100
+
+
+class SharedMemorySession(SessionInterface):
+    """Session storage shared by all worker processes of a node
+
+    - fixed-slot hash table in a memory-mapped file (e.g. under /dev/shm)
+    - keys hash (crc32, stable across processes) to a stripe of slots and
+      probe linearly within the stripe
+    - readers are lock-free: each stripe has a sequence counter (seqlock) and
+      a read retries if a writer touched the stripe meanwhile
+    - writers lock only their stripe, with a thread lock plus an fcntl byte
+      range lock for other processes
+    - a full stripe evicts transient (login) sessions first, then the session
+      closest to expiry
+    - the file is preallocated, a full /dev/shm fails at startup (ENOSPC)
+      instead of crashing a worker (SIGBUS) on first write to a page. The
+      table takes about slots * (16 + key_size + value_size) bytes, 36 MB by
+      default, Docker's default /dev/shm is 64 MB (raise it with --shm-size)
+    - fcntl locks belong to the process: two instances on the same file in
+      one process do not exclude each other (the thread locks do not span
+      instances either) and closing either one drops the locks of both.
+      Use one instance per process
+    """
+    def __init__(
+        self,
+        path: str = '/dev/shm/dockmaster-sessions',
+        slots: int = 32768,
+        slots_per_stripe: int = 64,
+        key_size: int = 64,
+        value_size: int = 1024,
+        session_id_fn: Callable[[],SessionID] | None = None,
+        default_ttl: float | None = None,
+    ):
+        """Map the table file, creating it if it does not exist
+
+        path: file backing the table, every worker must use the same path
+        slots: total number of slots (rounded to whole stripes)
+        slots_per_stripe: slots covered by one lock
+        key_size: maximum encoded session id length
+        value_size: maximum serialized session length
+        session_id_fn: function to create a session id
+        default_ttl: seconds until a session expires when store_data gets no ttl
+        """
+        self.path = path
+        self.default_ttl = default_ttl
+        self._create_session_id = session_id_fn or (lambda: str(uuid.uuid4()))
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                stripes = max(-(-slots // slots_per_stripe), 1)
+                self._init_file(stripes, slots_per_stripe, key_size, value_size)
+            self._mmap = mmap.mmap(self._fd, 0)
+            magic, version, stripes, slots_per_stripe, key_size, value_size = _HEADER.unpack_from(self._mmap, 0)
+        except BaseException:
+            # closing the fd also releases the lock
+            os.close(self._fd)
+            raise
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a session table")
+
+        # the existing table layout wins over the arguments
+        self.stripes = stripes
+        self.slots_per_stripe = slots_per_stripe
+        self.key_size = key_size
+        self.value_size = value_size
+        self._slot_size = _SLOT.size + key_size + value_size
+        self._seq_offset = _HEADER_SIZE
+        self._slots_offset = _HEADER_SIZE + stripes * _SEQ.size
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+        # counters of this process (the table itself is shared)
+        self.evictions = {'transient': 0, 'session': 0}
+        self.store_failures = 0
+
+    def _init_file(self, stripes: int, slots_per_stripe: int, key_size: int, value_size: int):
+        slot_size = _SLOT.size + key_size + value_size
+        size = _HEADER_SIZE + stripes * _SEQ.size + stripes * slots_per_stripe * slot_size
+        try:
+            # reserve every page now, a sparse file on a full tmpfs raises SIGBUS on write
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(self._fd, 0, size)
+            else:
+                os.ftruncate(self._fd, size)
+        except OSError as e:
+            # leave an empty file so the next start initializes it again
+            os.ftruncate(self._fd, 0)
+            raise OSError(e.errno, f"Cannot allocate a {size} byte session table at {self.path}: {e.strerror}") from e
+        os.pwrite(self._fd, _HEADER.pack(_MAGIC, _VERSION, stripes, slots_per_stripe, key_size, value_size), 0)
+
+    def __len__(self) -> int:
+        now = time.time()
+        count = 0
+        for slot in range(self.stripes * self.slots_per_stripe):
+            state, _, _, _, expires_at = _SLOT.unpack_from(self._mmap, self._slots_offset + slot * self._slot_size)
+            count += state == _USED and not 0 < expires_at <= now
+        return count
+
+    def stats(self) -> dict[str, int]:
+        """Used slots of the shared table (scans every slot header) and the
+        evictions and failed stores of this process"""
+        return {
+            'entries': len(self),
+            'capacity': self.stripes * self.slots_per_stripe,
+            'evictions_transient': self.evictions['transient'],
+            'evictions_session': self.evictions['session'],
+            'store_failures': self.store_failures,
+        }
+
+    def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        """Store a session in a free slot of its stripe"""
+        session_id = self._create_session_id()
+        key = session_id.encode()
+        value = serialization.dumps(session)
+        if len(key) > self.key_size:
+            self.store_failures += 1
+            raise ValueError(f"Session id longer than {self.key_size} bytes")
+        if len(value) > self.value_size:
+            self.store_failures += 1
+            raise ValueError(f"Session of {len(value)} bytes does not fit a {self.value_size} byte slot")
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else 0.0
+
+        stripe = self._stripe(key)
+        with self._write_lock(stripe):
+            offset = self._free_slot(stripe, key)
+            self._count_eviction(offset)
+            _SLOT.pack_into(self._mmap, offset, _USED, transient, len(key), len(value), expires_at)
+            body = offset + _SLOT.size
+            self._mmap[body:body + len(key)] = key
+            body += self.key_size
+            self._mmap[body:body + len(value)] = value
+        return session_id
+
+    def retrieve_data(self, session_id: SessionID) -> SessionData | None:
+        """Retrieve a session without taking a lock (seqlock read)"""
+        key = session_id.encode()
+        stripe = self._stripe(key)
+        seq_offset = self._seq_offset + stripe * _SEQ.size
+        for _ in range(_READ_RETRIES):
+            (before,) = _SEQ.unpack_from(self._mmap, seq_offset)
+            if before & 1:
+                continue
+            value = self._read_value(stripe, key)
+            (after,) = _SEQ.unpack_from(self._mmap, seq_offset)
+            if before == after:
+                return serialization.loads_or_none(value)
+        # a writer holds the stripe (or died mid-update): read under the lock
+        with self._write_lock(stripe):
+            value = self._read_value(stripe, key)
+        return serialization.loads_or_none(value)
+
+    def remove_data(self, session_id: SessionID) -> SessionData | None:
+        """Remove a session return it if present"""
+        key = session_id.encode()
+        stripe = self._stripe(key)
+        with self._write_lock(stripe):
+            return self._remove(stripe, key)
+
+    def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        """Atomically remove and return the session if its value at key matches expected"""
+        encoded = session_id.encode()
+        stripe = self._stripe(encoded)
+        with self._write_lock(stripe):
+            value = self._read_value(stripe, encoded)
+            session = serialization.loads_or_none(value)
+            if session is None or get_session_value(session, key) != expected:
+                return None
+            return self._remove(stripe, encoded)
+
+    def purge_expired(self) -> int:
+        """Free expired slots and compact each stripe's probe sequence"""
+        purged = 0
+        for stripe in range(self.stripes):
+            with self._write_lock(stripe):
+                purged += self._compact(stripe)
+        return purged
+
+    def close(self):
+        """Unmap the table (the file stays for the other workers)"""
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _stripe(self, key: bytes) -> int:
+        return zlib.crc32(key) % self.stripes
+
+    def _home(self, key: bytes) -> int:
+        return (zlib.crc32(key) // self.stripes) % self.slots_per_stripe
+
+    def _slot_offset(self, stripe: int, index: int) -> int:
+        return self._slots_offset + (stripe * self.slots_per_stripe + index) * self._slot_size
+
+    def _probe(self, stripe: int, key: bytes):
+        """Yield slot offsets of the stripe in probe order for a key"""
+        home = self._home(key)
+        for i in range(self.slots_per_stripe):
+            yield self._slot_offset(stripe, (home + i) % self.slots_per_stripe)
+
+    def _find(self, stripe: int, key: bytes) -> int | None:
+        now = time.time()
+        for offset in self._probe(stripe, key):
+            state, _, key_len, _, expires_at = _SLOT.unpack_from(self._mmap, offset)
+            if state == _EMPTY:
+                return None
+            if state == _USED and key_len == len(key):
+                body = offset + _SLOT.size
+                if self._mmap[body:body + key_len] == key:
+                    return offset if not 0 < expires_at <= now else None
+        return None
+
+    def _read_value(self, stripe: int, key: bytes) -> bytes | None:
+        offset = self._find(stripe, key)
+        return self._value_at(offset) if offset is not None else None
+
+    def _value_at(self, offset: int) -> bytes:
+        _, _, _, value_len, _ = _SLOT.unpack_from(self._mmap, offset)
+        body = offset + _SLOT.size + self.key_size
+        return self._mmap[body:body + value_len]
+
+    def _remove(self, stripe: int, key: bytes) -> SessionData | None:
+        offset = self._find(stripe, key)
+        if offset is None:
+            return None
+        value = self._value_at(offset)
+        self._mmap[offset] = _DELETED
+        return serialization.loads_or_none(value)
+
+    def _free_slot(self, stripe: int, key: bytes) -> int:
+        """Find a slot to write a new key, evicting if the stripe is full"""
+        now = time.time()
+        victim = None
+        victim_rank = None
+        for offset in self._probe(stripe, key):
+            state, transient, _, _, expires_at = _SLOT.unpack_from(self._mmap, offset)
+            if state != _USED or 0 < expires_at <= now:
+                return offset
+            # evict transient sessions first, then the one closest to expiry
+            rank = (not transient, expires_at if expires_at else float('inf'))
+            if victim_rank is None or rank < victim_rank:
+                victim, victim_rank = offset, rank
+        return victim
+
+    def _count_eviction(self, offset: int):
+        """Count the live session about to be overwritten at offset, if any"""
+        state, transient, _, _, expires_at = _SLOT.unpack_from(self._mmap, offset)
+        if state == _USED and not 0 < expires_at <= time.time():
+            self.evictions['transient' if transient else 'session'] += 1
+
+    def _compact(self, stripe: int) -> int:
+        """Rewrite a stripe with only its live sessions (drops tombstones)
+
+        - a stripe without tombstones or expired sessions is left untouched
+        """
+        now = time.time()
+        live = []
+        purged = 0
+        tombstones = 0
+        for index in range(self.slots_per_stripe):
+            offset = self._slot_offset(stripe, index)
+            state, _, key_len, _, expires_at = _SLOT.unpack_from(self._mmap, offset)
+            if state == _DELETED:
+                tombstones += 1
+            elif state == _USED:
+                if 0 < expires_at <= now:
+                    purged += 1
+                else:
+                    body = offset + _SLOT.size
+                    live.append((self._mmap[body:body + key_len], self._mmap[offset:offset + self._slot_size]))
+        if not purged and not tombstones:
+            return 0
+        start = self._slot_offset(stripe, 0)
+        self._mmap[start:start + self.slots_per_stripe * self._slot_size] = bytes(self.slots_per_stripe * self._slot_size)
+        for key, record in live:
+            offset = self._free_slot(stripe, key)
+            self._mmap[offset:offset + self._slot_size] = record
+        return purged
+
+    def _write_lock(self, stripe: int) -> '_StripeWriteLock':
+        return _StripeWriteLock(self, stripe)
+
+
+class _StripeWriteLock:
+    """Exclusive write access to one stripe across threads and processes
+
+    - bumps the stripe sequence counter to odd on enter and back to even on
+      exit so lock-free readers retry
+    """
+    __slots__ = ('_session', '_stripe', '_seq_offset')
+
+    def __init__(self, session: SharedMemorySession, stripe: int):
+        self._session = session
+        self._stripe = stripe
+        self._seq_offset = session._seq_offset + stripe * _SEQ.size
+
+    def __enter__(self):
+        session = self._session
+        session._thread_locks[self._stripe].acquire()
+        try:
+            fcntl.lockf(session._fd, fcntl.LOCK_EX, 1, self._stripe)
+        except BaseException:
+            session._thread_locks[self._stripe].release()
+            raise
+        (seq,) = _SEQ.unpack_from(session._mmap, self._seq_offset)
+        # an odd counter here means a writer died mid-update, restore parity
+        _SEQ.pack_into(session._mmap, self._seq_offset, seq | 1)
+        return self
+
+    def __exit__(self, *exc_info):
+        session = self._session
+        (seq,) = _SEQ.unpack_from(session._mmap, self._seq_offset)
+        _SEQ.pack_into(session._mmap, self._seq_offset, seq + 1)
+        fcntl.lockf(session._fd, fcntl.LOCK_UN, 1, self._stripe)
+        session._thread_locks[self._stripe].release()
@@ -0,0 +1,243 @@
+"""Persistent session storage on SQLite (WAL) with write-behind"""
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+from .schemas import SessionData, SessionID
+from .schemas import SessionInterface, get_session_value
+from . import serialization
+from .memory_session import MemorySession
+
+logger = logging.getLogger(__name__)
+
+# pending write of a session: (serialized data, expires_at unix time) or None for a delete
+PendingWrite = tuple[bytes, float | None] | None
+
+# locks serializing removals of the sessions hashed to them
+_REMOVE_STRIPES = 16
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    " session_id TEXT PRIMARY KEY,"
+    " data BLOB NOT NULL,"
+    " expires_at REAL"
+    ") WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)",
+)
+
+
+class SQLiteSession(SessionInterface):
+    """Session storage that survives restarts
+
+    - SQLite database in WAL mode, readers never wait on the writer
+    - reads go through an in-memory hot cache (a bounded MemorySession)
+    - writes land in the hot cache and a pending map, a background thread
+      flushes them in batched transactions (repeated writes to a session coalesce)
+    - expired rows are purged with an indexed range delete on expires_at
+    - removals of a session are serialized by a striped lock, their database
+      read does not hold the lock of the other operations
+    """
+    def __init__(
+        self,
+        path: str = 'dockmaster-sessions.db',
+        session_id_fn: Callable[[],SessionID] | None = None,
+        default_ttl: float | None = None,
+        hot_cache_size: int = 10_000,
+        flush_interval: float = 0.05,
+        flush_batch_size: int = 500,
+    ):
+        """Open (or create) the database and start the write-behind thread
+
+        path: database file
+        session_id_fn: function to create a session id
+        default_ttl: seconds until a session expires when store_data gets no ttl
+        hot_cache_size: sessions kept in memory for reads
+        flush_interval: maximum seconds a write waits before it is flushed
+        flush_batch_size: pending writes that trigger an early flush
+        """
+        self.path = path
+        self.default_ttl = default_ttl
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._create_session_id = session_id_fn or (lambda: str(uuid.uuid4()))
+        # wall clock so expiry survives restarts
+        self._cache = MemorySession(max_entries=hot_cache_size, clock=time.time)
+
+        self._write_conn = self._connect()
+        for statement in _SCHEMA:
+            self._write_conn.execute(statement)
+        self._write_conn.commit()
+        self._read_conn = self._connect()
+
+        self._lock = threading.RLock()
+        # per session (striped): a read-then-remove is atomic without blocking other sessions
+        self._remove_locks = [threading.Lock() for _ in range(_REMOVE_STRIPES)]
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: dict[SessionID, PendingWrite] = {}
+        self._flushing: dict[SessionID, PendingWrite] = {}
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run_flusher, name='sqlite-session-flusher', daemon=True)
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._read_lock:
+            (count,) = self._read_conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+            ).fetchone()
+        return count
+
+    def stats(self) -> dict[str, int]:
+        """Counters of the hot cache and the write-behind queue, and the unexpired
+        rows in the database (one indexed COUNT, pending writes not included)"""
+        with self._read_lock:
+            (entries,) = self._read_conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+            ).fetchone()
+        with self._lock:
+            return {
+                'entries': entries,
+                'hot_entries': len(self._cache),
+                'pending_writes': len(self._pending) + len(self._flushing),
+            }
+
+    def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        """Store a session in the hot cache and queue it for the database"""
+        session_id = self._create_session_id()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        data = serialization.dumps(session)
+        with self._lock:
+            self._cache._store(session_id, session, ttl=ttl, transient=transient)
+            self._pending[session_id] = (data, expires_at)
+            backlog = len(self._pending)
+        if backlog >= self.flush_batch_size:
+            self._wakeup.set()
+        return session_id
+
+    def retrieve_data(self, session_id: SessionID) -> SessionData | None:
+        """Retrieve a session from the hot cache, falling back to the database"""
+        with self._lock:
+            session = self._cache.retrieve_data(session_id)
+            if session is not None:
+                return session
+            found, row = self._lookup_pending(session_id)
+        if not found:
+            with self._read_lock:
+                row = self._read_conn.execute(
+                    "SELECT data, expires_at FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+        if row is None:
+            return None
+        data, expires_at = row
+        ttl = expires_at - time.time() if expires_at is not None else None
+        if ttl is not None and ttl <= 0:
+            return None
+        session = serialization.loads_or_none(data)
+        if session is None:
+            return None
+        with self._lock:
+            # a concurrent remove wins over warming the cache
+            if self._lookup_pending(session_id) != (True, None):
+                self._cache._store(session_id, session, ttl=ttl, transient=False)
+        return session
+
+    def remove_data(self, session_id: SessionID) -> SessionData | None:
+        """Remove a session return it if present"""
+        with self._remove_lock(session_id):
+            return self._remove(session_id)
+
+    def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        """Atomically remove and return the session if its value at key matches expected"""
+        with self._remove_lock(session_id):
+            session = self.retrieve_data(session_id)
+            if session is None or get_session_value(session, key) != expected:
+                return None
+            return self._remove(session_id)
+
+    def _remove_lock(self, session_id: SessionID) -> threading.Lock:
+        return self._remove_locks[hash(session_id) % _REMOVE_STRIPES]
+
+    def _remove(self, session_id: SessionID) -> SessionData | None:
+        # the database read (hot cache miss) holds only the session's remove lock
+        session = self.retrieve_data(session_id)
+        with self._lock:
+            self._cache.remove_data(session_id)
+            self._pending[session_id] = None
+        return session
+
+    def purge_expired(self) -> int:
+        """Delete expired rows (indexed on expires_at) and expired hot cache entries"""
+        with self._lock:
+            self._cache.purge_expired()
+        with self._write_lock:
+            cursor = self._write_conn.execute(
+                "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)
+            )
+        return cursor.rowcount
+
+    def flush(self):
+        """Write all pending changes to the database"""
+        with self._write_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+            batch = self._flushing
+            if batch:
+                upserts = [
+                    (session_id, write[0], write[1]) for session_id, write in batch.items() if write is not None
+                ]
+                deletes = [(session_id,) for session_id, write in batch.items() if write is None]
+                try:
+                    self._write_conn.execute("BEGIN")
+                    self._write_conn.executemany(
+                        "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)", upserts
+                    )
+                    self._write_conn.executemany("DELETE FROM sessions WHERE session_id = ?", deletes)
+                    self._write_conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._write_conn.execute("ROLLBACK")
+                    with self._lock:
+                        # keep newer writes, retry the failed batch on the next flush
+                        self._pending = {**batch, **self._pending}
+                    raise
+                finally:
+                    with self._lock:
+                        self._flushing = {}
+
+    def close(self):
+        """Flush pending writes, stop the write-behind thread and close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+        self._write_conn.close()
+        self._read_conn.close()
+
+    def _lookup_pending(self, session_id: SessionID) -> tuple[bool, PendingWrite]:
+        # newest first: queued writes, then the batch being flushed
+        for writes in (self._pending, self._flushing):
+            if session_id in writes:
+                return True, writes[session_id]
+        return False, None
+
+    def _run_flusher(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to flush sessions to %s", self.path)
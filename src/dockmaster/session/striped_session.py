@@ -0,0 +1,104 @@
+"""Thread-safe in-memory session storage with lock striping"""
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+from .schemas import SessionData, SessionID
+from .schemas import SessionInterface, get_session_value
+from .memory_session import MemorySession
+
+
+class StripedMemorySession(SessionInterface):
+    """Thread-safe in-memory session store
+    
+    - session ids are sharded across N MemorySession stripes, each with its own lock,
+      so threads touching different sessions do not contend (and run in parallel on
+      free-threaded CPython builds)
+    - compound operations (compare_and_remove, pop_if_state_matches) hold the
+      stripe lock for the check and the removal
+    - capacity limits are split evenly across the stripes
+    """
+    def __init__(
+        self,
+        stripes: int = 16,
+        session_id_fn: Callable[[],SessionID] | None = None,
+        default_ttl: float | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize empty stripes
+        
+        stripes: number of shards, rounded up to a power of two
+        session_id_fn: function to create a session id
+        default_ttl: seconds until a session expires when store_data gets no ttl
+        max_entries: maximum number of sessions kept across all stripes
+        max_bytes: approximate memory budget across all stripes
+        """
+        stripes = 1 << max(stripes - 1, 0).bit_length()
+        self._mask = stripes - 1
+        self._create_session_id = session_id_fn or (lambda: str(uuid.uuid4()))
+        self._shards = [
+            MemorySession(
+                default_ttl=default_ttl,
+                max_entries=-(-max_entries // stripes) if max_entries is not None else None,
+                max_bytes=-(-max_bytes // stripes) if max_bytes is not None else None,
+                clock=clock,
+            )
+            for _ in range(stripes)
+        ]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def stats(self) -> dict[str, int]:
+        """Counters for sizing the store summed across the stripes"""
+        totals: dict[str, int] = {}
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                for key, value in shard.stats().items():
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def store_data(self, session: SessionData, ttl: float | None = None, transient: bool = False) -> SessionID:
+        """Store a session in its stripe"""
+        session_id = self._create_session_id()
+        index = self._stripe(session_id)
+        with self._locks[index]:
+            self._shards[index]._store(session_id, session, ttl=ttl, transient=transient)
+        return session_id
+
+    def retrieve_data(self, session_id: SessionID) -> SessionData | None:
+        """Retrieve a session from its stripe"""
+        index = self._stripe(session_id)
+        with self._locks[index]:
+            return self._shards[index].retrieve_data(session_id)
+
+    def remove_data(self, session_id: SessionID) -> SessionData | None:
+        """Remove a session from its stripe return it if present"""
+        index = self._stripe(session_id)
+        with self._locks[index]:
+            return self._shards[index].remove_data(session_id)
+
+    def compare_and_remove(self, session_id: SessionID, key: str, expected: Any) -> SessionData | None:
+        """Atomically remove and return the session if its value at key matches expected"""
+        index = self._stripe(session_id)
+        with self._locks[index]:
+            shard = self._shards[index]
+            session = shard.retrieve_data(session_id)
+            if session is None or get_session_value(session, key) != expected:
+                return None
+            return shard.remove_data(session_id)
+
+    def purge_expired(self) -> int:
+        """Purge expired sessions one stripe at a time"""
+        purged = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                purged += shard.purge_expired()
+        return purged
+
+    def _stripe(self, session_id: SessionID) -> int:
+        return hash(session_id) & self._mask
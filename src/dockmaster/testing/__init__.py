@@ -0,0 +1,2 @@
+"""Local stand-ins for upstream services (load tests and end-to-end tests)."""
+from .oidc_provider import FakeOIDCProvider, SigningKey
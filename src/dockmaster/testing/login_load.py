@@ -0,0 +1,167 @@
+"""Async load generator for the full login flow.
+
+Each virtual user runs /login/google -> provider /authorize ->
+/callback/google -> / with its own cookies, like a browser would, against
+the app pointed at a FakeOIDCProvider. Reports throughput and latency
+percentiles per route.
+"""
+import asyncio
+import http.cookiejar
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlencode, urljoin
+
+import httpx
+
+COOKIE_NAME = 'session_id'
+# steps of one login, in order
+ROUTES = ('/login/google', '/authorize', '/callback/google', '/')
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of sorted values"""
+    if not sorted_values:
+        return float('nan')
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[min(int(rank), len(sorted_values)) - 1]
+
+
+@dataclass
+class RouteStats:
+    """Latencies (seconds) and failures of one route"""
+    latencies: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def add_error(self, reason: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'errors': sum(self.errors.values()),
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1e3,
+            'p99_ms': percentile(latencies, 99) * 1e3,
+            'p999_ms': percentile(latencies, 99.9) * 1e3,
+            'max_ms': (latencies[-1] if latencies else float('nan')) * 1e3,
+        }
+
+
+@dataclass
+class LoginLoadReport:
+    """Outcome of a load run"""
+    logins: int
+    concurrency: int
+    completed: int = 0
+    elapsed: float = 0.0
+    routes: dict[str, RouteStats] = field(default_factory=lambda: {route: RouteStats() for route in ROUTES})
+
+    @property
+    def failed(self) -> int:
+        return self.logins - self.completed
+
+    def summary(self) -> dict:
+        return {
+            'logins': self.logins,
+            'concurrency': self.concurrency,
+            'completed': self.completed,
+            'failed': self.failed,
+            'elapsed_s': self.elapsed,
+            'logins_per_s': self.completed / self.elapsed if self.elapsed else 0.0,
+            'routes': {route: stats.summary(self.elapsed) for route, stats in self.routes.items()},
+        }
+
+    def format(self) -> str:
+        summary = self.summary()
+        lines = [
+            f"logins={self.logins} concurrency={self.concurrency} completed={self.completed} "
+            f"failed={self.failed} elapsed={self.elapsed:.2f}s throughput={summary['logins_per_s']:.1f} logins/s",
+            f"{'route':18s} {'requests':>9s} {'errors':>7s} {'req/s':>9s} {'p50 ms':>9s} {'p99 ms':>9s} {'p999 ms':>9s}",
+        ]
+        for route, stats in summary['routes'].items():
+            lines.append(
+                f"{route:18s} {stats['requests']:9d} {stats['errors']:7d} {stats['rps']:9.1f} "
+                f"{stats['p50_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['p999_ms']:9.2f}"
+            )
+        for route, stats in self.routes.items():
+            for reason, count in sorted(stats.errors.items()):
+                lines.append(f"  {route} {reason}: {count}")
+        return '\n'.join(lines)
+
+
+class _LoginFailed(Exception):
+    pass
+
+
+def create_client(max_connections: int = 1000, timeout: float = 30.0) -> httpx.AsyncClient:
+    """Client shared by the virtual users
+    - its cookie jar accepts nothing, every user sends its own session cookie
+    """
+    return httpx.AsyncClient(
+        cookies=http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=timeout,
+    )
+
+
+class LoginLoadGenerator:
+    """Drive concurrent end-to-end logins through the app
+
+    - the provider must consent without a browser (FakeOIDCProvider), the
+      login_hint picks a distinct user per login
+    """
+    def __init__(self, client: httpx.AsyncClient, app_url: str, email_domain: str = 'example.com'):
+        self.client = client
+        self.app_url = app_url.rstrip('/')
+        self.email_domain = email_domain
+
+    async def run(self, logins: int, concurrency: int) -> LoginLoadReport:
+        """Run logins with at most concurrency in flight"""
+        report = LoginLoadReport(logins=logins, concurrency=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def login(i: int):
+            async with semaphore:
+                if await self.login(i, report):
+                    report.completed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    async def login(self, i: int, report: LoginLoadReport) -> bool:
+        """One user's login, return if the user reached the console"""
+        try:
+            r = await self._step(report, '/login/google', f"{self.app_url}/login/google", None, (302, 307))
+            login_cookie = r.cookies.get(COOKIE_NAME)
+            authorize_url = f"{r.headers['location']}&{urlencode({'login_hint': f'user{i}@{self.email_domain}'})}"
+            r = await self._step(report, '/authorize', authorize_url, None, (302, 303, 307))
+            callback_url = urljoin(self.app_url + '/', r.headers['location'])
+            r = await self._step(report, '/callback/google', callback_url, login_cookie, (302, 303, 307))
+            session_cookie = r.cookies.get(COOKIE_NAME)
+            r = await self._step(report, '/', f"{self.app_url}/", session_cookie, (200,))
+            if b'User ID' not in r.content:
+                report.routes['/'].add_error('not logged in')
+                return False
+        except _LoginFailed:
+            return False
+        return True
+
+    async def _step(
+        self, report: LoginLoadReport, route: str, url: str, cookie: str | None, expected: tuple[int, ...]
+    ) -> httpx.Response:
+        stats = report.routes[route]
+        headers = {'cookie': f"{COOKIE_NAME}={cookie}"} if cookie else None
+        start = time.perf_counter()
+        try:
+            r = await self.client.get(url, headers=headers, follow_redirects=False)
+        except httpx.HTTPError as e:
+            stats.add_error(type(e).__name__)
+            raise _LoginFailed from e
+        stats.latencies.append(time.perf_counter() - start)
+        if r.status_code not in expected:
+            stats.add_error(f"status {r.status_code}")
+            raise _LoginFailed
+        return r
@@ -0,0 +1,265 @@
+"""Local fake of Google's OpenID Connect provider.
+
+Serves discovery, an auto-consenting authorization endpoint, the token
+endpoint (authorization code and refresh token grants) and the JWKS, and
+signs ID tokens with locally generated RS256 keys. Point the app at it with
+``METADATA_URL=<issuer>/.well-known/openid-configuration``.
+
+Run it standalone:
+    python -m dockmaster.testing.oidc_provider --port 9000
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import secrets
+import time
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.routing import Route
+
+DISCOVERY_PATH = '/.well-known/openid-configuration'
+
+
+def _b64encode_int(value: int) -> str:
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class SigningKey:
+    """Locally generated RS256 key signing ID tokens"""
+    def __init__(self, kid: str):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = self.private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+
+    @property
+    def jwk(self) -> dict:
+        numbers = self.private_key.public_key().public_numbers()
+        return {
+            'kty': 'RSA',
+            'alg': 'RS256',
+            'use': 'sig',
+            'kid': self.kid,
+            'n': _b64encode_int(numbers.n),
+            'e': _b64encode_int(numbers.e),
+        }
+
+    def sign(self, payload: dict) -> str:
+        return jwt.encode(self.signer, payload).decode('ascii')
+
+
+@dataclass(frozen=True)
+class _Grant:
+    """An issued authorization code or refresh token"""
+    email: str
+    client_id: str
+    redirect_uri: str | None
+    scope: str
+    expires_at: float
+
+
+class FakeOIDCProvider:
+    """OpenID Connect provider answering like Google, without a browser
+
+    - /authorize consents immediately and redirects back with a code, the
+      user is the login_hint email (or a new userN@<email_domain>)
+    - codes are single use and expire after code_ttl seconds
+    - latency adds a delay to the token endpoint to mimic upstream
+    """
+    def __init__(
+        self,
+        issuer: str,
+        client_id: str | None = None,
+        client_secret: str | None = None,
+        email_domain: str = 'example.com',
+        token_ttl: int = 3600,
+        code_ttl: float = 60.0,
+        jwks_max_age: int = 3600,
+        latency: float = 0.0,
+    ):
+        """Initialize a provider with one signing key
+
+        issuer: base url the provider is served at (the iss claim)
+        client_id, client_secret: credentials the token endpoint accepts (None accepts any)
+        """
+        self.issuer = issuer.rstrip('/')
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.email_domain = email_domain
+        self.token_ttl = token_ttl
+        self.code_ttl = code_ttl
+        self.jwks_max_age = jwks_max_age
+        self.latency = latency
+        self.keys = [SigningKey(kid=f'fake-{secrets.token_hex(4)}')]
+        self._codes: dict[str, _Grant] = {}
+        self._refresh_tokens: dict[str, _Grant] = {}
+        self._users = 0
+        self.counts = {'authorize': 0, 'token': 0, 'jwks': 0, 'discovery': 0}
+        self.app = Starlette(routes=[
+            Route(DISCOVERY_PATH, self.discovery, methods=['GET']),
+            Route('/authorize', self.authorize, methods=['GET']),
+            Route('/token', self.token, methods=['POST']),
+            Route('/certs', self.certs, methods=['GET']),
+        ])
+
+    @property
+    def metadata_url(self) -> str:
+        return f"{self.issuer}{DISCOVERY_PATH}"
+
+    @property
+    def metadata(self) -> dict:
+        return {
+            'issuer': self.issuer,
+            'authorization_endpoint': f"{self.issuer}/authorize",
+            'token_endpoint': f"{self.issuer}/token",
+            'jwks_uri': f"{self.issuer}/certs",
+            'response_types_supported': ['code'],
+            'subject_types_supported': ['public'],
+            'id_token_signing_alg_values_supported': ['RS256'],
+            'scopes_supported': ['openid', 'email', 'profile'],
+            'token_endpoint_auth_methods_supported': ['client_secret_post'],
+            'grant_types_supported': ['authorization_code', 'refresh_token'],
+        }
+
+    def rotate_keys(self) -> SigningKey:
+        """Sign with a new key, the previous key stays published"""
+        key = SigningKey(kid=f'fake-{secrets.token_hex(4)}')
+        self.keys.insert(0, key)
+        return key
+
+    def sign_id_token(self, email: str, client_id: str, **claims) -> str:
+        """Sign an ID token for a user with the current key"""
+        now = int(time.time())
+        name = email.split('@')[0]
+        payload = {
+            'iss': self.issuer,
+            'azp': client_id,
+            'aud': client_id,
+            'sub': str(int(hashlib.sha256(email.encode()).hexdigest()[:16], 16)),
+            'email': email,
+            'email_verified': True,
+            'name': name.title(),
+            'given_name': name.title(),
+            'family_name': 'Test',
+            'picture': f"{self.issuer}/avatar/{name}.png",
+            'iat': now,
+            'exp': now + self.token_ttl,
+        }
+        payload.update(claims)
+        return self.keys[0].sign(payload)
+
+    #### Endpoints ####
+    async def discovery(self, request: Request) -> JSONResponse:
+        self.counts['discovery'] += 1
+        return JSONResponse(self.metadata, headers={'Cache-Control': 'public, max-age=3600'})
+
+    async def certs(self, request: Request) -> JSONResponse:
+        self.counts['jwks'] += 1
+        return JSONResponse(
+            {'keys': [key.jwk for key in self.keys]},
+            headers={'Cache-Control': f'public, max-age={self.jwks_max_age}, must-revalidate, no-transform'},
+        )
+
+    async def authorize(self, request: Request):
+        self.counts['authorize'] += 1
+        params = request.query_params
+        redirect_uri = params.get('redirect_uri')
+        if not redirect_uri or params.get('response_type') != 'code':
+            return _oauth_error('invalid_request', 'redirect_uri and response_type=code are required')
+        if self.client_id is not None and params.get('client_id') != self.client_id:
+            return _oauth_error('invalid_client', 'Unknown client_id', status_code=401)
+        email = params.get('login_hint')
+        if not email:
+            self._users += 1
+            email = f"user{self._users}@{self.email_domain}"
+        code = secrets.token_urlsafe(24)
+        self._codes[code] = _Grant(
+            email=email,
+            client_id=params.get('client_id', ''),
+            redirect_uri=redirect_uri,
+            scope=params.get('scope', 'openid'),
+            expires_at=time.monotonic() + self.code_ttl,
+        )
+        query = {'code': code, 'scope': params.get('scope', 'openid')}
+        if 'state' in params:
+            query['state'] = params['state']
+        return RedirectResponse(f"{redirect_uri}?{urlencode(query)}", status_code=302)
+
+    async def token(self, request: Request) -> JSONResponse:
+        self.counts['token'] += 1
+        if request.headers.get('content-type', '').startswith('application/json'):
+            body = await request.json()
+        else:
+            body = dict(await request.form())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        client_id = body.get('client_id')
+        if self.client_id is not None and (client_id != self.client_id or body.get('client_secret') != self.client_secret):
+            return _oauth_error('invalid_client', 'Unauthorized', status_code=401)
+
+        grant_type = body.get('grant_type')
+        if grant_type == 'authorization_code':
+            grant = self._codes.pop(body.get('code', ''), None)
+            if grant is None or grant.expires_at < time.monotonic() or grant.redirect_uri != body.get('redirect_uri'):
+                return _oauth_error('invalid_grant', 'Bad Request')
+        elif grant_type == 'refresh_token':
+            grant = self._refresh_tokens.get(body.get('refresh_token', ''))
+            if grant is None:
+                return _oauth_error('invalid_grant', 'Token has been expired or revoked.')
+        else:
+            return _oauth_error('unsupported_grant_type', f'Invalid grant_type: {grant_type}')
+
+        tokens = {
+            'access_token': f"ya29.fake-{secrets.token_urlsafe(32)}",
+            'expires_in': self.token_ttl,
+            'scope': grant.scope,
+            'token_type': 'Bearer',
+            'id_token': self.sign_id_token(grant.email, grant.client_id),
+        }
+        if grant_type == 'authorization_code':
+            refresh_token = f"1//fake-{secrets.token_urlsafe(32)}"
+            self._refresh_tokens[refresh_token] = grant
+            tokens['refresh_token'] = refresh_token
+        return JSONResponse(tokens, headers={'Cache-Control': 'no-store'})
+
+
+def _oauth_error(error: str, description: str, status_code: int = 400) -> JSONResponse:
+    return JSONResponse({'error': error, 'error_description': description}, status_code=status_code)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--client-id', default=None, help='only accept this client (default any)')
+    parser.add_argument('--client-secret', default=None)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='token endpoint delay')
+    args = parser.parse_args()
+
+    provider = FakeOIDCProvider(
+        issuer=f"http://{args.host}:{args.port}",
+        client_id=args.client_id,
+        client_secret=args.client_secret,
+        latency=args.latency_ms / 1000,
+    )
+    print(f"METADATA_URL={provider.metadata_url}")
+    uvicorn.run(provider.app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Shared fixtures for the dockmaster tests"""
+import base64
+import json
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+
+
+def _b64encode_int(value: int) -> str:
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class SigningKey:
+    """Locally generated RS256 key to sign test ID tokens"""
+
+    def __init__(self, kid: str):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = self.private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+
+    @property
+    def jwk(self) -> dict:
+        numbers = self.private_key.public_key().public_numbers()
+        return {
+            'kty': 'RSA',
+            'alg': 'RS256',
+            'use': 'sig',
+            'kid': self.kid,
+            'n': _b64encode_int(numbers.n),
+            'e': _b64encode_int(numbers.e),
+        }
+
+    def sign(self, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': 'test-client-id',
+            'sub': '1234567890',
+            'email': 'user@example.com',
+            'email_verified': True,
+            'iat': now,
+            'exp': now + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(self.signer, payload).decode('ascii')
+
+
+@pytest.fixture(scope='session')
+def make_signing_key():
+    return SigningKey
+
+
+@pytest.fixture(scope='session')
+def signing_key() -> SigningKey:
+    return SigningKey(kid='test-key-1')
+
+
+@pytest.fixture(scope='session')
+def rotated_signing_key() -> SigningKey:
+    return SigningKey(kid='test-key-2')
+
+
+class JWKSServer:
+    """Mock JWKS endpoint that counts fetches"""
+
+    def __init__(self, keys: list[SigningKey], max_age: int = 3600):
+        self.keys = keys
+        self.max_age = max_age
+        self.requests = 0
+        # raw response body instead of the key set (malformed responses)
+        self.body: bytes | None = None
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.body is not None:
+            return httpx.Response(200, content=self.body)
+        return httpx.Response(
+            200,
+            json={'keys': [key.jwk for key in self.keys]},
+            headers={'Cache-Control': f'public, max-age={self.max_age}, must-revalidate, no-transform'},
+        )
+
+    def client(self) -> httpx.Client:
+        return httpx.Client(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture
+def jwks_server(signing_key: SigningKey) -> JWKSServer:
+    return JWKSServer(keys=[signing_key])
+
+
+@pytest.fixture(scope='session')
+def discovery_document() -> dict:
+    return {
+        'issuer': 'https://accounts.google.com',
+        'authorization_endpoint': 'https://accounts.example.com/o/oauth2/v2/auth',
+        'token_endpoint': 'https://oauth2.example.com/token',
+        'jwks_uri': 'https://www.example.com/oauth2/v3/certs',
+    }
+
+
+@pytest.fixture(scope='session')
+def main_module(tmp_path_factory, discovery_document):
+    """The FastAPI app module configured offline
+    - upstream discovery is unreachable so it starts from a local file
+    """
+    filepath = tmp_path_factory.mktemp('discovery') / 'openid-configuration.json'
+    filepath.write_text(json.dumps(discovery_document))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('CLIENT_ID', 'test-client-id')
+        mp.setenv('CLIENT_SECRET', 'test-client-secret')
+        mp.setenv('METADATA_URL', 'http://127.0.0.1:9/.well-known/openid-configuration')
+        mp.setenv('DISCOVERY_FILEPATH', str(filepath))
+        from dockmaster import main
+        yield main
@@ -0,0 +1,115 @@
+"""Test the allowlist authorization index"""
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.authorize.allowlist import Allowlist, compile_allowlist, create_allowlist
+from dockmaster.configuration import AuthorizationSettings
+
+
+@pytest.fixture
+def allowlist() -> Allowlist:
+    return Allowlist([
+        'Admin@Example.org',
+        '@example.com',
+        '@*.corp.example.net',
+        '# comment',
+        '',
+    ])
+
+
+@pytest.mark.parametrize('email,allowed', [
+    ('admin@example.org', True),
+    ('ADMIN@EXAMPLE.ORG', True),
+    ('other@example.org', False),
+    ('anyone@example.com', True),
+    ('anyone@sub.example.com', False),
+    ('user@eu.corp.example.net', True),
+    ('user@a.b.corp.example.net', True),
+    ('user@corp.example.net', False),
+    ('user@evilcorp.example.net', False),
+    ('not-an-email', False),
+    ('', False),
+    (None, False),
+])
+def test_is_allowed(allowlist, email, allowed):
+    assert allowlist.is_allowed(email) is allowed
+
+
+def test_invalid_entry():
+    with pytest.raises(ValueError):
+        compile_allowlist(['example.com'])
+
+
+def test_reload_swaps_index(allowlist):
+    allowlist.reload(['new@example.org'])
+    assert allowlist.is_allowed('new@example.org')
+    assert not allowlist.is_allowed('anyone@example.com')
+    assert len(allowlist) == 1
+
+
+def test_lookups_during_reloads():
+    """Entries kept by every reload stay allowed while the index is swapped"""
+    old = ['@example.com', 'old@example.org']
+    new = ['@example.com', 'new@example.org']
+    allowlist = Allowlist(old)
+    stop = threading.Event()
+
+    def reload():
+        while not stop.is_set():
+            allowlist.reload(new)
+            allowlist.reload(old)
+
+    thread = threading.Thread(target=reload)
+    thread.start()
+    try:
+        results = {allowlist.is_allowed('user@example.com') for _ in range(20_000)}
+    finally:
+        stop.set()
+        thread.join()
+    assert results == {True}
+
+
+def test_large_allowlist():
+    allowlist = Allowlist([f'user{i}@example.org' for i in range(50_000)] + [f'@domain{i}.com' for i in range(10_000)])
+    assert len(allowlist) == 60_000
+    assert allowlist.is_allowed('user49999@example.org')
+    assert allowlist.is_allowed('x@domain9999.com')
+    assert not allowlist.is_allowed('user50000@example.org')
+
+
+def test_create_allowlist(tmp_path):
+    filepath = tmp_path / 'allowlist.txt'
+    filepath.write_text('# team\nfile@example.org\n')
+    allowlist = create_allowlist(AuthorizationSettings(allowlist=['@example.com'], allowlist_filepath=str(filepath), _env_file=None))
+    assert allowlist.is_allowed('file@example.org') and allowlist.is_allowed('a@example.com')
+    assert not allowlist.allow_all
+    assert create_allowlist(AuthorizationSettings(_env_file=None)).allow_all
+
+
+@pytest.mark.parametrize('payload,status', [
+    ({'email': 'user@example.com', 'email_verified': True}, 307),
+    ({'email': 'user@example.com', 'email_verified': False}, 403),
+    ({'email': 'intruder@example.org', 'email_verified': True}, 403),
+    ({}, 401),
+])
+def test_callback_authorizes_before_session(main_module, monkeypatch, payload, status):
+    monkeypatch.setattr(main_module, 'allowlist', Allowlist(['@example.com']))
+
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        return {'id_token': 'id-token', 'access_token': 'access-token'}
+
+    async def verify_google_id_token(id_token):
+        return payload
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+    monkeypatch.setattr(main_module.oauth_client, 'verify_google_id_token', verify_google_id_token)
+
+    with TestClient(main_module.app) as client:
+        sessions_before = main_module.server_session.stats()['entries']
+        login_id = client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+        client.cookies.set('session_id', login_id)
+        r = client.get('/callback/google', params={'code': 'code', 'state': 'abc'}, follow_redirects=False)
+        assert r.status_code == status
+        created = main_module.server_session.stats()['entries'] - sessions_before
+        assert created == (1 if status == 307 else 0)
@@ -0,0 +1,109 @@
+"""Test the async session interface and the adapter for sync backends"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.configuration import SessionSettings
+from dockmaster.session.async_adapter import AsyncSessionAdapter
+from dockmaster.session.manager import create_async_session_backend
+from dockmaster.session.memory_session import MemorySession
+from dockmaster.session.records import SessionRecord
+from dockmaster.session.striped_session import StripedMemorySession
+
+
+@pytest.fixture(params=[False, True], ids=['inline', 'offload'])
+def async_session(request) -> AsyncSessionAdapter:
+    return AsyncSessionAdapter(StripedMemorySession(stripes=4), offload=request.param)
+
+
+@pytest.mark.asyncio
+async def test_store_retrieve_remove(async_session: AsyncSessionAdapter):
+    session_id = await async_session.store_data({'user_id': 'user@example.com'}, ttl=60)
+    assert await async_session.retrieve_data(session_id) == {'user_id': 'user@example.com'}
+    assert await async_session.remove_data(session_id) == {'user_id': 'user@example.com'}
+    assert await async_session.retrieve_data(session_id) is None
+
+
+@pytest.mark.asyncio
+async def test_get_many_delete_many(async_session: AsyncSessionAdapter):
+    session_ids = [await async_session.store_data({'n': i}) for i in range(5)]
+    assert await async_session.get_many(session_ids + ['missing']) == [{'n': i} for i in range(5)] + [None]
+    assert await async_session.delete_many(session_ids[:3] + ['missing']) == 3
+    assert await async_session.get_many(session_ids) == [None, None, None, {'n': 3}, {'n': 4}]
+    assert len(async_session) == 2
+
+
+@pytest.mark.asyncio
+async def test_pop_if_state_matches(async_session: AsyncSessionAdapter):
+    session_id = await async_session.store_data({'state': 'abc'}, transient=True)
+    assert await async_session.pop_if_state_matches(session_id, 'wrong') is None
+    assert await async_session.pop_if_state_matches(session_id, 'abc') == {'state': 'abc'}
+    assert await async_session.pop_if_state_matches(session_id, 'abc') is None
+
+
+@pytest.mark.asyncio
+async def test_purge_expired():
+    now = [0.0]
+    async_session = AsyncSessionAdapter(MemorySession(clock=lambda: now[0]))
+    await async_session.store_data({'state': 'abc'}, ttl=1)
+    now[0] = 2
+    assert await async_session.purge_expired() == 1
+    assert async_session.stats()['entries'] == 0
+
+
+def test_routes_await_session_store(main_module):
+    """The routes read sessions through the async interface"""
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(
+            main_module.server_session.store_data,
+            SessionRecord(user_id='user@example.com', name='Test User'),
+        )
+        client.cookies.set('session_id', session_id)
+        r = client.get('/principal')
+        assert r.json()['user_id'] == 'user@example.com'
+        assert r.json()['user_profile']['name'] == 'Test User'
+        assert 'User ID: user@example.com' in client.get('/').text
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'shared_memory'])
+def test_blocking_backends_offloaded(backend, tmp_path):
+    settings = SessionSettings(
+        session_backend=backend,
+        sqlite_path=str(tmp_path / 'sessions.db'),
+        shared_memory_path=str(tmp_path / 'sessions.table'),
+        shared_memory_slots=256,
+    )
+    async_session = create_async_session_backend(settings)
+    try:
+        assert async_session.offload
+    finally:
+        async_session.session.close()
+    assert not create_async_session_backend(SessionSettings(session_backend='memory')).offload
+
+
+@pytest.mark.asyncio
+async def test_slow_retrieve_does_not_block_loop():
+    class SlowSession(StripedMemorySession):
+        def retrieve_data(self, session_id):
+            time.sleep(0.2)
+            return super().retrieve_data(session_id)
+
+    async_session = AsyncSessionAdapter(SlowSession(stripes=4), offload=True)
+    session_id = await async_session.store_data({'user_id': 'user@example.com'})
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    try:
+        assert await async_session.retrieve_data(session_id) == {'user_id': 'user@example.com'}
+    finally:
+        ticker.cancel()
+    # the other task kept running while the read blocked its thread
+    assert ticks >= 5
@@ -0,0 +1,118 @@
+"""Test the cached OpenID discovery document"""
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.authenticate.discovery import DiscoveryCache
+
+
+class DiscoveryServer:
+    """Mock discovery endpoint with ETag support"""
+
+    def __init__(self, document: dict, etag: str = '"v1"'):
+        self.document = document
+        self.etag = etag
+        self.requests: list[httpx.Request] = []
+        self.down = False
+        self.body: bytes | None = None
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.down:
+            raise httpx.ConnectError("network down", request=request)
+        if self.body is not None:
+            return httpx.Response(200, content=self.body)
+        if request.headers.get('if-none-match') == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=self.document, headers={'ETag': self.etag})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_etag_revalidation(discovery_document):
+    server = DiscoveryServer(discovery_document)
+    clock = FakeClock()
+    cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration', ttl=60, clock=clock)
+    async with server.client() as client:
+        await cache.load(client)
+        for _ in range(10):
+            assert (await cache.get(client))['token_endpoint'] == discovery_document['token_endpoint']
+        assert len(server.requests) == 1
+
+        # after the TTL the document is revalidated, 304 keeps the cached copy
+        clock.now = 61
+        assert await cache.get(client) == discovery_document
+        assert len(server.requests) == 2
+        assert server.requests[-1].headers['if-none-match'] == '"v1"'
+
+        # a changed document is picked up after the next TTL
+        server.etag = '"v2"'
+        server.document = {**discovery_document, 'token_endpoint': 'https://oauth2.example.com/v2/token'}
+        clock.now = 122
+        assert (await cache.get(client))['token_endpoint'] == 'https://oauth2.example.com/v2/token'
+
+        # upstream down: serve the cached copy
+        server.down = True
+        clock.now = 500
+        assert (await cache.get(client))['token_endpoint'] == 'https://oauth2.example.com/v2/token'
+
+
+@pytest.mark.asyncio
+async def test_offline_start_from_file(tmp_path, discovery_document):
+    filepath = tmp_path / 'openid-configuration.json'
+    server = DiscoveryServer(discovery_document)
+    async with server.client() as client:
+        # a successful fetch keeps the local copy up to date
+        cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration', filepath=filepath)
+        await cache.load(client)
+        assert filepath.exists()
+
+        server.down = True
+        offline_cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration', filepath=filepath)
+        await offline_cache.load(client)
+        assert offline_cache.document == discovery_document
+
+        no_file_cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration')
+        with pytest.raises(httpx.ConnectError):
+            await no_file_cache.load(client)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('body', [b'<html>maintenance</html>', b'[]'])
+async def test_invalid_body_falls_back(tmp_path, discovery_document, body):
+    filepath = tmp_path / 'openid-configuration.json'
+    server = DiscoveryServer(discovery_document)
+    clock = FakeClock()
+    async with server.client() as client:
+        cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration', ttl=60, filepath=filepath, clock=clock)
+        await cache.load(client)
+
+        # revalidation gets a bad body: keep serving the cached copy
+        server.body = body
+        clock.now = 61
+        assert await cache.get(client) == discovery_document
+        assert filepath.read_text() != body.decode()
+
+        # startup gets a bad body: load the local copy
+        offline_cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration', filepath=filepath)
+        await offline_cache.load(client)
+        assert offline_cache.document == discovery_document
+
+
+def test_app_serves_discovery_offline(main_module, discovery_document):
+    """The app starts offline from the local file and serves discovery from memory"""
+    with TestClient(main_module.app) as client:
+        assert client.get('/discovery').json() == discovery_document
+        r = client.get('/login/google', follow_redirects=False)
+        assert r.status_code == 307
+        assert r.headers['location'].startswith(discovery_document['authorization_endpoint'])
@@ -0,0 +1,105 @@
+"""Test the fake OIDC provider and the login load generator end to end"""
+import http.cookiejar
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.authenticate.discovery import DiscoveryCache
+from dockmaster.authenticate.jwks import JWKSCache
+from dockmaster.testing import FakeOIDCProvider
+from dockmaster.testing.login_load import ROUTES, LoginLoadGenerator, percentile
+
+ISSUER = 'http://fake-oidc.test'
+APP_URL = 'http://testserver'
+
+
+class HostRouter(httpx.AsyncBaseTransport):
+    """Dispatch requests to in-process ASGI apps by host"""
+    def __init__(self, apps: dict):
+        self._transports = {host: httpx.ASGITransport(app) for host, app in apps.items()}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transports[request.url.host].handle_async_request(request)
+
+
+@pytest.fixture
+def provider() -> FakeOIDCProvider:
+    return FakeOIDCProvider(issuer=ISSUER, client_id='test-client-id', client_secret='test-client-secret')
+
+
+@pytest.mark.asyncio
+async def test_provider_code_flow(provider):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(provider.app), base_url=ISSUER) as client:
+        metadata = (await client.get('/.well-known/openid-configuration')).json()
+        assert metadata['issuer'] == ISSUER
+        assert metadata['jwks_uri'] == f'{ISSUER}/certs'
+
+        r = await client.get('/authorize', params={
+            'client_id': 'test-client-id', 'redirect_uri': 'http://app/callback', 'response_type': 'code',
+            'scope': 'openid email', 'state': 'abc', 'login_hint': 'alice@example.com',
+        })
+        assert r.status_code == 302
+        callback = httpx.URL(r.headers['location'])
+        assert callback.params['state'] == 'abc'
+
+        body = {
+            'code': callback.params['code'], 'client_id': 'test-client-id', 'client_secret': 'test-client-secret',
+            'redirect_uri': 'http://app/callback', 'grant_type': 'authorization_code',
+        }
+        tokens = (await client.post('/token', json=body)).json()
+        # codes are single use
+        assert (await client.post('/token', json=body)).json()['error'] == 'invalid_grant'
+
+        refreshed = (await client.post('/token', data={
+            'refresh_token': tokens['refresh_token'], 'client_id': 'test-client-id',
+            'client_secret': 'test-client-secret', 'grant_type': 'refresh_token',
+        })).json()
+        assert 'refresh_token' not in refreshed
+
+        jwks_cache = JWKSCache(jwks_url=metadata['jwks_uri'], background_refresh=False)
+        for id_token in (tokens['id_token'], refreshed['id_token']):
+            payload = await jwks_cache.averify_id_token(id_token, audience='test-client-id', client=client, issuers=(ISSUER,))
+            assert payload['email'] == 'alice@example.com'
+            assert payload['email_verified'] is True
+
+
+@pytest.mark.asyncio
+async def test_provider_rejects_unknown_client(provider):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(provider.app), base_url=ISSUER) as client:
+        r = await client.post('/token', json={'client_id': 'other', 'client_secret': 'x', 'grant_type': 'authorization_code'})
+    assert r.status_code == 401
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 1001)]
+    assert percentile(values, 50) == 500.0
+    assert percentile(values, 99) == 990.0
+    assert percentile(values, 99.9) == 999.0
+    assert percentile([3.0], 99.9) == 3.0
+
+
+def test_login_load_end_to_end(main_module, provider, monkeypatch):
+    """Logins through the app against the fake provider, verified ID tokens included"""
+    monkeypatch.setattr(main_module, 'discovery', DiscoveryCache(metadata_url=provider.metadata_url))
+    monkeypatch.setattr(main_module.oauth_client, 'jwks_cache', main_module.oauth_client.jwks_cache)
+    monkeypatch.setattr(main_module.oauth_client, 'issuers', main_module.oauth_client.issuers)
+    router = HostRouter({'testserver': main_module.app, 'fake-oidc.test': provider.app})
+
+    async def run_load():
+        # the app reaches the provider through the router too
+        await main_module.oauth_client.aclose()
+        await main_module.oauth_client.open(transport=router)
+        blocking_jar = http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        async with httpx.AsyncClient(transport=router, cookies=blocking_jar) as client:
+            return await LoginLoadGenerator(client, APP_URL).run(logins=20, concurrency=5)
+
+    with TestClient(main_module.app) as client:
+        report = client.portal.call(run_load)
+
+    assert report.completed == 20, report.format()
+    summary = report.summary()
+    assert all(summary['routes'][route]['requests'] == 20 for route in ROUTES)
+    assert provider.counts['token'] == 20
+    # keys fetched once, not per login
+    assert provider.counts['jwks'] == 1
@@ -0,0 +1,58 @@
+"""Test the /auth/verify forward-auth endpoint"""
+from urllib.parse import unquote
+
+from fastapi.testclient import TestClient
+
+from dockmaster.session.records import SessionRecord
+
+
+def test_verify_valid_session(main_module):
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(
+            main_module.server_session.store_data,
+            SessionRecord(user_id='user@example.com', email='user@example.com'),
+        )
+        client.cookies.set('session_id', session_id)
+        r = client.get('/auth/verify')
+        assert r.status_code == 204
+        assert r.content == b''
+        assert r.headers['X-Auth-User'] == 'user@example.com'
+        assert r.headers['X-Auth-Email'] == 'user@example.com'
+
+
+def test_verify_rejects_missing_or_unknown_session(main_module):
+    with TestClient(main_module.app) as client:
+        assert client.get('/auth/verify').status_code == 401
+        client.cookies.set('session_id', 'unknown')
+        r = client.get('/auth/verify')
+        assert r.status_code == 401
+        assert 'X-Auth-User' not in r.headers
+
+
+def test_verify_rejects_login_session(main_module):
+    """A login (state) session is not an authorized session"""
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+        client.cookies.set('session_id', session_id)
+        assert client.get('/auth/verify').status_code == 401
+
+
+def test_verify_encodes_internationalized_email(main_module):
+    email = 'jürgen.ß@exämple.com'
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(
+            main_module.server_session.store_data,
+            SessionRecord(user_id=email, email=email),
+        )
+        client.cookies.set('session_id', session_id)
+        r = client.get('/auth/verify')
+        assert r.status_code == 204
+        assert r.headers['X-Auth-User'].isascii()
+        assert unquote(r.headers['X-Auth-User']) == email
+        assert unquote(r.headers['X-Auth-Email']) == email
+
+
+def test_identity_header_keeps_ascii_addresses(main_module):
+    assert main_module.identity_header("o'brien+tag@example.com") == "o'brien+tag@example.com"
+    assert main_module.identity_header('100%@example.com') == '100%25@example.com'
+    assert main_module.identity_header('user@example.com\r\nX-Injected: 1') == 'user@example.com%0D%0AX-Injected%3A%201'
@@ -1,4 +1,151 @@
 """Test google OAuth client"""
+import json
 
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.authenticate.google import AsyncGoogleOAuth2Client, GoogleOAuth2Client
+from dockmaster.authenticate.jwks import JWKSCache
 
 #how to mock an API response for 200 and 400 (from google auth and exchange server(s))
+
+
+@pytest.fixture
+def oauth_client(jwks_server) -> GoogleOAuth2Client:
+    jwks_cache = JWKSCache(client=jwks_server.client(), background_refresh=False)
+    return GoogleOAuth2Client(
+        client_id='test-client-id',
+        client_secret='test-client-secret',
+        redirect_uri='http://localhost/callback/google',
+        scopes=['openid', 'email'],
+        jwks_cache=jwks_cache,
+    )
+
+
+def test_verify_google_id_token(oauth_client: GoogleOAuth2Client, signing_key, jwks_server):
+    """ID tokens are verified locally against the cached signing keys"""
+    assert oauth_client.verify_google_id_token(signing_key.sign())['email'] == 'user@example.com'
+    assert oauth_client.verify_google_id_token(signing_key.sign(aud='other')) == {}
+    assert jwks_server.requests == 1
+
+
+@pytest.fixture
+def async_oauth_client(jwks_server) -> AsyncGoogleOAuth2Client:
+    jwks_cache = JWKSCache(client=jwks_server.client(), background_refresh=False)
+    return AsyncGoogleOAuth2Client(
+        client_id='test-client-id',
+        client_secret='test-client-secret',
+        redirect_uri='http://localhost/callback/google',
+        scopes=['openid', 'email'],
+        jwks_cache=jwks_cache,
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_exchange_code_for_tokens(async_oauth_client: AsyncGoogleOAuth2Client, signing_key, jwks_server):
+    """The async client exchanges codes and verifies tokens over one pooled client"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path == '/token':
+            assert json.loads(request.content)['code'] == 'auth-code'
+            return httpx.Response(200, json={'access_token': 'access', 'id_token': signing_key.sign()})
+        return jwks_server.handler(request)
+
+    with pytest.raises(RuntimeError):
+        async_oauth_client.http_client
+
+    await async_oauth_client.open(transport=httpx.MockTransport(handler))
+    try:
+        for _ in range(3):
+            tokens = await async_oauth_client.exchange_code_for_tokens('https://oauth2.example.com/token', 'auth-code')
+            payload = await async_oauth_client.verify_google_id_token(tokens['id_token'])
+            assert payload['email'] == 'user@example.com'
+    finally:
+        await async_oauth_client.aclose()
+
+    # one fetch of the signing keys, no sync fetches
+    assert [r.url.path for r in requests].count('/oauth2/v3/certs') == 1
+    assert jwks_server.requests == 1
+
+
+def test_redirect_uri_is_per_request(jwks_server):
+    """The redirect_uri is passed per call, the shared client is not changed"""
+    oauth_client = GoogleOAuth2Client(
+        client_id='test-client-id',
+        client_secret='test-client-secret',
+        redirect_uri=None,
+        scopes=['openid'],
+        jwks_cache=JWKSCache(client=jwks_server.client(), background_refresh=False),
+    )
+    url, _ = oauth_client.create_authorization_url('https://accounts.example.com/auth', redirect_uri='http://app/callback')
+    assert 'redirect_uri=http%3A%2F%2Fapp%2Fcallback' in url
+    assert oauth_client._redirect_uri is None
+    assert oauth_client.get_token_request_body('code', 'http://app/callback')['redirect_uri'] == 'http://app/callback'
+    with pytest.raises(ValueError):
+        oauth_client.get_token_request_body('code')
+
+
+def test_callback_on_another_worker(main_module, monkeypatch):
+    """The callback exchanges the code with the login's redirect_uri, even if
+    another worker (or process) served the login"""
+    exchanged = []
+
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        exchanged.append(redirect_uri)
+        return {'access_token': 'access', 'id_token': 'id'}
+
+    async def verify_google_id_token(id_token):
+        return {'email': 'user@example.com', 'email_verified': True}
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+    monkeypatch.setattr(main_module.oauth_client, 'verify_google_id_token', verify_google_id_token)
+
+    with TestClient(main_module.app) as client:
+        r = client.get('/login/google', follow_redirects=False)
+        assert 'redirect_uri=http%3A%2F%2Ftestserver%2Fcallback%2Fgoogle' in r.headers['location']
+        # no state left on the shared client
+        assert main_module.oauth_client._redirect_uri is None
+        login_id = r.cookies['session_id']
+        login = client.portal.call(main_module.server_session.retrieve_data, login_id)
+        assert login['redirect_uri'] == 'http://testserver/callback/google'
+
+        client.cookies.set('session_id', login_id)
+        r = client.get('/callback/google', params={'code': 'code', 'state': login['state']}, follow_redirects=False)
+        assert r.status_code == 307
+        client.portal.call(main_module.end_session, r.cookies['session_id'])
+    assert exchanged == ['http://testserver/callback/google']
+
+
+@pytest.mark.parametrize('response,status', [
+    (httpx.Response(400, json={'error': 'invalid_grant'}), 401),
+    (httpx.Response(502), 503),
+    (httpx.Response(200, content=b'<html>'), 502),
+])
+def test_callback_exchange_errors(main_module, monkeypatch, response, status):
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        request = httpx.Request('POST', url)
+        response.request = request
+        response.raise_for_status()
+        return response.json()
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+
+    with TestClient(main_module.app) as client:
+        login_id = client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+        client.cookies.set('session_id', login_id)
+        r = client.get('/callback/google', params={'code': 'code', 'state': 'abc'}, follow_redirects=False)
+    assert r.status_code == status
+
+
+def test_callback_config_error_is_not_unauthorized(main_module, monkeypatch):
+    """A misconfigured client is a server error, not a rejected login"""
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        raise ValueError("Redirect URI not set")
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+
+    with TestClient(main_module.app, raise_server_exceptions=False) as client:
+        login_id = client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+        client.cookies.set('session_id', login_id)
+        r = client.get('/callback/google', params={'code': 'code', 'state': 'abc'}, follow_redirects=False)
+    assert r.status_code == 500
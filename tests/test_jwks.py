@@ -0,0 +1,148 @@
+"""Test the JWKS signing key cache"""
+import asyncio
+
+import httpx
+import pytest
+
+from dockmaster.authenticate.jwks import JWKSCache, parse_max_age
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def jwks_cache(jwks_server, clock) -> JWKSCache:
+    cache = JWKSCache(
+        jwks_url='https://keys.example.com/certs',
+        client=jwks_server.client(),
+        background_refresh=False,
+        clock=clock,
+    )
+    yield cache
+    cache.close()
+
+
+def test_parse_max_age():
+    assert parse_max_age('public, max-age=19845, must-revalidate') == 19845
+    assert parse_max_age('no-cache') is None
+    assert parse_max_age(None) is None
+
+
+def test_verify_fetches_keys_once(jwks_cache: JWKSCache, jwks_server, signing_key):
+    """Keys are fetched on first use and reused afterwards"""
+    for _ in range(5):
+        payload = jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+        assert payload['email'] == 'user@example.com'
+    assert jwks_server.requests == 1
+
+
+def test_refresh_after_max_age(jwks_cache: JWKSCache, jwks_server, signing_key, clock):
+    """Keys are re-fetched once the upstream max-age has passed"""
+    jwks_server.max_age = 100
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    clock.now = 50
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    assert jwks_server.requests == 1
+    clock.now = 101
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    assert jwks_server.requests == 2
+
+
+def test_unknown_kid_refetches(jwks_cache: JWKSCache, jwks_server, signing_key, rotated_signing_key, clock):
+    """A rotated key is picked up by re-fetching, but unknown kids are rate limited"""
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+
+    # unknown kid within the minimum refresh interval is rejected without a fetch
+    with pytest.raises(ValueError):
+        jwks_cache.verify_id_token(rotated_signing_key.sign(), audience='test-client-id')
+    assert jwks_server.requests == 1
+
+    # upstream rotates keys
+    jwks_server.keys = [signing_key, rotated_signing_key]
+    clock.now = jwks_cache.min_refresh_interval
+    payload = jwks_cache.verify_id_token(rotated_signing_key.sign(), audience='test-client-id')
+    assert payload['sub'] == '1234567890'
+    assert jwks_server.requests == 2
+    assert sorted(jwks_cache.kids) == ['test-key-1', 'test-key-2']
+
+
+@pytest.mark.parametrize('claims', [
+    {'aud': 'another-client'},
+    {'iss': 'https://evil.example.com'},
+    {'exp': 1000, 'iat': 0},
+])
+def test_invalid_claims(jwks_cache: JWKSCache, signing_key, claims):
+    with pytest.raises(ValueError):
+        jwks_cache.verify_id_token(signing_key.sign(**claims), audience='test-client-id')
+
+
+def test_invalid_signature(jwks_cache: JWKSCache, signing_key, make_signing_key):
+    """A token signed by another key with a known kid is rejected"""
+    token = make_signing_key(kid=signing_key.kid).sign()
+    with pytest.raises(ValueError):
+        jwks_cache.verify_id_token(token, audience='test-client-id')
+    with pytest.raises(ValueError):
+        jwks_cache.verify_id_token('not-a-token', audience='test-client-id')
+
+
+def test_max_age_floor(jwks_cache: JWKSCache, jwks_server, signing_key, clock):
+    """max-age=0 does not refetch the keys for every token"""
+    jwks_server.max_age = 0
+    for _ in range(3):
+        jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    assert jwks_server.requests == 1
+    clock.now = jwks_cache.min_refresh_interval
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    assert jwks_server.requests == 2
+
+
+@pytest.mark.parametrize('body', [b'<html>', b'{"keys": [{"kty": "RSA", "kid": "k"}]}', b'[]'])
+def test_malformed_key_set_keeps_cached_keys(jwks_cache: JWKSCache, jwks_server, signing_key, clock, body):
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    jwks_server.body = body
+    clock.now = 3600
+    assert jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')['email'] == 'user@example.com'
+    assert jwks_server.requests == 2
+    # backs off before the next fetch
+    jwks_cache.verify_id_token(signing_key.sign(), audience='test-client-id')
+    assert jwks_server.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_on_event_loop(jwks_server, signing_key, rotated_signing_key):
+    """Keys are refreshed before expiry over the async client that fetched them"""
+    cache = JWKSCache(jwks_url='https://keys.example.com/certs', min_refresh_interval=0.05, refresh_margin=0.5)
+    jwks_server.max_age = 0
+    async with httpx.AsyncClient(transport=httpx.MockTransport(jwks_server.handler)) as client:
+        await cache.averify_id_token(signing_key.sign(), audience='test-client-id', client=client)
+        jwks_server.keys = [rotated_signing_key]
+        await asyncio.sleep(0.2)
+        assert jwks_server.requests >= 2
+        assert cache.kids == ['test-key-2']
+        cache.close()
+    # no synchronous client was created
+    assert cache._client is None
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_survives_malformed_body(jwks_server, signing_key):
+    cache = JWKSCache(jwks_url='https://keys.example.com/certs', min_refresh_interval=0.05)
+    jwks_server.max_age = 0
+    async with httpx.AsyncClient(transport=httpx.MockTransport(jwks_server.handler)) as client:
+        await cache.averify_id_token(signing_key.sign(), audience='test-client-id', client=client)
+        jwks_server.body = b'not json'
+        await asyncio.sleep(0.2)
+        # the refresh keeps being retried
+        assert jwks_server.requests >= 3
+        assert cache.kids == ['test-key-1']
+        cache.close()
@@ -0,0 +1,142 @@
+"""Test the queued JSON logging pipeline and request id context"""
+import io
+import json
+import logging
+import queue
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.logger_config import BoundedQueueHandler, JSONFormatter, RequestIdFilter
+from dockmaster.logger_config import request_id_var, setup_logging
+
+
+@pytest.fixture
+def queued_logger():
+    """A queued JSON logger writing to a buffer"""
+    logger = setup_logging('dockmaster_test', log_level='INFO', log_format='json', use_queue=True, queue_size=100)
+    stream = io.StringIO()
+    listener = _listener_of(logger)
+    listener.handlers[0].setStream(stream)
+    yield logger, listener, stream
+    setup_logging('dockmaster_test', log_level='INFO')
+
+
+def _listener_of(logger: logging.Logger):
+    from dockmaster.logger_config import _listeners
+    return _listeners[logger.name]
+
+
+def test_json_records_written_off_thread(queued_logger):
+    logger, listener, stream = queued_logger
+    payload = {'user': 'before'}
+    token = request_id_var.set('req-1')
+    try:
+        logger.info("Login for %s", payload, extra={'route': '/callback/google'})
+    finally:
+        request_id_var.reset(token)
+    # args are merged on the calling thread
+    payload['user'] = 'after'
+    listener.stop()
+    listener.start()
+
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry['message'] == "Login for {'user': 'before'}"
+    assert entry['level'] == 'INFO'
+    assert entry['request_id'] == 'req-1'
+    assert entry['route'] == '/callback/google'
+
+
+def test_disabled_level_is_not_formatted(queued_logger):
+    logger, _, _ = queued_logger
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("formatted a disabled record")
+
+    logger.debug("Tokens %s", Expensive())
+
+
+def test_full_queue_drops_records():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2))
+    handler.addFilter(RequestIdFilter())
+    logger = logging.getLogger('dockmaster_test_full')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning("record %d", i)
+    finally:
+        logger.removeHandler(handler)
+    assert handler.queue.qsize() == 2
+    assert handler.stats() == {'queued': 2, 'dropped': 3}
+
+
+def test_full_queue_never_blocks_and_keeps_warnings():
+    """A WARNING on a full queue replaces a lower-level record without waiting"""
+    handler = BoundedQueueHandler(queue.Queue(maxsize=3))
+    logger = logging.getLogger('dockmaster_test_warnings')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        logger.info("info 0")
+        logger.warning("warning 0")
+        logger.info("info 1")
+        start = time.perf_counter()
+        logger.warning("warning 1")
+        logger.error("error 0")
+        logger.error("error 1")
+        elapsed = time.perf_counter() - start
+    finally:
+        logger.removeHandler(handler)
+    assert elapsed < 0.05
+    assert [record.msg for record in handler.queue.queue] == ["warning 0", "warning 1", "error 0"]
+    assert handler.dropped == 3
+
+
+def test_json_formatter_exception():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = logging.getLogger('x').makeRecord('x', logging.ERROR, __file__, 1, 'failed', None, __import__('sys').exc_info())
+    entry = json.loads(JSONFormatter().format(record))
+    assert 'ValueError: boom' in entry['exception']
+    assert entry['request_id'] is None
+
+
+def test_request_id_header(main_module):
+    with TestClient(main_module.app) as client:
+        generated = client.get('/auth/health')
+        forwarded = client.get('/auth/health', headers={'X-Request-ID': 'proxy-abc.1'})
+        malformed = client.get('/auth/health', headers={'X-Request-ID': 'bad id\n'})
+    assert len(generated.headers['x-request-id']) == 32
+    assert forwarded.headers['x-request-id'] == 'proxy-abc.1'
+    assert malformed.headers['x-request-id'] != 'bad id\n'
+
+
+def test_login_logs_no_secrets(main_module, monkeypatch, caplog):
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        return {'access_token': 'secret-access', 'refresh_token': 'secret-refresh', 'id_token': 'secret-id'}
+
+    async def verify_google_id_token(id_token):
+        return {'email': 'user@example.com', 'email_verified': True}
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+    monkeypatch.setattr(main_module.oauth_client, 'verify_google_id_token', verify_google_id_token)
+    monkeypatch.setattr(logging.getLogger('dockmaster'), 'level', logging.DEBUG)
+
+    with caplog.at_level(logging.DEBUG, logger='dockmaster'), TestClient(main_module.app) as client:
+        login_id = client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+        client.cookies.set('session_id', login_id)
+        r = client.get('/callback/google', params={'code': 'secret-code', 'state': 'abc'}, follow_redirects=False)
+        session_id = r.cookies['session_id']
+        client.cookies.set('session_id', session_id)
+        client.get('/')
+        client.portal.call(main_module.end_session, session_id)
+
+    messages = '\n'.join(record.getMessage() for record in caplog.records if record.name.startswith('dockmaster'))
+    assert 'Created authorization session for user@example.com' in messages
+    for secret in ('secret-access', 'secret-refresh', 'secret-id', 'secret-code', login_id, session_id):
+        assert secret not in messages
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from datetime import datetime, timedelta, timezone
 
@@ -5,6 +7,7 @@ from pydantic import BaseModel
 
 from dockmaster.session.schemas import SessionData, SessionID, SessionInterface
 from dockmaster.session.memory_session import MemorySession
+from dockmaster.session.manager import run_expiry_sweeper
 
 @pytest.fixture
 def session_data_dict()->dict:
@@ -64,6 +67,145 @@ def test_nonexistent_session(memory_session: SessionInterface):
     assert memory_session.remove_data("nonexistent") is None
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+def test_session_ttl_expires_lazily(clock: FakeClock, session_data_dict: dict):
+    """Test expired sessions are not returned"""
+    memory_session = MemorySession(clock=clock)
+    expiring_id = memory_session.store_data(session_data_dict, ttl=10)
+    permanent_id = memory_session.store_data(session_data_dict)
+    
+    clock.now = 9.9
+    assert memory_session.retrieve_data(expiring_id) == session_data_dict
+    clock.now = 10
+    assert memory_session.retrieve_data(expiring_id) is None
+    assert memory_session.remove_data(expiring_id) is None
+    assert memory_session.retrieve_data(permanent_id) == session_data_dict
+    assert len(memory_session) == 1
+
+def test_default_ttl(clock: FakeClock, session_data_dict: dict):
+    """Test the default ttl applies when none is passed"""
+    memory_session = MemorySession(default_ttl=5, clock=clock)
+    short_id = memory_session.store_data(session_data_dict)
+    long_id = memory_session.store_data(session_data_dict, ttl=60)
+    clock.now = 30
+    assert memory_session.retrieve_data(short_id) is None
+    assert memory_session.retrieve_data(long_id) == session_data_dict
+
+def test_purge_expired_login_storm(clock: FakeClock):
+    """Test memory stays flat under a sustained stream of abandoned logins"""
+    memory_session = MemorySession(clock=clock)
+    for second in range(300):
+        clock.now = second
+        for i in range(100):
+            memory_session.store_data({'state': f'{second}-{i}'}, ttl=5)
+        memory_session.purge_expired()
+        # only the last ttl window of logins is alive
+        assert len(memory_session) <= 5 * 100
+        assert len(memory_session._expiry_heap) <= 2 * len(memory_session) + 64
+    clock.now = 1000
+    assert memory_session.purge_expired() == 500
+    assert len(memory_session) == 0
+
+def test_purge_skips_removed_sessions(clock: FakeClock, session_data_dict: dict):
+    """Test removed sessions leave no work for the purge"""
+    memory_session = MemorySession(clock=clock)
+    session_ids = [memory_session.store_data(session_data_dict, ttl=10) for _ in range(1000)]
+    for session_id in session_ids[:900]:
+        memory_session.remove_data(session_id)
+    assert len(memory_session._expiry_heap) <= 2 * len(memory_session) + 64
+    clock.now = 10
+    assert memory_session.purge_expired() == 100
+    assert len(memory_session) == 0
+
+
+@pytest.mark.asyncio
+async def test_expiry_sweeper(clock: FakeClock, session_data_dict: dict):
+    """Test the background sweeper purges expired sessions"""
+    memory_session = MemorySession(clock=clock)
+    for _ in range(10):
+        memory_session.store_data(session_data_dict, ttl=1)
+    sweeper = asyncio.create_task(run_expiry_sweeper(memory_session, interval=0.01))
+    try:
+        clock.now = 2
+        await asyncio.sleep(0.05)
+        assert len(memory_session) == 0
+    finally:
+        sweeper.cancel()
+
+
+def test_lru_max_entries(session_data_dict: dict):
+    """Test least recently used sessions are evicted at capacity"""
+    memory_session = MemorySession(max_entries=3)
+    first, second, third = [memory_session.store_data(session_data_dict) for _ in range(3)]
+    # touch the oldest so the second becomes least recently used
+    assert memory_session.retrieve_data(first) == session_data_dict
+    fourth = memory_session.store_data(session_data_dict)
+    assert len(memory_session) == 3
+    assert memory_session.retrieve_data(second) is None
+    for session_id in (first, third, fourth):
+        assert memory_session.retrieve_data(session_id) == session_data_dict
+    assert memory_session.stats()['evictions_session'] == 1
+
+def test_lru_evicts_transient_first(session_data_dict: dict):
+    """Test login state sessions are evicted before authorized sessions"""
+    memory_session = MemorySession(max_entries=10)
+    authorized_ids = [memory_session.store_data(session_data_dict) for _ in range(5)]
+    # a bot storm of abandoned logins
+    for i in range(1000):
+        memory_session.store_data({'state': str(i)}, transient=True)
+    assert len(memory_session) == 10
+    for session_id in authorized_ids:
+        assert memory_session.retrieve_data(session_id) == session_data_dict
+    stats = memory_session.stats()
+    assert stats['evictions_transient'] == 995
+    assert stats['evictions_session'] == 0
+    assert stats['hits'] == 5
+    assert memory_session.retrieve_data('missing') is None
+    assert memory_session.stats()['misses'] == 1
+
+def test_lru_max_bytes(session_data_dict: dict):
+    """Test the approximate memory budget bounds the store"""
+    memory_session = MemorySession(max_bytes=20_000)
+    for i in range(1000):
+        memory_session.store_data({'state': str(i), 'payload': 'x' * 100})
+        assert memory_session.approximate_bytes <= 20_000
+    assert 0 < len(memory_session) < 1000
+    assert memory_session.stats()['evictions_session'] == 1000 - len(memory_session)
+    for session_id in list(memory_session._sessions):
+        memory_session.remove_data(session_id)
+    assert memory_session.approximate_bytes == 0
+
+
+def test_oversize_session_rejected():
+    """A session over the whole budget is rejected instead of stored and evicted at once"""
+    memory_session = MemorySession(max_bytes=1_000)
+    kept_id = memory_session.store_data({'state': 'abc'})
+    with pytest.raises(ValueError):
+        memory_session.store_data({'payload': 'x' * 2_000})
+    assert len(memory_session) == 1
+    assert memory_session.retrieve_data(kept_id) == {'state': 'abc'}
+
+
+def test_stored_session_never_evicted(session_data_dict: dict):
+    """The only transient session is not evicted by its own insert"""
+    memory_session = MemorySession(max_entries=2)
+    session_ids = [memory_session.store_data(session_data_dict) for _ in range(2)]
+    login_id = memory_session.store_data({'state': 'abc'}, transient=True)
+    assert memory_session.retrieve_data(login_id) == {'state': 'abc'}
+    assert memory_session.retrieve_data(session_ids[0]) is None
+    assert memory_session.stats()['evictions_session'] == 1
+
+
 # def test_dictionary_like_behavior(memory_session: SessionInterface, session_data_dict: dict):
 #     """Test dictionary like behavior"""
 #     session_data = session_data_dict
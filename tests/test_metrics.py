@@ -0,0 +1,131 @@
+"""Test the metrics registry, middleware and upstream transport"""
+import threading
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from dockmaster.metrics import AsyncMetricsTransport, HTTPMetrics, MetricsMiddleware, MetricsRegistry
+from dockmaster.metrics import UpstreamMetrics, stats_collector
+
+
+def test_counter_sums_thread_shards():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Test counter', ('kind',))
+
+    def work():
+        for _ in range(10_000):
+            counter.inc('a')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc('b', amount=2)
+    assert counter.values() == {('a',): 80_000, ('b',): 2}
+    text = registry.render()
+    assert '# TYPE test_total counter' in text
+    assert 'test_total{kind="a"} 80000' in text
+
+
+def test_histogram_exposition():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, '/')
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/"} 4' in lines
+    assert 'latency_seconds_sum{route="/"} 3.65' in lines
+
+
+def test_duplicate_metric_rejected():
+    registry = MetricsRegistry()
+    registry.counter('test_total', 'Test')
+    with pytest.raises(ValueError):
+        registry.counter('test_total', 'Test')
+
+
+def test_label_values_escaped():
+    registry = MetricsRegistry()
+    registry.counter('test_total', 'Test', ('path',)).inc('a"b\\c\nd')
+    assert 'test_total{path="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_stats_collector():
+    registry = MetricsRegistry()
+    registry.add_collector(stats_collector('store', 'Store', lambda: {'entries': 3, 'hits': 7}, counters=('hits',)))
+    text = registry.render()
+    assert 'store_entries 3' in text
+    assert '# TYPE store_hits_total counter' in text
+    assert 'store_hits_total 7' in text
+
+
+def test_middleware_labels_route_templates():
+    registry = MetricsRegistry()
+    metrics = HTTPMetrics(registry)
+
+    async def item(request):
+        return PlainTextResponse('ok')
+
+    async def fail(request):
+        raise RuntimeError('boom')
+
+    app = Starlette(routes=[Route('/items/{item_id}', item), Route('/static', item), Route('/fail', fail)])
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    with TestClient(app, raise_server_exceptions=False) as client:
+        client.get('/items/1')
+        client.get('/items/2')
+        client.get('/static')
+        client.get('/missing')
+        client.get('/fail')
+
+    requests = metrics.requests.values()
+    assert requests[('GET', '/items/{item_id}', '200')] == 2
+    assert requests[('GET', '/static', '200')] == 1
+    assert requests[('GET', 'unmatched', '404')] == 1
+    assert requests[('GET', '/fail', '500')] == 1
+    assert metrics.in_flight.values() == {(): 0}
+
+
+@pytest.mark.asyncio
+async def test_upstream_transport_outcomes():
+    metrics = UpstreamMetrics(MetricsRegistry())
+
+    def handler(request):
+        if request.url.path.endswith('/certs'):
+            raise httpx.ConnectError('refused', request=request)
+        return httpx.Response(200, json={})
+
+    transport = AsyncMetricsTransport(httpx.MockTransport(handler), metrics)
+    async with httpx.AsyncClient(transport=transport) as client:
+        await client.get('https://accounts.google.com/.well-known/openid-configuration')
+        await client.post('https://oauth2.googleapis.com/token')
+        with pytest.raises(httpx.ConnectError):
+            await client.get('https://www.googleapis.com/oauth2/v3/certs')
+    assert metrics.requests.values() == {
+        ('discovery', '200'): 1,
+        ('token', '200'): 1,
+        ('certs', 'ConnectError'): 1,
+    }
+
+
+def test_metrics_endpoint(main_module):
+    with TestClient(main_module.app) as client:
+        client.get('/auth/health')
+        r = client.get('/metrics')
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/plain; version=0.0.4')
+    text = r.text
+    assert 'dockmaster_http_requests_total{method="GET",route="/auth/health",status="200"}' in text
+    assert 'dockmaster_http_request_duration_seconds_bucket' in text
+    assert 'dockmaster_session_store_entries' in text
+    assert 'dockmaster_principal_cache_hits_total' in text
+    assert 'dockmaster_log_queue_dropped_total' in text
+    assert 'dockmaster_threadpool_max_threads' in text
@@ -0,0 +1,75 @@
+"""Test the LRU cache of resolved principals"""
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.session.principal_cache import PrincipalCache
+from dockmaster.session.records import SessionRecord
+
+
+@pytest.fixture
+def now() -> list[float]:
+    return [1000.0]
+
+
+@pytest.fixture
+def cache(now) -> PrincipalCache:
+    return PrincipalCache(max_entries=2, max_age=30, clock=lambda: now[0])
+
+
+def test_hit_and_miss_counters(cache):
+    record = SessionRecord(user_id='user@example.com')
+    assert cache.get('cookie') is None
+    cache.put('cookie', record)
+    assert cache.get('cookie') is record
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+
+def test_entries_expire_with_record_or_max_age(cache, now):
+    cache.put('short', SessionRecord(user_id='a', expires_at=1010.0))
+    cache.put('long', SessionRecord(user_id='b', expires_at=5000.0))
+    now[0] = 1010.0
+    assert cache.get('short') is None
+    assert cache.get('long') is not None
+    now[0] = 1030.0
+    assert cache.get('long') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_evicted(cache):
+    for cookie in ('a', 'b'):
+        cache.put(cookie, SessionRecord(user_id=cookie))
+    cache.get('a')
+    cache.put('c', SessionRecord(user_id='c'))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_invalidate(cache):
+    cache.put('cookie', SessionRecord(user_id='a'))
+    assert cache.invalidate('cookie')
+    assert not cache.invalidate('cookie')
+    assert cache.get('cookie') is None
+
+
+def test_repeat_requests_skip_session_store(main_module, monkeypatch):
+    """Only the first request resolves the session, logout invalidates it"""
+    lookups = []
+    retrieve_data = main_module.server_session.retrieve_data
+
+    async def counting_retrieve(session_id):
+        lookups.append(session_id)
+        return await retrieve_data(session_id)
+    monkeypatch.setattr(main_module.server_session, 'retrieve_data', counting_retrieve)
+
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(
+            main_module.server_session.store_data, SessionRecord(user_id='user@example.com'),
+        )
+        client.cookies.set('session_id', session_id)
+        for _ in range(3):
+            assert client.get('/principal').json()['user_id'] == 'user@example.com'
+        assert lookups == [session_id]
+
+        client.get('/logout', follow_redirects=False)
+        client.cookies.set('session_id', session_id)
+        assert client.get('/principal').json() == {}
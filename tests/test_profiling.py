@@ -0,0 +1,160 @@
+"""Test on-demand request profiling"""
+import asyncio
+import json
+import pstats
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from dockmaster.authorize.rbac import FileSource, RBACLoader
+from dockmaster.profiling import ProfileStore, Profiler, ProfilingMiddleware, span
+from dockmaster.profiling import sign_profile_request, verify_profile_request
+from dockmaster.session.records import SessionRecord
+
+
+def create_app(profiler: Profiler) -> Starlette:
+    async def work(request):
+        with span('first'):
+            await asyncio.sleep(0.01)
+        with span('second'):
+            sum(range(1000))
+        return PlainTextResponse('ok')
+
+    app = Starlette(routes=[Route('/work', work)])
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    return app
+
+
+def test_signed_header():
+    value = sign_profile_request('secret', ttl=60)
+    assert verify_profile_request('secret', value)
+    assert not verify_profile_request('other', value)
+    assert not verify_profile_request('secret', sign_profile_request('secret', ttl=-1))
+    assert not verify_profile_request('secret', 'garbage')
+
+
+def test_only_signed_requests_profiled(tmp_path):
+    profiler = Profiler(ProfileStore(str(tmp_path)), secret='secret')
+    with TestClient(create_app(profiler)) as client:
+        assert 'x-profile-id' not in client.get('/work').headers
+        assert 'x-profile-id' not in client.get('/work', headers={'X-Dockmaster-Profile': '1.bad'}).headers
+        r = client.get('/work', headers={'X-Dockmaster-Profile': sign_profile_request('secret')})
+    profile_id = r.headers['x-profile-id']
+    assert profiler.store.list() == [profile_id]
+
+    summary = json.loads((tmp_path / f"{profile_id}.json").read_text())
+    assert summary['path'] == '/work'
+    assert summary['status'] == 200
+    assert summary['trigger'] == 'header'
+    assert [s['name'] for s in summary['spans']] == ['first', 'second']
+    assert summary['spans'][0]['duration_ms'] >= 10
+    assert summary['spans'][1]['offset_ms'] >= summary['spans'][0]['duration_ms']
+    assert summary['functions']
+    # the .prof file loads in pstats (snakeviz, pstats.Stats)
+    pstats.Stats(str(tmp_path / f"{profile_id}.prof"))
+
+
+def test_sample_rate(tmp_path):
+    profiler = Profiler(ProfileStore(str(tmp_path)), sample_rate=1.0)
+    with TestClient(create_app(profiler)) as client:
+        assert 'x-profile-id' in client.get('/work').headers
+        profiler.sample_rate = 0.0
+        assert 'x-profile-id' not in client.get('/work').headers
+
+
+def test_store_keeps_newest(tmp_path):
+    profiler = Profiler(ProfileStore(str(tmp_path), max_profiles=3), sample_rate=1.0)
+    with TestClient(create_app(profiler)) as client:
+        ids = [client.get('/work').headers['x-profile-id'] for _ in range(5)]
+    assert profiler.store.list() == ids[:1:-1]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{profile_id}{extension}" for profile_id in ids[2:] for extension in ('.json', '.prof')
+    )
+
+
+def test_store_path_rejects_unknown_names(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    assert store.path('../etc/passwd') is None
+    assert store.path('20240101T000000000000-1-0123abcd.json') is None
+
+
+def test_span_outside_profile_is_noop():
+    with span('idle') as s:
+        pass
+    assert s._profile is None
+
+
+@pytest.fixture
+def admin_client(main_module, monkeypatch, tmp_path):
+    """Client logged in as a user with the admin role, profiles in tmp_path"""
+    rbac_filepath = tmp_path / 'rbac.json'
+    rbac_filepath.write_text(json.dumps({'users': {'admin@example.com': ['admin']}}))
+    monkeypatch.setattr(main_module, 'rbac_loader', RBACLoader(FileSource(rbac_filepath)))
+    monkeypatch.setattr(main_module.profiler, 'store', ProfileStore(str(tmp_path / 'profiles')))
+    monkeypatch.setattr(main_module.profiler, 'secret', 'profile-secret')
+    monkeypatch.setattr(main_module.profiler, 'sample_rate', 0.0)
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(
+            main_module.server_session.store_data,
+            SessionRecord(user_id='admin@example.com', email='admin@example.com'),
+        )
+        client.cookies.set('session_id', session_id)
+        yield client
+
+
+def test_admin_routes_require_role(main_module, admin_client):
+    with TestClient(main_module.app) as client:
+        assert client.get('/admin/profiling').status_code == 401
+        session_id = client.portal.call(
+            main_module.server_session.store_data,
+            SessionRecord(user_id='user@example.com', email='user@example.com'),
+        )
+        client.cookies.set('session_id', session_id)
+        assert client.get('/admin/profiling').status_code == 403
+        assert client.put('/admin/profiling', params={'sample_rate': 1}).status_code == 403
+    assert admin_client.get('/admin/profiling').status_code == 200
+
+
+def test_admin_toggle_and_download(admin_client):
+    assert admin_client.put('/admin/profiling', params={'sample_rate': 2}).status_code == 422
+    assert admin_client.put('/admin/profiling', params={'sample_rate': 1}).json() == {'sample_rate': 1.0}
+    profile_id = admin_client.get('/auth/health').headers['x-profile-id']
+    admin_client.put('/admin/profiling', params={'sample_rate': 0})
+
+    state = admin_client.get('/admin/profiling').json()
+    assert state['sample_rate'] == 0.0
+    assert state['signed_header'] is True
+    assert profile_id in state['profiles']
+    r = admin_client.get(f'/admin/profiling/profiles/{profile_id}.json')
+    assert r.status_code == 200
+    assert r.json()['path'] == '/auth/health'
+    r = admin_client.get(f'/admin/profiling/profiles/{profile_id}.prof')
+    assert r.headers['content-type'] == 'application/octet-stream'
+    assert admin_client.get('/admin/profiling/profiles/missing.json').status_code == 404
+
+
+def test_callback_spans(main_module, monkeypatch, admin_client):
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        return {'access_token': 'access', 'id_token': 'id'}
+
+    async def verify_google_id_token(id_token):
+        return {'email': 'user@example.com', 'email_verified': True}
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+    monkeypatch.setattr(main_module.oauth_client, 'verify_google_id_token', verify_google_id_token)
+
+    login_id = admin_client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+    admin_client.cookies.set('session_id', login_id)
+    r = admin_client.get(
+        '/callback/google',
+        params={'code': 'code', 'state': 'abc'},
+        headers={'X-Dockmaster-Profile': sign_profile_request('profile-secret')},
+        follow_redirects=False,
+    )
+    assert r.status_code == 307
+    summary = json.loads(open(main_module.profiler.store.path(f"{r.headers['x-profile-id']}.json")).read())
+    assert [s['name'] for s in summary['spans']] == ['state_check', 'discovery', 'exchange', 'verify', 'session_write']
+    assert summary['request_id'] == r.headers['x-request-id']
+    admin_client.portal.call(main_module.end_session, r.cookies['session_id'])
@@ -0,0 +1,130 @@
+"""Test the RBAC database loader and its sources"""
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.authorize.rbac import FileSource, RBACLoader, SecretManagerSource, run_rbac_poller
+from dockmaster.authorize.rbac import create_rbac_loader
+from dockmaster.configuration import AuthorizationSettings
+from dockmaster.session.records import SessionRecord
+
+
+class CountingFileSource(FileSource):
+    """Local file standing in for Secret Manager, counts payload reads"""
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self.reads = 0
+
+    def read(self, version):
+        self.reads += 1
+        return super().read(version)
+
+
+def write_database(filepath, users: dict, mtime_ns: int):
+    filepath.write_text(json.dumps({'users': users}))
+    os.utime(filepath, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def source(tmp_path) -> CountingFileSource:
+    filepath = tmp_path / 'rbac.json'
+    write_database(filepath, {'Admin@Example.com': ['admin']}, mtime_ns=1_000_000_000)
+    return CountingFileSource(filepath)
+
+
+def test_load_and_lookup(source):
+    loader = RBACLoader(source)
+    loader.load()
+    assert loader.roles_of('admin@example.com') == frozenset({'admin'})
+    assert loader.roles_of('other@example.com') == frozenset()
+    assert loader.version == source.version()
+
+
+def test_poll_reparses_only_on_change(source):
+    loader = RBACLoader(source)
+    loader.load()
+    assert not loader.poll()
+    assert source.reads == 1
+    write_database(source.filepath, {'admin@example.com': ['admin', 'analyst']}, mtime_ns=2_000_000_000)
+    assert loader.poll()
+    assert source.reads == 2
+    assert loader.roles_of('admin@example.com') == frozenset({'admin', 'analyst'})
+
+
+def test_poll_keeps_last_good_database(source):
+    loader = RBACLoader(source)
+    loader.load()
+    source.filepath.write_text('{not json')
+    assert not loader.poll()
+    source.filepath.unlink()
+    assert not loader.poll()
+    assert loader.roles_of('admin@example.com') == frozenset({'admin'})
+
+
+@pytest.mark.parametrize('document', [
+    {'users': {'admin@example.com': 'admin'}},
+    {'users': {'admin@example.com': ['admin', 1]}},
+    {'users': ['admin@example.com']},
+    ['admin@example.com'],
+])
+def test_poll_rejects_malformed_roles(source, document, caplog):
+    """A role string is not split into characters, the last good database is kept"""
+    loader = RBACLoader(source)
+    loader.load()
+    good_version = loader.version
+    source.filepath.write_text(json.dumps(document))
+    os.utime(source.filepath, ns=(2_000_000_000, 2_000_000_000))
+    assert not loader.poll()
+    assert loader.version == good_version
+    assert loader.roles_of('admin@example.com') == frozenset({'admin'})
+    assert source.version() in caplog.text
+
+
+def test_secret_manager_source():
+    versions = {'projects/p/secrets/rbac/versions/3': b'{"users": {"a@example.com": ["admin"]}}'}
+    client = SimpleNamespace(
+        get_secret_version=lambda request: SimpleNamespace(name='projects/p/secrets/rbac/versions/3'),
+        access_secret_version=lambda request: SimpleNamespace(payload=SimpleNamespace(data=versions[request['name']])),
+    )
+    loader = RBACLoader(SecretManagerSource('projects/p/secrets/rbac', client=client))
+    loader.load()
+    assert loader.version == 'projects/p/secrets/rbac/versions/3'
+    assert loader.roles_of('a@example.com') == frozenset({'admin'})
+    assert not loader.poll()
+
+
+def test_create_rbac_loader(source):
+    assert create_rbac_loader(AuthorizationSettings(_env_file=None)) is None
+    loader = create_rbac_loader(AuthorizationSettings(rbac_filepath=str(source.filepath), _env_file=None))
+    assert isinstance(loader.source, FileSource)
+
+
+@pytest.mark.asyncio
+async def test_poller_picks_up_changes(source):
+    loader = RBACLoader(source)
+    loader.load()
+    poller = asyncio.create_task(run_rbac_poller(loader, interval=0.01))
+    try:
+        write_database(source.filepath, {'new@example.com': ['admin']}, mtime_ns=3_000_000_000)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if loader.roles_of('new@example.com'):
+                break
+        assert loader.roles_of('new@example.com') == frozenset({'admin'})
+    finally:
+        poller.cancel()
+
+
+def test_principal_roles_from_rbac(main_module, source, monkeypatch):
+    loader = RBACLoader(source)
+    loader.load()
+    monkeypatch.setattr(main_module, 'rbac_loader', loader)
+    with TestClient(main_module.app) as client:
+        session_id = client.portal.call(main_module.server_session.store_data, SessionRecord(user_id='admin@example.com'))
+        request = SimpleNamespace(cookies={'session_id': session_id})
+        assert client.portal.call(main_module.principal_roles, request) == frozenset({'admin'})
+        assert client.portal.call(main_module.principal_roles, SimpleNamespace(cookies={})) is None
@@ -0,0 +1,85 @@
+"""Test the Redis-protocol session backend against an in-process fake server"""
+import asyncio
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+
+from dockmaster.session.redis_session import RedisSession
+
+
+@pytest_asyncio.fixture
+async def redis_session() -> RedisSession:
+    session = RedisSession(client=fakeredis.FakeAsyncRedis(), key_prefix='test:session:')
+    yield session
+    await session.aclose()
+
+
+@pytest.mark.asyncio
+async def test_store_retrieve_remove(redis_session: RedisSession):
+    session_id = await redis_session.store_data({'user_id': 'user@example.com', 'roles': ['admin']})
+    assert await redis_session.retrieve_data(session_id) == {'user_id': 'user@example.com', 'roles': ['admin']}
+    assert await redis_session.remove_data(session_id) == {'user_id': 'user@example.com', 'roles': ['admin']}
+    assert await redis_session.retrieve_data(session_id) is None
+    assert await redis_session.remove_data(session_id) is None
+    assert await redis_session.ping()
+
+
+@pytest.mark.asyncio
+async def test_native_ttl(redis_session: RedisSession):
+    session_id = await redis_session.store_data({'state': 'abc'}, ttl=0.05, transient=True)
+    assert 0 < await redis_session._redis.pttl(f'test:session:{session_id}') <= 50
+    await asyncio.sleep(0.1)
+    assert await redis_session.retrieve_data(session_id) is None
+    assert await redis_session.purge_expired() == 0
+
+
+@pytest.mark.asyncio
+async def test_get_many_delete_many(redis_session: RedisSession):
+    session_ids = [await redis_session.store_data({'n': i}) for i in range(5)]
+    assert await redis_session.get_many(session_ids + ['missing']) == [{'n': i} for i in range(5)] + [None]
+    assert await redis_session.delete_many(session_ids[:3] + ['missing']) == 3
+    assert await redis_session.get_many(session_ids) == [None, None, None, {'n': 3}, {'n': 4}]
+    assert await redis_session.get_many([]) == []
+    assert await redis_session.delete_many([]) == 0
+
+
+@pytest.mark.asyncio
+async def test_pop_if_state_matches(redis_session: RedisSession):
+    session_id = await redis_session.store_data({'state': 'abc'}, transient=True)
+    assert await redis_session.pop_if_state_matches(session_id, 'wrong') is None
+    assert await redis_session.retrieve_data(session_id) == {'state': 'abc'}
+
+    # racing callbacks: exactly one consumes the login session
+    results = await asyncio.gather(*[redis_session.pop_if_state_matches(session_id, 'abc') for _ in range(10)])
+    assert [r for r in results if r is not None] == [{'state': 'abc'}]
+
+
+@pytest.mark.asyncio
+async def test_shared_between_workers():
+    """Two worker processes (clients) see the same sessions"""
+    server = fakeredis.FakeServer()
+    worker_a = RedisSession(client=fakeredis.FakeAsyncRedis(server=server))
+    worker_b = RedisSession(client=fakeredis.FakeAsyncRedis(server=server))
+    session_id = await worker_a.store_data({'state': 'abc'}, ttl=60, transient=True)
+    assert await worker_b.pop_if_state_matches(session_id, 'abc') == {'state': 'abc'}
+    assert await worker_a.retrieve_data(session_id) is None
+    await worker_a.aclose()
+    await worker_b.aclose()
+
+
+def test_unreadable_session_logs_out(main_module, monkeypatch):
+    """An entry in an old or corrupt format is a missing session, not a server error"""
+    redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(main_module, 'server_session', RedisSession(client=redis, key_prefix='test:session:'))
+    with TestClient(main_module.app) as client:
+        client.portal.call(redis.set, 'test:session:garbage', b'\x00\x80\x04garbage')
+        client.cookies.set('session_id', 'garbage')
+        r = client.get('/', follow_redirects=False)
+        assert r.status_code == 307
+        assert 'session_id=""' in r.headers['set-cookie']
+        client.portal.call(redis.set, 'test:session:garbage', b'\x00\x80\x04garbage')
+        client.cookies.set('session_id', 'garbage')
+        assert client.get('/auth/verify').status_code == 401
+        assert client.get('/principal').json() == {}
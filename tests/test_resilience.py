@@ -0,0 +1,311 @@
+"""Test retries, timeouts and circuit breaking against a local fault-injecting server"""
+import asyncio
+import email.utils
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from dockmaster.authenticate.google import AsyncGoogleOAuth2Client
+from dockmaster.resilience import AsyncResilientTransport, CircuitBreaker, CircuitOpenError
+from dockmaster.resilience import ResiliencePolicy, ResilientTransport, RetryBudget, RetryPolicy
+from dockmaster.resilience import parse_retry_after
+
+FAST_RETRIES = RetryPolicy(max_retries=2, backoff_base=0.001, backoff_max=0.005)
+
+
+class FaultServer:
+    """Local HTTP server answering with scripted faults, then 200
+
+    faults: ('status', code), ('status', code, headers), ('delay', seconds) or ('reset',)
+    """
+    def __init__(self):
+        self.faults: list[tuple] = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('content-length', 0))
+                self.rfile.read(length)
+                with server._lock:
+                    server.requests += 1
+                    fault = server.faults.pop(0) if server.faults else None
+                if fault is not None and fault[0] == 'reset':
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                    return
+                if fault is not None and fault[0] == 'delay':
+                    time.sleep(fault[1])
+                status = fault[1] if fault is not None and fault[0] == 'status' else 200
+                body = json.dumps({'access_token': 'access', 'status': status}).encode()
+                self.send_response(status)
+                if fault is not None and fault[0] == 'status' and len(fault) > 2:
+                    for name, value in fault[2].items():
+                        self.send_header(name, value)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _handle
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fault_server():
+    server = FaultServer()
+    yield server
+    server.close()
+
+
+def async_client(policy: ResiliencePolicy, read_timeout: float = 1.0) -> httpx.AsyncClient:
+    transport = AsyncResilientTransport(httpx.AsyncHTTPTransport(), policy)
+    return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(read_timeout, connect=0.5))
+
+
+@pytest.mark.asyncio
+async def test_retries_server_errors(fault_server):
+    fault_server.faults = [('status', 503), ('status', 502)]
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES)) as client:
+        r = await client.get(f'{fault_server.url}/certs')
+    assert r.status_code == 200
+    assert fault_server.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_server_error_not_retried_for_post(fault_server):
+    """A 5xx code exchange may have redeemed the code, it is not replayed"""
+    fault_server.faults = [('status', 503)]
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES)) as client:
+        r = await client.post(f'{fault_server.url}/token', json={'code': 'code'})
+    assert r.status_code == 503
+    assert fault_server.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_honoured(fault_server):
+    fault_server.faults = [('status', 429, {'Retry-After': '0.2'})]
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES)) as client:
+        start = time.monotonic()
+        r = await client.get(f'{fault_server.url}/certs')
+    assert r.status_code == 200
+    assert time.monotonic() - start >= 0.2
+    assert fault_server.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_not_retried(fault_server):
+    fault_server.faults = [('status', 503, {'Retry-After': 'Fri, 31 Dec 2100 23:59:59 GMT'})]
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES)) as client:
+        start = time.monotonic()
+        r = await client.get(f'{fault_server.url}/certs')
+    assert r.status_code == 503
+    assert time.monotonic() - start < 1
+    assert fault_server.requests == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT') == 0.0
+    assert 0 < parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(fault_server):
+    fault_server.faults = [('status', 503)] * 5
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES)) as client:
+        r = await client.get(f'{fault_server.url}/certs')
+    assert r.status_code == 503
+    assert fault_server.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_read_timeout_not_retried_for_post(fault_server):
+    """The code may have been redeemed, a second exchange would fail anyway"""
+    fault_server.faults = [('delay', 0.3)]
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES), read_timeout=0.05) as client:
+        with pytest.raises(httpx.ReadTimeout):
+            await client.post(f'{fault_server.url}/token', json={'code': 'code'})
+    assert fault_server.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_idempotent_request_retried_after_reset(fault_server):
+    fault_server.faults = [('reset',), ('delay', 0.3)]
+    async with async_client(ResiliencePolicy(retry=FAST_RETRIES), read_timeout=0.05) as client:
+        r = await client.get(f'{fault_server.url}/certs')
+    assert r.status_code == 200
+    assert fault_server.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_connect_errors_retried_for_post():
+    """Nothing reached upstream, retrying is safe for any method"""
+    attempts = []
+
+    def refuse(request):
+        attempts.append(request.method)
+        raise httpx.ConnectError('Connection refused', request=request)
+
+    transport = AsyncResilientTransport(httpx.MockTransport(refuse), ResiliencePolicy(retry=FAST_RETRIES))
+    async with httpx.AsyncClient(transport=transport) as client:
+        with pytest.raises(httpx.ConnectError):
+            await client.post('http://127.0.0.1:9/token', json={})
+    assert attempts == ['POST'] * 3
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_recovers(fault_server):
+    now = [0.0]
+    policy = ResiliencePolicy(retry=RetryPolicy(max_retries=0), failure_threshold=3, reset_timeout=30, clock=lambda: now[0])
+    fault_server.faults = [('status', 503)] * 3
+    async with async_client(policy) as client:
+        for _ in range(3):
+            assert (await client.post(f'{fault_server.url}/token')).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            await client.post(f'{fault_server.url}/token')
+        assert fault_server.requests == 3
+        assert policy.breakers() == {'127.0.0.1': CircuitBreaker.OPEN}
+
+        now[0] = 31.0
+        assert (await client.post(f'{fault_server.url}/token')).status_code == 200
+        assert policy.breakers() == {'127.0.0.1': CircuitBreaker.CLOSED}
+
+
+def test_half_open_allows_one_trial():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 10.0
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_trial_times_out():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0], trial_timeout=5)
+    breaker.record_failure()
+    now[0] = 10.0
+    assert breaker.allow()
+    # the trial never reports back
+    now[0] = 14.0
+    assert not breaker.allow()
+    now[0] = 15.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_does_not_keep_circuit_open():
+    now = [0.0]
+    policy = ResiliencePolicy(retry=RetryPolicy(max_retries=0), failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    hang = asyncio.Event()
+
+    async def handler(request):
+        if hang.is_set():
+            await asyncio.sleep(3600)
+        return httpx.Response(503 if request.url.path == '/fail' else 200)
+
+    transport = AsyncResilientTransport(httpx.MockTransport(handler), policy)
+    async with httpx.AsyncClient(transport=transport) as client:
+        await client.get('http://upstream/fail')
+        assert policy.breakers() == {'upstream': CircuitBreaker.OPEN}
+        now[0] = 10.0
+        hang.set()
+        trial = asyncio.create_task(client.get('http://upstream/token'))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        hang.clear()
+        assert (await client.get('http://upstream/token')).status_code == 200
+        assert policy.breakers() == {'upstream': CircuitBreaker.CLOSED}
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_caps_retries(fault_server):
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=2.0)
+    fault_server.faults = [('status', 503)] * 20
+    policy = ResiliencePolicy(retry=FAST_RETRIES, budget=budget, failure_threshold=100)
+    async with async_client(policy) as client:
+        for _ in range(5):
+            await client.get(f'{fault_server.url}/certs')
+    # 5 requests, only 2 retries in the budget
+    assert fault_server.requests == 7
+
+
+def test_backoff_has_full_jitter():
+    policy = RetryPolicy(backoff_base=0.1, backoff_max=1.0)
+    delays = [policy.delay(3) for _ in range(200)]
+    assert all(0 <= delay <= 0.8 for delay in delays)
+    assert len(set(delays)) > 100
+    assert all(policy.delay(10) <= 1.0 for _ in range(50))
+
+
+def test_sync_transport(fault_server):
+    fault_server.faults = [('status', 500)]
+    transport = ResilientTransport(httpx.HTTPTransport(), ResiliencePolicy(retry=FAST_RETRIES))
+    with httpx.Client(transport=transport, timeout=1.0) as client:
+        assert client.get(f'{fault_server.url}/certs').status_code == 200
+    assert fault_server.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_google_client_uses_policy(fault_server):
+    oauth_client = AsyncGoogleOAuth2Client(
+        client_id='test-client-id',
+        client_secret='test-client-secret',
+        redirect_uri='http://localhost/callback/google',
+        scopes=['openid'],
+        http2=False,
+        resilience=ResiliencePolicy(retry=FAST_RETRIES),
+    )
+    fault_server.faults = [('status', 503)]
+    async with oauth_client:
+        assert (await oauth_client.http_client.get(f'{fault_server.url}/certs')).status_code == 200
+        assert fault_server.requests == 2
+        # the code exchange (POST) is not replayed
+        fault_server.faults = [('status', 503)]
+        with pytest.raises(httpx.HTTPStatusError):
+            await oauth_client.exchange_code_for_tokens(f'{fault_server.url}/token', 'code')
+    assert fault_server.requests == 3
+
+
+def test_callback_fails_fast_when_circuit_open(main_module, monkeypatch):
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        raise CircuitOpenError('Circuit open for oauth2.googleapis.com')
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+
+    with TestClient(main_module.app) as client:
+        login_id = client.portal.call(main_module.server_session.store_data, {'state': 'abc'})
+        client.cookies.set('session_id', login_id)
+        r = client.get('/callback/google', params={'code': 'code', 'state': 'abc'}, follow_redirects=False)
+    assert r.status_code == 503
@@ -0,0 +1,117 @@
+"""Test the compiled route permission matcher"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from flask import Flask
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from dockmaster.authorize.routes import AUTHENTICATED, PUBLIC
+from dockmaster.authorize.routes import RouteMatcher, RoutePermissionMiddleware, RouteRule
+from dockmaster.flask_dev.app import route_permission_hook
+from dockmaster.session.records import SessionRecord
+
+
+@pytest.fixture
+def matcher() -> RouteMatcher:
+    return RouteMatcher.from_config(
+        no_auth=['/', '/login', '/admin/status'],
+        no_auth_prefixes=['/static', '/auth'],
+        route_roles={'/admin': ['admin'], '/reports': ['admin', 'analyst'], '/reports/finance': ['finance']},
+    )
+
+
+@pytest.mark.parametrize('path,required', [
+    ('/', PUBLIC),
+    ('/login', PUBLIC),
+    ('/login/', PUBLIC),
+    ('/login/extra', AUTHENTICATED),
+    ('/static', PUBLIC),
+    ('/static/js/app.js', PUBLIC),
+    ('/staticfiles', AUTHENTICATED),
+    ('/admin', frozenset({'admin'})),
+    ('/admin/users', frozenset({'admin'})),
+    ('/admin/status', PUBLIC),
+    ('/reports/q1', frozenset({'admin', 'analyst'})),
+    ('/reports/finance/q1', frozenset({'finance'})),
+    ('//auth//health', PUBLIC),
+    ('/other', AUTHENTICATED),
+])
+def test_match(matcher, path, required):
+    assert matcher.match(path) == required
+
+
+def test_is_authorized(matcher):
+    assert matcher.is_authorized('/static/app.js', None)
+    assert not matcher.is_authorized('/other', None)
+    assert matcher.is_authorized('/other', frozenset())
+    assert not matcher.is_authorized('/admin', frozenset({'analyst'}))
+    assert matcher.is_authorized('/reports/q1', frozenset({'analyst'}))
+
+
+def test_later_rule_replaces_earlier():
+    matcher = RouteMatcher([RouteRule('/a', PUBLIC, prefix=True), RouteRule('/a', frozenset({'x'}), prefix=True)])
+    assert len(matcher) == 1
+    assert matcher.match('/a/b') == frozenset({'x'})
+
+
+def test_public_default():
+    assert RouteMatcher(default=PUBLIC).match('/anything') is PUBLIC
+
+
+def test_many_rules():
+    matcher = RouteMatcher.from_config(route_roles={f'/service{i}/api': [f'role{i}'] for i in range(10_000)})
+    assert len(matcher) == 10_000
+    assert matcher.match('/service9999/api/v1/items') == frozenset({'role9999'})
+    assert matcher.match('/service9999/other') == AUTHENTICATED
+
+
+def test_asgi_middleware(matcher):
+    async def get_roles(request):
+        user = request.headers.get('x-test-roles')
+        return None if user is None else frozenset(filter(None, user.split(',')))
+
+    async def ok(request):
+        return PlainTextResponse('ok')
+
+    app = Starlette(routes=[Route('/{path:path}', ok)])
+    app.add_middleware(RoutePermissionMiddleware, matcher=matcher, get_roles=get_roles)
+    client = TestClient(app)
+    assert client.get('/static/app.js').status_code == 200
+    assert client.get('/other').status_code == 401
+    assert client.get('/other', headers={'x-test-roles': ''}).status_code == 200
+    assert client.get('/admin', headers={'x-test-roles': 'analyst'}).status_code == 403
+    assert client.get('/admin', headers={'x-test-roles': 'admin'}).status_code == 200
+
+
+def test_flask_before_request_hook(matcher):
+    app = Flask('test')
+    app.secret_key = 'test'
+    app.before_request(route_permission_hook(matcher))
+
+    @app.route('/<path:path>')
+    @app.route('/')
+    def ok(path=''):
+        return 'ok'
+
+    client = app.test_client()
+    assert client.get('/auth/login').status_code == 200
+    assert client.get('/other').status_code == 401
+    with client.session_transaction() as session:
+        session['token'] = 'id-token'
+        session['expiry'] = datetime.now() + timedelta(hours=1)
+        session['roles'] = ['analyst']
+    assert client.get('/other').status_code == 200
+    assert client.get('/admin/users').status_code == 403
+    assert client.get('/reports/q1').status_code == 200
+
+
+def test_app_requires_session_for_unknown_routes(main_module):
+    with TestClient(main_module.app) as client:
+        assert client.get('/auth/health').status_code == 200
+        assert client.get('/private').status_code == 401
+        session_id = client.portal.call(main_module.server_session.store_data, SessionRecord(user_id='user@example.com'))
+        client.cookies.set('session_id', session_id)
+        assert client.get('/private').status_code == 404
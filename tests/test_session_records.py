@@ -0,0 +1,94 @@
+"""Test compact session records and their serialization"""
+import pickle
+
+import pytest
+
+from dockmaster.session import serialization
+from dockmaster.session.records import SessionRecord
+from dockmaster.session.memory_session import approximate_size
+from dockmaster.session.shared_memory_session import SharedMemorySession
+from dockmaster.session.sqlite_session import SQLiteSession
+
+
+@pytest.fixture
+def record() -> SessionRecord:
+    return SessionRecord(
+        user_id='user@example.com',
+        name='Test Üser',
+        email='user@example.com',
+        picture='https://example.com/photo.jpg',
+        given_name='Test',
+        expires_at=1700000000.5,
+    )
+
+
+def test_from_id_token_keeps_profile_fields():
+    payload = {'email': 'user@example.com', 'name': 'Test User', 'sub': '123', 'aud': 'client', 'at_hash': 'x'}
+    record = SessionRecord.from_id_token('user@example.com', payload, expires_at=10.0)
+    assert record.profile() == {
+        'name': 'Test User', 'email': 'user@example.com', 'picture': '', 'given_name': '', 'family_name': '',
+    }
+    assert not hasattr(record, '__dict__')
+
+
+def test_binary_round_trip(record):
+    assert SessionRecord.from_bytes(record.to_bytes()) == record
+
+
+def test_version_1_refresh_token_skipped(record):
+    """Records stored with a refresh token (version 1) load without it"""
+    data = bytearray(record.to_bytes())
+    data[0:2] = b'\x01\x01'
+    data += b'\x0a\x001//refresh'
+    assert SessionRecord.from_bytes(bytes(data)) == record
+    with pytest.raises(ValueError):
+        SessionRecord.from_bytes(b'\x03' + bytes(data[1:]))
+
+
+def test_serialization_tags_records_and_dicts(record):
+    data = serialization.dumps(record)
+    assert serialization.loads(data) == record
+    assert len(data) < len(serialization.dumps({name: getattr(record, name) for name in record.__slots__}))
+    data = serialization.dumps({'state': 'abc'})
+    assert data == b'\x02{"state":"abc"}'
+    assert serialization.loads(data) == {'state': 'abc'}
+
+
+def test_serialization_never_unpickles():
+    class Exploit:
+        def __reduce__(self):
+            return (exec, ("raise AssertionError('unpickled')",))
+    with pytest.raises(ValueError):
+        serialization.loads(b'\x00' + pickle.dumps(Exploit()))
+    with pytest.raises(TypeError):
+        serialization.dumps(Exploit())
+    with pytest.raises(TypeError):
+        serialization.dumps({'value': Exploit()})
+
+
+def test_record_is_smaller_than_dict(record):
+    as_dict = {name: getattr(record, name) for name in record.__slots__}
+    assert approximate_size(record) < approximate_size(as_dict)
+
+
+def test_out_of_process_backends_store_records(record, tmp_path):
+    shared = SharedMemorySession(path=str(tmp_path / 'sessions'), slots=64, value_size=256)
+    sqlite = SQLiteSession(path=str(tmp_path / 'sessions.db'))
+    try:
+        session_id = shared.store_data(record)
+        assert shared.retrieve_data(session_id) == record
+        session_id = sqlite.store_data(record)
+        sqlite.flush()
+        sqlite._cache.remove_data(session_id)
+        assert sqlite.retrieve_data(session_id) == record
+    finally:
+        shared.close()
+        sqlite.close()
+
+
+@pytest.mark.parametrize('data', [b'\x00garbage', b'\x01\x02', b'\x02{not json', b'\x02"a string"', b''])
+def test_unreadable_session_is_missing(data):
+    with pytest.raises(ValueError):
+        serialization.loads(data)
+    assert serialization.loads_or_none(data) is None
+    assert serialization.loads_or_none(None) is None
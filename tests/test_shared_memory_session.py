@@ -0,0 +1,135 @@
+"""Test the multi-process shared memory session store"""
+import errno
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from dockmaster.session.shared_memory_session import SharedMemorySession
+
+
+@pytest.fixture
+def table_path(tmp_path) -> str:
+    return str(tmp_path / 'sessions.table')
+
+
+@pytest.fixture
+def shared_session(table_path: str) -> SharedMemorySession:
+    session = SharedMemorySession(path=table_path, slots=256, slots_per_stripe=16, value_size=256)
+    yield session
+    session.close()
+
+
+def test_store_retrieve_remove(shared_session: SharedMemorySession):
+    session_id = shared_session.store_data({'user_id': 'user@example.com'})
+    assert shared_session.retrieve_data(session_id) == {'user_id': 'user@example.com'}
+    assert shared_session.remove_data(session_id) == {'user_id': 'user@example.com'}
+    assert shared_session.retrieve_data(session_id) is None
+    assert shared_session.remove_data(session_id) is None
+    assert shared_session.retrieve_data('nonexistent') is None
+
+
+def test_value_too_large(shared_session: SharedMemorySession):
+    with pytest.raises(ValueError):
+        shared_session.store_data({'payload': 'x' * 1000})
+    assert shared_session.stats()['store_failures'] == 1
+
+
+def test_expiry_and_purge(shared_session: SharedMemorySession):
+    expiring_id = shared_session.store_data({'state': 'abc'}, ttl=0.05, transient=True)
+    kept_id = shared_session.store_data({'user_id': 'user@example.com'}, ttl=3600)
+    removed_id = shared_session.store_data({'user_id': 'removed'})
+    shared_session.remove_data(removed_id)
+    time.sleep(0.1)
+    assert shared_session.retrieve_data(expiring_id) is None
+    assert shared_session.purge_expired() == 1
+    assert shared_session.retrieve_data(kept_id) == {'user_id': 'user@example.com'}
+    assert len(shared_session) == 1
+
+
+def test_full_stripe_evicts_transient_first(table_path: str):
+    shared_session = SharedMemorySession(path=table_path, slots=8, slots_per_stripe=8, value_size=128)
+    try:
+        authorized_ids = [shared_session.store_data({'user_id': f'user-{i}'}) for i in range(4)]
+        for i in range(100):
+            shared_session.store_data({'state': str(i)}, transient=True)
+        assert len(shared_session) == 8
+        assert all(shared_session.retrieve_data(session_id) is not None for session_id in authorized_ids)
+        assert shared_session.stats() == {
+            'entries': 8,
+            'capacity': 8,
+            'evictions_transient': 96,
+            'evictions_session': 0,
+            'store_failures': 0,
+        }
+    finally:
+        shared_session.close()
+
+
+def test_pop_if_state_matches(shared_session: SharedMemorySession):
+    session_id = shared_session.store_data({'state': 'abc'}, transient=True)
+    assert shared_session.pop_if_state_matches(session_id, 'wrong') is None
+    assert shared_session.pop_if_state_matches(session_id, 'abc') == {'state': 'abc'}
+    assert shared_session.pop_if_state_matches(session_id, 'abc') is None
+
+
+def _complete_login(path: str, session_id: str, results):
+    worker = SharedMemorySession(path=path)
+    try:
+        session = worker.pop_if_state_matches(session_id, 'abc')
+        results.put(worker.store_data({'user_id': 'user@example.com'}) if session is not None else None)
+    finally:
+        worker.close()
+
+
+def test_shared_between_processes(shared_session: SharedMemorySession, table_path: str):
+    """A login started on one worker completes on exactly one of the others"""
+    session_id = shared_session.store_data({'state': 'abc'}, ttl=60, transient=True)
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_complete_login, args=(table_path, session_id, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+    authorized_ids = [session_id for session_id in (results.get(timeout=5) for _ in workers) if session_id]
+    assert len(authorized_ids) == 1
+    assert shared_session.retrieve_data(authorized_ids[0]) == {'user_id': 'user@example.com'}
+
+
+def test_table_preallocated(table_path: str):
+    shared_session = SharedMemorySession(path=table_path, slots=256, slots_per_stripe=16, value_size=256)
+    try:
+        stat = os.stat(table_path)
+        assert stat.st_blocks * 512 >= stat.st_size
+    finally:
+        shared_session.close()
+
+
+def test_full_device_fails_at_startup(table_path: str, monkeypatch):
+    def posix_fallocate(fd, offset, length):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    monkeypatch.setattr(os, 'posix_fallocate', posix_fallocate)
+    with pytest.raises(OSError) as e:
+        SharedMemorySession(path=table_path, slots=256, slots_per_stripe=16, value_size=256)
+    assert e.value.errno == errno.ENOSPC
+    # left empty, the next start initializes it
+    assert os.stat(table_path).st_size == 0
+
+
+def test_purge_rewrites_only_dirty_stripes(table_path: str):
+    shared_session = SharedMemorySession(path=table_path, slots=8, slots_per_stripe=8, value_size=128)
+    try:
+        session_id = shared_session.store_data({'user_id': 'user@example.com'})
+        # marker in the unused value area of the last slot, a rewrite zero-fills it
+        marker = shared_session._slot_offset(0, 8) - 1
+        shared_session._mmap[marker] = 0xFF
+        assert shared_session.purge_expired() == 0
+        assert shared_session._mmap[marker] == 0xFF
+
+        shared_session.remove_data(session_id)
+        shared_session.purge_expired()
+        assert shared_session._mmap[marker] == 0
+    finally:
+        shared_session.close()
@@ -0,0 +1,145 @@
+"""Test single-flight coalescing and where it is applied"""
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from dockmaster.authenticate.discovery import DiscoveryCache
+from dockmaster.authenticate.jwks import JWKSCache
+from dockmaster.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return 'document'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', fetch))) for _ in range(10)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ['document'] * 10
+    assert not flight.in_flight('key')
+    # nothing cached
+    assert flight.do('key', fetch) == 'document' and len(calls) == 2
+
+
+def test_threads_share_exception():
+    flight = SingleFlight()
+
+    def fetch():
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fetch)
+    assert not flight.in_flight('key')
+
+
+@pytest.mark.asyncio
+async def test_tasks_share_one_call():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.02)
+        return key.upper()
+
+    results = await asyncio.gather(*(flight.do(key, lambda key=key: fetch(key)) for key in ['a'] * 10 + ['b'] * 5))
+    assert sorted(calls) == ['a', 'b']
+    assert results == ['A'] * 10 + ['B'] * 5
+    assert not flight.in_flight('a')
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    flight = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 'ok'
+
+    first = asyncio.create_task(flight.do('key', fetch))
+    second = asyncio.create_task(flight.do('key', fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 'ok'
+
+
+@pytest.mark.asyncio
+async def test_discovery_revalidation_coalesced(discovery_document):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json=discovery_document)
+
+    cache = DiscoveryCache('https://accounts.example.com/.well-known/openid-configuration')
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        documents = await asyncio.gather(*(cache.get(client) for _ in range(20)))
+    assert len(requests) == 1
+    assert all(document == discovery_document for document in documents)
+
+
+@pytest.mark.asyncio
+async def test_jwks_fetch_coalesced(jwks_server, signing_key):
+    async def handler(request):
+        await asyncio.sleep(0.02)
+        return jwks_server.handler(request)
+
+    cache = JWKSCache(background_refresh=False)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        verifiers = await asyncio.gather(*(cache.aget_verifier(signing_key.kid, client) for _ in range(20)))
+    assert jwks_server.requests == 1
+    assert all(verifier is not None for verifier in verifiers)
+
+
+def test_jwks_sync_fetch_coalesced(jwks_server, signing_key):
+    cache = JWKSCache(client=jwks_server.client(), background_refresh=False)
+    threads = [threading.Thread(target=cache.get_verifier, args=(signing_key.kid,)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert jwks_server.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_duplicate_callbacks_exchange_code_once(main_module, monkeypatch):
+    exchanges = []
+
+    async def exchange_code_for_tokens(url, code, redirect_uri):
+        exchanges.append(code)
+        await asyncio.sleep(0.05)
+        return {'id_token': 'id-token', 'access_token': 'access-token'}
+
+    async def verify_google_id_token(id_token):
+        return {'email': 'user@example.com', 'email_verified': True}
+    monkeypatch.setattr(main_module.oauth_client, 'exchange_code_for_tokens', exchange_code_for_tokens)
+    monkeypatch.setattr(main_module.oauth_client, 'verify_google_id_token', verify_google_id_token)
+
+    async with main_module.lifespan(main_module.app):
+        login_id = await main_module.server_session.store_data({'state': 'abc'})
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            client.cookies.set('session_id', login_id)
+            responses = await asyncio.gather(*(
+                client.get('/callback/google', params={'code': 'code', 'state': 'abc'}) for _ in range(3)
+            ))
+    assert exchanges == ['code']
+    assert [r.status_code for r in responses] == [307] * 3
+    assert len({r.cookies['session_id'] for r in responses}) == 1
@@ -0,0 +1,155 @@
+"""Test the persistent SQLite session store"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dockmaster.session.sqlite_session import SQLiteSession
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    return str(tmp_path / 'sessions.db')
+
+
+@pytest.fixture
+def sqlite_session(db_path: str) -> SQLiteSession:
+    session = SQLiteSession(path=db_path, flush_interval=0.01)
+    yield session
+    session.close()
+
+
+def test_store_retrieve_remove(sqlite_session: SQLiteSession):
+    session_id = sqlite_session.store_data({'user_id': 'user@example.com'})
+    assert sqlite_session.retrieve_data(session_id) == {'user_id': 'user@example.com'}
+    assert sqlite_session.remove_data(session_id) == {'user_id': 'user@example.com'}
+    assert sqlite_session.retrieve_data(session_id) is None
+    assert sqlite_session.remove_data('nonexistent') is None
+
+
+def test_survives_restart(db_path: str):
+    """Sessions written behind are persisted and readable after reopening"""
+    store = SQLiteSession(path=db_path, flush_interval=10)
+    kept_id = store.store_data({'user_id': 'kept'}, ttl=3600)
+    removed_id = store.store_data({'user_id': 'removed'}, ttl=3600)
+    store.remove_data(removed_id)
+    assert store.stats()['pending_writes'] == 2
+    store.close()
+
+    reopened = SQLiteSession(path=db_path)
+    try:
+        assert reopened.stats()['hot_entries'] == 0
+        assert reopened.retrieve_data(kept_id) == {'user_id': 'kept'}
+        assert reopened.retrieve_data(removed_id) is None
+        assert len(reopened) == 1
+    finally:
+        reopened.close()
+
+
+def test_background_flush(sqlite_session: SQLiteSession):
+    session_id = sqlite_session.store_data({'user_id': 'user@example.com'})
+    deadline = time.monotonic() + 5
+    while sqlite_session.stats()['pending_writes'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sqlite_session.stats()['pending_writes'] == 0
+    row = sqlite_session._read_conn.execute(
+        "SELECT session_id FROM sessions WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    assert row == (session_id,)
+
+
+def test_cold_reads_respect_pending_deletes(db_path: str):
+    """A session removed but not yet flushed is not resurrected by a database read"""
+    store = SQLiteSession(path=db_path, hot_cache_size=1, flush_interval=10)
+    try:
+        session_id = store.store_data({'user_id': 'user@example.com'})
+        store.flush()
+        # evict it from the one-entry hot cache
+        store.store_data({'user_id': 'other'})
+        assert store.retrieve_data(session_id) == {'user_id': 'user@example.com'}
+        store.remove_data(session_id)
+        store.store_data({'user_id': 'other'})
+        assert store.retrieve_data(session_id) is None
+    finally:
+        store.close()
+
+
+def test_expiry_and_purge(sqlite_session: SQLiteSession):
+    expiring_id = sqlite_session.store_data({'state': 'abc'}, ttl=0.05, transient=True)
+    kept_id = sqlite_session.store_data({'user_id': 'user@example.com'}, ttl=3600)
+    sqlite_session.flush()
+    time.sleep(0.1)
+    assert sqlite_session.retrieve_data(expiring_id) is None
+    assert sqlite_session.purge_expired() == 1
+    assert sqlite_session.retrieve_data(kept_id) == {'user_id': 'user@example.com'}
+
+
+def test_pop_if_state_matches(sqlite_session: SQLiteSession):
+    session_id = sqlite_session.store_data({'state': 'abc'}, transient=True)
+    assert sqlite_session.pop_if_state_matches(session_id, 'wrong') is None
+    assert sqlite_session.pop_if_state_matches(session_id, 'abc') == {'state': 'abc'}
+    assert sqlite_session.pop_if_state_matches(session_id, 'abc') is None
+
+
+class SlowReads:
+    """Read connection blocking its queries until released"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def execute(self, *args):
+        self.started.set()
+        assert self.release.wait(5)
+        return self.conn.execute(*args)
+
+
+def test_cold_remove_does_not_block_other_sessions(db_path: str):
+    """A removal reading the database does not hold the lock of the other operations"""
+    store = SQLiteSession(path=db_path)
+    cold_id = store.store_data({'state': 'abc'})
+    store.flush()
+    store._cache.remove_data(cold_id)
+    hot_id = store.store_data({'user_id': 'hot'})
+    while store._remove_lock(hot_id) is store._remove_lock(cold_id):
+        # removals of sessions on one stripe do wait for each other
+        hot_id = store.store_data({'user_id': 'hot'})
+    store._read_conn = slow = SlowReads(store._read_conn)
+    try:
+        remover = threading.Thread(target=lambda: store.pop_if_state_matches(cold_id, 'abc'))
+        remover.start()
+        assert slow.started.wait(5)
+        start = time.monotonic()
+        assert store.retrieve_data(hot_id) == {'user_id': 'hot'}
+        store.store_data({'user_id': 'new'})
+        assert store.remove_data(hot_id) == {'user_id': 'hot'}
+        assert time.monotonic() - start < 1
+        slow.release.set()
+        remover.join()
+        assert store.retrieve_data(cold_id) is None
+    finally:
+        slow.release.set()
+        store._read_conn = slow.conn
+        store.close()
+
+
+def test_concurrent_cold_pops_consume_once(db_path: str):
+    store = SQLiteSession(path=db_path)
+    session_id = store.store_data({'state': 'abc'})
+    store.flush()
+    store._cache.remove_data(session_id)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: store.pop_if_state_matches(session_id, 'abc'), range(8)))
+        assert [r for r in results if r is not None] == [{'state': 'abc'}]
+    finally:
+        store.close()
+
+
+def test_stats_count_entries(sqlite_session: SQLiteSession):
+    sqlite_session.store_data({'user_id': 'a'}, ttl=3600)
+    sqlite_session.store_data({'user_id': 'b'}, ttl=0.01)
+    sqlite_session.flush()
+    time.sleep(0.02)
+    assert sqlite_session.stats()['entries'] == 1
@@ -0,0 +1,76 @@
+"""Test the thread-safe lock-striped session store"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dockmaster.session.memory_session import MemorySession
+from dockmaster.session.schemas import SessionInterface
+from dockmaster.session.striped_session import StripedMemorySession
+
+
+@pytest.fixture
+def striped_session() -> StripedMemorySession:
+    return StripedMemorySession(stripes=8)
+
+
+def test_store_retrieve_remove(striped_session: StripedMemorySession):
+    session_id = striped_session.store_data({'user_id': 'user@example.com'})
+    assert striped_session.retrieve_data(session_id) == {'user_id': 'user@example.com'}
+    assert striped_session.remove_data(session_id) == {'user_id': 'user@example.com'}
+    assert striped_session.retrieve_data(session_id) is None
+    assert striped_session.remove_data('nonexistent') is None
+
+
+@pytest.mark.parametrize('store', [MemorySession(), StripedMemorySession(stripes=4)])
+def test_pop_if_state_matches(store: SessionInterface):
+    """Test the state check and removal of a login session"""
+    session_id = store.store_data({'state': 'abc'}, transient=True)
+    assert store.pop_if_state_matches(session_id, 'wrong') is None
+    assert store.pop_if_state_matches(session_id, None) is None
+    # a mismatch leaves the session in place
+    assert store.retrieve_data(session_id) == {'state': 'abc'}
+    assert store.pop_if_state_matches(session_id, 'abc') == {'state': 'abc'}
+    assert store.pop_if_state_matches(session_id, 'abc') is None
+
+
+def test_capacity_split_across_stripes():
+    striped_session = StripedMemorySession(stripes=4, max_entries=100)
+    for i in range(1000):
+        striped_session.store_data({'state': str(i)}, transient=True)
+    assert len(striped_session) <= 100
+    assert striped_session.stats()['evictions_transient'] == 1000 - len(striped_session)
+
+
+def test_stress_concurrent_logins(striped_session: StripedMemorySession):
+    """Hammer the store from many threads
+    - every login session is consumed by exactly one of the racing callbacks
+    - authorized sessions stored concurrently are all retrievable
+    """
+    n_threads = 32
+    n_logins = 300
+    barrier = threading.Barrier(n_threads)
+    login_ids = [striped_session.store_data({'state': f'state-{i}'}, transient=True) for i in range(n_logins)]
+    consumed = [0] * n_logins
+    consumed_lock = threading.Lock()
+
+    def worker(worker_id: int) -> list[str]:
+        barrier.wait()
+        stored = []
+        for i, session_id in enumerate(login_ids):
+            # every thread races to complete every login (duplicate callbacks)
+            if striped_session.pop_if_state_matches(session_id, f'state-{i}') is not None:
+                with consumed_lock:
+                    consumed[i] += 1
+                stored.append(striped_session.store_data({'user_id': f'user-{i}', 'worker': worker_id}))
+            striped_session.retrieve_data(session_id)
+        return stored
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        results = list(executor.map(worker, range(n_threads)))
+
+    assert consumed == [1] * n_logins
+    stored_ids = [session_id for stored in results for session_id in stored]
+    assert len(stored_ids) == len(set(stored_ids)) == n_logins
+    assert len(striped_session) == n_logins
+    assert all(striped_session.retrieve_data(session_id) is not None for session_id in stored_ids)
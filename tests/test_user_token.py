@@ -0,0 +1,72 @@
+"""Test the stateless signed-JWT session mode"""
+import time
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from dockmaster.authenticate.user_token import UserTokenSigner
+from dockmaster.configuration import DockmasterSettings
+from dockmaster.schemas import DockmasterUserToken
+from dockmaster.session.records import SessionRecord
+
+
+@pytest.fixture
+def signer() -> UserTokenSigner:
+    return UserTokenSigner(secret_key='test-secret', expiration=600)
+
+
+@pytest.fixture
+def record() -> SessionRecord:
+    return SessionRecord(
+        user_id='user@example.com', name='Test User', email='user@example.com',
+        picture='https://example.com/photo.jpg', expires_at=time.time() + 3600,
+    )
+
+
+def test_token_exp_accepts_timestamp_iso_and_datetime():
+    expected = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for exp in (int(expected.timestamp()), '2024-01-01T00:00:00Z', datetime(2024, 1, 1)):
+        assert DockmasterUserToken(email='user@example.com', exp=exp).exp == expected
+    assert '"2024-01-01T00:00:00+00:00"' in DockmasterUserToken(email='a', exp=expected).model_dump_json()
+
+
+def test_issue_and_verify(signer, record):
+    verified = signer.verify(signer.issue(record))
+    assert verified.user_id == 'user@example.com'
+    assert verified.profile() == record.profile()
+    assert verified.expires_at <= time.time() + 600
+
+
+def test_from_settings():
+    settings = DockmasterSettings(jwt_secret_key='test-secret', jwt_expiration=60, _env_file=None)
+    signer = UserTokenSigner.from_settings(settings)
+    assert (signer.algorithm, signer.expiration) == ('HS256', 60)
+
+
+@pytest.mark.parametrize('token', [
+    jwt.encode({'email': 'user@example.com', 'exp': int(time.time()) - 10}, 'test-secret'),
+    jwt.encode({'email': 'user@example.com', 'exp': int(time.time()) + 60}, 'other-secret'),
+    jwt.encode({'exp': int(time.time()) + 60}, 'test-secret'),
+    'not-a-token',
+], ids=['expired', 'wrong-key', 'no-email', 'garbage'])
+def test_verify_rejects(signer, token):
+    assert signer.verify(token) is None
+
+
+def test_routes_verify_token_without_session_store(main_module, signer, record, monkeypatch):
+    """jwt mode authenticates from the cookie alone"""
+    monkeypatch.setattr(main_module, 'user_token_signer', signer)
+
+    async def no_lookup(session_id):
+        raise AssertionError("session store lookup in jwt mode")
+    monkeypatch.setattr(main_module.server_session, 'retrieve_data', no_lookup)
+
+    with TestClient(main_module.app) as client:
+        client.cookies.set('session_id', signer.issue(record))
+        r = client.get('/principal')
+        assert r.json()['user_id'] == 'user@example.com'
+        assert r.json()['image_url'] == 'https://example.com/photo.jpg'
+        client.cookies.set('session_id', 'tampered')
+        assert client.get('/principal').json() == {}